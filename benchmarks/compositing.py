@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+"""
+This script compares the time taken by the PIL and numpy compositors to draw a full set of recorded RIDGE
+layers.
+"""
+
+from argparse import ArgumentParser
+from timeit import repeat
+
+from PIL import Image
+
+from noaa_radar.compositing import NumpyCompositor, PILCompositor
+
+import fixture_server
+
+
+def load_layers(fixtures):
+    def load(path):
+        return fixture_server.load_image(path, fixtures)
+
+    base = load('Overlays/Topo/Short/HTX_Topo_Short.jpg')
+    overlay = Image.new("RGBA", base.size, (0, 0, 0, 0))
+    for directory, name in (('Rivers', 'Rivers'), ('County', 'County'), ('Highways', 'Highways'), ('Cities', 'City')):
+        layer = load('Overlays/{0}/Short/HTX_{1}_Short.gif'.format(directory, name)).convert("RGBA")
+        overlay.paste(layer, (0, 0), mask=layer)
+
+    layers = [load('RadarImg/N0R/HTX_N0R_0.gif'), overlay, load('Warnings/Short/HTX_Warnings_0.gif'),
+              load('Legend/N0R/HTX_N0R_Legend_0.gif')]
+    return base, layers
+
+
+def main():
+    parser = ArgumentParser(description='Compositor benchmark')
+    parser.add_argument('--fixtures', default=fixture_server.directory,
+                        help='A directory of recorded RIDGE files.  Default: the fixtures in benchmarks/fixtures')
+    parser.add_argument('--number', type=int, default=50, help='Composites per timing.  Default: 50')
+    parser.add_argument('--repeat', type=int, default=5, help='Timings per compositor.  Default: 5')
+    args = parser.parse_args()
+
+    base, layers = load_layers(args.fixtures)
+
+    expected = PILCompositor().composite(base, layers).tobytes()
+    assert NumpyCompositor().composite(base, layers).tobytes() == expected
+
+    timings = {}
+    for compositor in (PILCompositor(), NumpyCompositor()):
+        best = min(repeat(lambda: compositor.composite(base, layers), number=args.number, repeat=args.repeat))
+        timings[compositor.__class__.__name__] = best / args.number
+        print("%s: %.2f ms per frame" % (compositor.__class__.__name__, best / args.number * 1000))
+
+    print("Speedup: %.2fx" % (timings['PILCompositor'] / timings['NumpyCompositor']))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+"""
+This script compares the encode time and size of each output encoder on composited RIDGE images of every product,
+with and without topography, against recorded RIDGE files served locally.
+"""
+
+from argparse import ArgumentParser
+from timeit import repeat
+
+from PIL import features
+
+from noaa_radar.encoders import encoders, get_encoder
+from noaa_radar.radar import Radar
+
+import fixture_server
+
+
+def get_args():
+    parser = ArgumentParser(description='Encoder benchmark')
+    parser.add_argument('--fixtures', default=fixture_server.directory,
+                        help='A directory of recorded RIDGE files.  Default: the fixtures in benchmarks/fixtures')
+    parser.add_argument('--number', type=int, default=10, help='Encodes per timing.  Default: 10')
+    parser.add_argument('--repeat', type=int, default=3, help='Timings per encoder.  Default: 3')
+    parser.add_argument('--quality', type=int, help='The JPEG and WebP quality.  Default: each encoder\'s default')
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+
+    names = sorted(name for name in encoders if name != 'webp' or features.check('webp'))
+    selected = [(name, get_encoder(name, args.quality)) for name in names]
+
+    server = fixture_server.FixtureServer(args.fixtures).start()
+
+    try:
+        radar = Radar(base_url=server.base_url)
+
+        print("%-4s %-5s %-12s %10s %10s" % ("", "topo", "encoder", "ms", "bytes"))
+        totals = dict((name, [0.0, 0]) for name in names)
+        for product in fixture_server.products(args.fixtures):
+            for topography in (False, True):
+                image = radar._build_radar_image(fixture_server.tower, product, include_topography=topography)
+                for name, encoder in selected:
+                    best = min(repeat(lambda: encoder.encode(image), number=args.number, repeat=args.repeat))
+                    size = len(encoder.encode(image))
+                    totals[name][0] += best / args.number
+                    totals[name][1] += size
+                    print("%-4s %-5s %-12s %10.2f %10d" % (product, topography, name, best / args.number * 1000, size))
+    finally:
+        server.stop()
+
+    print("")
+    for name in names:
+        print("%-23s %10.2f %10d" % (name + " total", totals[name][0] * 1000, totals[name][1]))
+
+
+if __name__ == "__main__":
+    main()
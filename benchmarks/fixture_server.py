@@ -0,0 +1,123 @@
+"""
+Serves the RIDGE files recorded under benchmarks/fixtures on localhost, so the benchmarks run offline against the
+same images every time.
+"""
+
+from email.utils import formatdate
+from hashlib import sha1
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO
+from os import listdir, sep, stat, walk
+from os.path import dirname, isdir, join, relpath
+from socketserver import ThreadingMixIn
+from threading import Thread
+
+from PIL import Image
+
+__author__ = 'Chad Dotson'
+
+
+directory = join(dirname(__file__), 'fixtures')
+
+tower = 'HTX'
+
+
+def products(fixtures=directory):
+    """
+    :rtype: list
+    :return: The products recorded in a fixture directory.
+    """
+    radar = join(fixtures, 'RadarImg')
+    return sorted(name for name in listdir(radar) if isdir(join(radar, name)))
+
+
+def load_image(path, fixtures=directory):
+    """
+    Decode a recorded file, such as RadarImg/N0R/HTX_N0R_0.gif.
+    """
+    with open(join(fixtures, *path.split("/")), "rb") as f:
+        image = Image.open(BytesIO(f.read()))
+        image.load()
+    return image
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        entry = self.server.files.get(self.path)
+        if entry is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        data, etag, last_modified = entry
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            data = b""
+        else:
+            self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+
+class FixtureServer:
+    """
+    Serves every file below a fixture directory at /ridge/ and its relative path, with the ETag and Last-Modified
+    validators RIDGE sends, answering revalidations with 304 Not Modified.
+    """
+
+    def __init__(self, fixtures=None):
+        """
+        :param fixtures: The directory of recorded RIDGE files.  None - the fixtures shipped with the benchmarks.
+        :type fixtures: str
+        """
+        self.fixtures = fixtures if fixtures is not None else directory
+        self._server = None
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:%s/ridge/" % self._server.server_address[1]
+
+    def start(self):
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.files = self._load()
+        thread = Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05})
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _load(self):
+        files = {}
+        for root, _, names in walk(self.fixtures):
+            for name in names:
+                path = join(root, name)
+                with open(path, "rb") as f:
+                    data = f.read()
+                files["/ridge/" + relpath(path, self.fixtures).replace(sep, "/")] = (
+                    data, '"%s"' % sha1(data).hexdigest()[:16], formatdate(stat(path).st_mtime, usegmt=True))
+        return files
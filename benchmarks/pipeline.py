@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+"""
+This script times each stage of fetching and compositing RIDGE images against recorded RIDGE files served
+locally, and writes the timings as JSON so they can be compared between releases.
+"""
+
+from argparse import ArgumentParser
+from io import BytesIO
+from itertools import product as combinations
+from json import dump
+from platform import python_version
+from sys import stdout
+from time import time
+
+import PIL
+from PIL import Image
+
+from noaa_radar.compositing import numpy
+from noaa_radar.layers import LayerRegistry
+from noaa_radar.radar import Radar
+from noaa_radar.transport import HTTPTransport
+from noaa_radar.utilities import get_image_from_url
+
+import fixture_server
+
+layer_names = tuple(name for name in LayerRegistry().layer_names if name != 'radar')
+
+
+def get_args():
+    parser = ArgumentParser(description='Pipeline benchmark')
+    parser.add_argument('--fixtures', default=fixture_server.directory,
+                        help='A directory of recorded RIDGE files.  Default: the fixtures in benchmarks/fixtures')
+    parser.add_argument('--repeat', type=int, default=5, help='Timings per product and layer set.  Default: 5')
+    parser.add_argument('--all_combinations', default=False, action='store_true',
+                        help='Time every combination of layers instead of none, each one alone and all.')
+    parser.add_argument('--output', help='The JSON output file.  Default: stdout')
+    return parser.parse_args()
+
+
+def layer_sets(all_combinations):
+    if all_combinations:
+        return [tuple(name for name, on in zip(layer_names, flags) if on)
+                for flags in combinations((False, True), repeat=len(layer_names))]
+    return [()] + [(name,) for name in layer_names] + [layer_names]
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'min': samples[0],
+        'median': samples[len(samples) // 2],
+        'mean': sum(samples) / len(samples),
+        'max': samples[-1],
+    }
+
+
+def time_frame(radar, transport, product, layers):
+    """
+    Time one frame the way the original pipeline built it: every layer fetched, converted and pasted in turn.
+    """
+    planned = radar._plan(fixture_server.tower, product, layers)
+    stages = {'get_image_from_url': 0.0, 'convert': 0.0, 'overlay': 0.0, 'jpeg_save': 0.0}
+
+    images = []
+    for _, url, _ in planned:
+        started = time()
+        image = get_image_from_url(url, transport=transport)
+        image.load()
+        stages['get_image_from_url'] += time() - started
+
+        started = time()
+        images.append(image.convert("RGBA"))
+        stages['convert'] += time() - started
+
+    started = time()
+    combined_image = Image.new("RGB", images[0].size, '#000000')
+    for image in images:
+        radar._overlay(combined_image, image)
+    stages['overlay'] += time() - started
+
+    started = time()
+    combined_image.save(BytesIO(), "JPEG", quality=99)
+    stages['jpeg_save'] += time() - started
+
+    started = time()
+    radar.get_image(fixture_server.tower, product, layers=layers)
+    stages['radar_warm'] = time() - started
+
+    return stages
+
+
+def main():
+    args = get_args()
+
+    server = fixture_server.FixtureServer(args.fixtures).start()
+
+    try:
+        transport = HTTPTransport(revalidate=False)
+        radar = Radar(base_url=server.base_url)
+
+        results = []
+        totals = {}
+        for product in fixture_server.products(args.fixtures):
+            for layers in layer_sets(args.all_combinations):
+                samples = {}
+                for _ in range(args.repeat):
+                    for stage, seconds in time_frame(radar, transport, product, layers).items():
+                        samples.setdefault(stage, []).append(seconds)
+                        totals.setdefault(stage, []).append(seconds)
+
+                results.append({
+                    'product': product,
+                    'layers': list(layers),
+                    'stages': dict((stage, summarize(values)) for stage, values in samples.items()),
+                })
+
+        report = {
+            'environment': {'python': python_version(), 'pillow': PIL.__version__,
+                            'numpy': numpy.__version__ if numpy is not None else None},
+            'fixtures': args.fixtures,
+            'repeat': args.repeat,
+            'totals': dict((stage, summarize(values)) for stage, values in totals.items()),
+            'results': results,
+        }
+    finally:
+        server.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            dump(report, f, indent=2, sort_keys=True)
+    else:
+        dump(report, stdout, indent=2, sort_keys=True)
+        stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
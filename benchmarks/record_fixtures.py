@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+"""
+This script records every layer of every product for a tower from a RIDGE site into a directory, in the layout
+the benchmark fixture server serves.
+"""
+
+from argparse import ArgumentParser
+from os import makedirs
+from os.path import dirname, isdir, join
+
+from noaa_radar.layers import LayerRegistry
+from noaa_radar.radar import Radar
+from noaa_radar.transport import HTTPTransport
+
+import fixture_server
+
+
+def get_args():
+    parser = ArgumentParser(description='Record benchmark fixtures')
+    parser.add_argument('--base_url', default=Radar._ridge_base_url,
+                        help='The RIDGE site.  Default: %s' % Radar._ridge_base_url)
+    parser.add_argument('--tower', default=fixture_server.tower,
+                        help='The tower to record.  Default: %s' % fixture_server.tower)
+    parser.add_argument('--output', default=fixture_server.directory,
+                        help='The fixture directory.  Default: %s' % fixture_server.directory)
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+
+    registry = LayerRegistry()
+    paths = set()
+    for product in sorted(registry.products):
+        paths.update(path for _, path, _ in registry.plan(args.tower, product))
+        paths.add(Radar._ridge_world_file_format.format(product, args.tower))
+
+    transport = HTTPTransport(revalidate=False)
+    try:
+        for path in sorted(paths):
+            target = join(args.output, *path.split("/"))
+            if not isdir(dirname(target)):
+                makedirs(dirname(target))
+            with open(target, "wb") as f:
+                f.write(transport.get_bytes(args.base_url + path))
+            print(path)
+    finally:
+        transport.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+"""
+This script measures the cold start time of the noaa_radar package and the command line script, each in a fresh
+interpreter, less the start time of an interpreter that imports nothing.
+"""
+
+from argparse import ArgumentParser
+from os import environ, pathsep
+from os.path import abspath, dirname, join
+from subprocess import PIPE, Popen
+from sys import executable
+from time import time
+
+root = dirname(dirname(abspath(__file__)))
+script = join(root, 'scripts', 'fetch_radar_image_cli.py')
+
+cases = (
+    ('import noaa_radar', 'import noaa_radar'),
+    ('import noaa_radar.radar', 'import noaa_radar.radar'),
+    ('fetch_radar_image_cli --help',
+     "import runpy\nsys.argv = [%r, '--help']\ntry:\n    runpy.run_path(%r, run_name='__main__')\n"
+     "except SystemExit:\n    pass" % (script, script)),
+)
+
+
+def get_args():
+    parser = ArgumentParser(description='Startup benchmark')
+    parser.add_argument('--repeat', type=int, default=10, help='Runs per case, the fastest is kept.  Default: 10')
+    return parser.parse_args()
+
+
+def run(code, env):
+    """
+    Run code in a fresh interpreter.
+    :return: The seconds it took and whether PIL was imported.
+    """
+    started = time()
+    process = Popen([executable, '-c', 'import sys\n%s\nsys.stderr.write(str("PIL" in sys.modules))' % code],
+                    stdout=PIPE, stderr=PIPE, env=env, cwd=root)
+    _, stderr = process.communicate()
+    return time() - started, stderr.decode().strip().endswith('True')
+
+
+def main():
+    args = get_args()
+
+    env = dict(environ)
+    env['PYTHONPATH'] = pathsep.join(filter(None, [root, environ.get('PYTHONPATH')]))
+
+    baseline = min(run('pass', env)[0] for _ in range(args.repeat))
+    print("%-30s %10s %5s" % ("", "ms", "PIL"))
+    print("%-30s %10.1f" % ("interpreter", baseline * 1000))
+    for name, code in cases:
+        runs = [run(code, env) for _ in range(args.repeat)]
+        print("%-30s %10.1f %5s" % (name, (min(seconds for seconds, _ in runs) - baseline) * 1000, runs[-1][1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,15 @@
-from noaa_radar.radar import Radar
-
 __author__ = 'Chad Dotson'
 
 __all__ = ["Radar"]
 
 
+def __getattr__(name):
+    # Radar imports PIL and the HTTP transport, so it is only imported once it is used.
+    if name == "Radar":
+        from noaa_radar.radar import Radar
+        return Radar
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
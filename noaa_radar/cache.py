@@ -0,0 +1,333 @@
+from collections import OrderedDict
+from hashlib import sha1
+from logging import getLogger
+from os import fdopen, fstat, listdir, makedirs, remove, replace, stat, utime
+from os.path import isdir, join, splitext
+from tempfile import mkstemp
+from threading import RLock
+from time import time
+
+from noaa_radar.metrics import NullMetrics
+from noaa_radar.utilities import get_image_from_bytes
+
+__author__ = 'Chad Dotson'
+
+logger = getLogger(__name__)
+
+
+class _DiskTier:
+    """
+    The on disk tier of a cache: files in a directory, named by the cache, that are evicted oldest modification
+    time first once they total more than max_bytes.  Files are written to a temporary name and replaced into place,
+    so readers, including other processes, never see a partial file.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self._lock = RLock()
+
+        if not isdir(directory):
+            makedirs(directory)
+        self._bytes = sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        entries = []
+        for name in listdir(self.directory):
+            if name.startswith("."):
+                continue
+            path = join(self.directory, name)
+            try:
+                info = stat(path)
+            except OSError:
+                # Evicted by another process since it was listed.
+                continue
+            entries.append((path, info.st_size, info.st_mtime))
+        return entries
+
+    def read(self, name, touch=False, max_age=None):
+        """
+        :param name: The file name.
+        :type name: str
+        :param touch: True - update the modification time, so eviction is least recently used first.
+        :type touch: bool
+        :param max_age: The seconds after its modification time a file is treated as missing.  None - no limit.
+        :type max_age: float
+        :rtype: bytes
+        :return: The file contents, None if there is no such file.
+        """
+        return self.read_entry(name, touch, max_age)[0]
+
+    def read_entry(self, name, touch=False, max_age=None):
+        """
+        Read a file along with its modification time, as it was before any touch.
+        :rtype: tuple
+        :return: (contents, modification time), (None, None) if there is no such file.
+        """
+        path = join(self.directory, name)
+        try:
+            with open(path, "rb") as f:
+                modified = fstat(f.fileno()).st_mtime
+                if max_age is not None and modified + max_age <= time():
+                    return None, None
+                data = f.read()
+        except (IOError, OSError):
+            return None, None
+
+        if touch:
+            try:
+                # The modification time doubles as the last access time for eviction.
+                utime(path, None)
+            except OSError:
+                # Evicted by another thread since it was read, the data is still good.
+                pass
+        return data, modified
+
+    def write(self, name, data):
+        if len(data) > self.max_bytes:
+            return
+
+        handle, temp_path = mkstemp(dir=self.directory, prefix=".")
+        with fdopen(handle, "wb") as f:
+            f.write(data)
+
+        with self._lock:
+            path = join(self.directory, name)
+            try:
+                self._bytes -= stat(path).st_size
+            except OSError:
+                pass
+            # replace, unlike rename, overwrites a file written by a concurrent writer on every platform.
+            replace(temp_path, path)
+            self._bytes += len(data)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for path, _, _ in self._entries():
+                self._remove(path)
+            self._bytes = 0
+
+    def _evict(self):
+        if self._bytes <= self.max_bytes:
+            return
+
+        for path, size, _ in sorted(self._entries(), key=lambda entry: entry[2]):
+            if self._bytes <= self.max_bytes:
+                break
+            logger.debug("Evicting: %s", path)
+            self._remove(path)
+            self._bytes -= size
+
+    def _remove(self, path):
+        try:
+            remove(path)
+        except OSError:
+            pass
+
+
+class LayerCache:
+    """
+    A cache for the static RIDGE overlay layers (topography, counties, highways, cities and rivers).
+
+    Decoded RGBA images are held in memory, most recently used first.  When a directory is given, the raw
+    downloaded files are also kept on disk, named by the sha1 digest of their url, and the least recently used
+    files are evicted once the directory grows past max_bytes.
+
+    Files are addressed by url rather than by their content.  A layer is looked up before it is downloaded, when
+    only its url is known, and the url of a static layer names the same file for as long as RIDGE publishes it.
+    """
+
+    def __init__(self, directory=None, max_bytes=64 * 1024 * 1024, max_images=128, metrics=None):
+        """
+        :param directory: The directory to store downloaded layers in.  None - memory only.
+        :type directory: str
+        :param max_bytes: The maximum size of the on disk cache in bytes.
+        :type max_bytes: int
+        :param max_images: The maximum number of decoded images held in memory.
+        :type max_images: int
+        :param metrics: Counts the hits and misses of each tier.  None - they are not counted.
+        :type metrics: noaa_radar.metrics.Metrics
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_images = max_images
+        self.metrics = metrics if metrics is not None else NullMetrics()
+
+        self._images = OrderedDict()
+        self._lock = RLock()
+        self._disk = _DiskTier(directory, max_bytes) if directory is not None else None
+
+    def get_image(self, url, fetch, layer=None):
+        """
+        Get the decoded RGBA image for a url, calling fetch only when it is in neither cache tier.
+        :param url: The layer url.
+        :type url: str
+        :param fetch: A callable taking the url and returning the raw image bytes.
+        :type fetch: callable
+        :param layer: The layer name the measurements are labeled with.
+        :type layer: str
+        :rtype: PIL.Image
+        :return: The layer as an RGBA image.  It is shared, do not modify it.
+        """
+        with self._lock:
+            image = self._images.pop(url, None)
+            if image is not None:
+                self._images[url] = image
+                logger.debug("Memory cache hit: %s", url)
+                self.metrics.increment('cache_hits', cache='layer', tier='memory')
+                return image
+
+        data = self._read(url)
+        if data is None:
+            logger.debug("Cache miss: %s", url)
+            self.metrics.increment('cache_misses', cache='layer')
+            data = fetch(url)
+            self._write(url, data)
+        else:
+            logger.debug("Disk cache hit: %s", url)
+            self.metrics.increment('cache_hits', cache='layer', tier='disk')
+
+        with self.metrics.timer('decode_seconds', layer=layer):
+            image = get_image_from_bytes(data).convert("RGBA")
+
+        with self._lock:
+            self._images[url] = image
+            while len(self._images) > self.max_images:
+                self._images.popitem(last=False)
+
+        return image
+
+    def clear(self):
+        """
+        Empty both cache tiers.
+        """
+        with self._lock:
+            self._images.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def _name(self, url):
+        return sha1(url.encode("utf-8")).hexdigest() + splitext(url)[1]
+
+    def _read(self, url):
+        if self._disk is None:
+            return None
+        return self._disk.read(self._name(url), touch=True)
+
+    def _write(self, url, data):
+        if self._disk is not None:
+            self._disk.write(self._name(url), data)
+
+
+class RenderCache:
+    """
+    A cache for encoded radar images, keyed by everything that determines the image, including the versions of the
+    layers that change.
+
+    Entries are held in memory, most recently used first, until the memory tier grows past max_bytes.  When a
+    directory is given, entries are also written to disk, named by the sha1 digest of their key, and the oldest files
+    are evicted once the directory grows past max_disk_bytes.  Entries in either tier expire ttl seconds after they
+    were stored, an entry read back from disk keeps the expiry of the file it was written to.
+    """
+
+    def __init__(self, directory=None, ttl=300, max_bytes=32 * 1024 * 1024, max_disk_bytes=256 * 1024 * 1024,
+                 metrics=None):
+        """
+        :param directory: The directory to store encoded images in.  None - memory only.
+        :type directory: str
+        :param ttl: The seconds an entry is kept.
+        :type ttl: float
+        :param max_bytes: The maximum size of the in memory cache in bytes.
+        :type max_bytes: int
+        :param max_disk_bytes: The maximum size of the on disk cache in bytes.
+        :type max_disk_bytes: int
+        :param metrics: Counts the hits and misses of each tier.  None - they are not counted.
+        :type metrics: noaa_radar.metrics.Metrics
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.metrics = metrics if metrics is not None else NullMetrics()
+
+        self._entries = OrderedDict()
+        self._lock = RLock()
+        self._bytes = 0
+        self._disk = _DiskTier(directory, max_disk_bytes) if directory is not None else None
+
+    def get(self, key):
+        """
+        Get the encoded image stored for a key.
+        :param key: A hashable key whose repr identifies the image.
+        :type key: tuple
+        :rtype: bytes
+        :return: The encoded image, None if it is not cached or has expired.
+        """
+        now = time()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries[key] = entry
+                    self.metrics.increment('cache_hits', cache='render', tier='memory')
+                    return entry[1]
+                self._bytes -= len(entry[1])
+
+        data, stored = self._read(key)
+        if data is None:
+            self.metrics.increment('cache_misses', cache='render')
+            return None
+
+        self.metrics.increment('cache_hits', cache='render', tier='disk')
+        self._remember(key, data, stored + self.ttl)
+        return data
+
+    def put(self, key, data):
+        """
+        Store an encoded image.
+        :param key: A hashable key whose repr identifies the image.
+        :type key: tuple
+        :param data: The encoded image.
+        :type data: bytes
+        """
+        self._remember(key, data, time() + self.ttl)
+        self._write(key, data)
+
+    def clear(self):
+        """
+        Empty both cache tiers.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self._disk is not None:
+            self._disk.clear()
+
+    def _remember(self, key, data, expires):
+        if len(data) > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[1])
+            self._entries[key] = (expires, data)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def _name(self, key):
+        return sha1(repr(key).encode("utf-8")).hexdigest()
+
+    def _read(self, key):
+        if self._disk is None:
+            return None, None
+        # The modification time is when the entry was stored.
+        return self._disk.read_entry(self._name(key), max_age=self.ttl)
+
+    def _write(self, key, data):
+        if self._disk is not None:
+            self._disk.write(self._name(key), data)
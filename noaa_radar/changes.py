@@ -0,0 +1,291 @@
+from collections import namedtuple
+from hashlib import sha1
+from logging import getLogger
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from noaa_radar.scales import product_scales
+from noaa_radar.utilities import run_every
+from noaa_radar.values import RadarValues, Region
+
+__author__ = 'Chad Dotson'
+
+logger = getLogger(__name__)
+
+
+# A meaningful change seen by a subscription.  kind is 'appeared' or 'cleared' when echoes at or above the threshold
+# become present or absent, 'new_cells' when at least min_pixels of them are new to a region that already had echoes
+# and 'warnings' for the warnings drawn in the region.  pixels is the number of such pixels in the region now,
+# new_pixels the number of them that were not in the previous frame and maximum the highest value in the region.
+Change = namedtuple('Change', ['subscription', 'kind', 'pixels', 'new_pixels', 'maximum'])
+
+
+class Subscription:
+    """
+    A region of a tower's product watched for echoes at or above a threshold, for changes to the warnings drawn in
+    it or both.
+    """
+
+    def __init__(self, callback, tower_id, product, polygon=None, threshold=None, min_pixels=1, warnings=False):
+        """
+        :param callback: Called with a noaa_radar.changes.Change for each meaningful change.
+        :type callback: callable
+        :param tower_id: The noaa tower id.
+        :type tower_id: str
+        :param product: The radar product.
+        :type product: str
+        :param polygon: The (latitude, longitude) vertices of the region.  None - the whole frame.
+        :type polygon: list
+        :param threshold: The value echoes are reported at, such as 50 dBZ.  None - echoes are not watched.
+        :type threshold: float
+        :param min_pixels: The number of pixels at or above the threshold that makes echoes present.
+        :type min_pixels: int
+        :param warnings: True - watch the warnings drawn in the region.
+        :type warnings: bool
+        """
+        self.callback = callback
+        self.tower_id = tower_id
+        self.product = product
+        self.polygon = tuple(polygon) if polygon is not None else None
+        self.threshold = threshold
+        self.min_pixels = min_pixels
+        self.warnings = warnings
+
+        self._region_key = None
+        self._region = None
+        # The (region, pixels) last seen above the threshold and under warnings.
+        self._echoes = None
+        self._warnings = None
+
+    def _get_region(self, values):
+        # The region is found again only when the frame is placed differently.  The pixels last seen keep the region
+        # they were taken in, so they are not compared pixel for pixel with pixels taken in the new one.
+        key = (values.world, values.indexes.shape)
+        if key != self._region_key:
+            if self.polygon is None:
+                height, width = values.indexes.shape
+                self._region = Region(slice(0, height), slice(0, width), numpy.ones((height, width), dtype=bool))
+            else:
+                self._region = values.region(self.polygon)
+            self._region_key = key
+        return self._region
+
+
+class ChangeDetector:
+    """
+    Polls the radar frames of a set of subscriptions and calls a subscriber back only when something it watches has
+    meaningfully changed.
+
+    A frame is skipped when it is revalidated or its raw GIF hashes the same as the last one, so an unchanged frame
+    is never decoded.  A changed frame is compared with the last one region by region on its palette indexes.
+    """
+
+    def __init__(self, radar, interval=60):
+        """
+        :param radar: The radar to fetch frames with.
+        :type radar: noaa_radar.radar.Radar
+        :param interval: The seconds between polls.
+        :type interval: float
+        """
+        if numpy is None:
+            raise ImportError("The ChangeDetector requires numpy.")
+
+        self.radar = radar
+        self.interval = interval
+        self.subscriptions = []
+
+        self._digests = {}
+        self._frames = {}
+        self._warnings = {}
+
+    def subscribe(self, callback, tower_id, product='N0R', polygon=None, threshold=None, min_pixels=1,
+                  warnings=False):
+        """
+        Watch a region of a tower's product.  See noaa_radar.changes.Subscription.  The first poll reports echoes
+        and warnings already present.
+        :rtype: noaa_radar.changes.Subscription
+        :return: The subscription, for unsubscribe.
+        """
+        tower_id = self.radar._check_tower(tower_id)
+        product = product.upper()
+        if product not in product_scales:
+            raise KeyError(product)
+        if threshold is None and not warnings:
+            raise ValueError("A subscription needs a threshold, warnings or both")
+
+        subscription = Subscription(callback, tower_id, product, polygon, threshold, min_pixels, warnings)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.remove(subscription)
+
+    def _frame_url(self, tower_id, product):
+        return self.radar._url(self.radar._ridge_radar_format, product, tower_id)
+
+    def _warnings_url(self, tower_id, product):
+        range_string = self.radar._radar_type_map[product][1]
+        return self.radar._url(self.radar._ridge_warning_format, range_string, tower_id)
+
+    def _fetch(self, urls):
+        """
+        Download or revalidate layers in parallel.
+        :return: A dict of url to response, for the layers whose raw bytes changed since the last poll.
+        """
+        futures = [(url, name, self.radar._executor.submit(self.radar._get_response, url, name))
+                   for url, name in urls.items()]
+
+        changed = {}
+        for url, name, future in futures:
+            try:
+                response = future.result()
+            except Exception:
+                logger.exception("Unable to fetch %s", url)
+                continue
+
+            if response.revalidated and url in self._digests:
+                continue
+            digest = sha1(response.body).digest()
+            if self._digests.get(url) == digest:
+                self.radar._metrics.increment('unchanged_frames', layer=name)
+                continue
+
+            self._digests[url] = digest
+            changed[url] = response
+        return changed
+
+    def _decode_frame(self, tower_id, product, response):
+        world = self.radar._get_world_file(tower_id, product)
+        image = self.radar._decode_layer(response, 'radar')
+        return RadarValues.from_image(image, world, product_scales[product])
+
+    def _decode_warnings(self, response):
+        image = self.radar._decode_layer(response, 'warnings')
+        return numpy.asarray(image.convert("RGBA"))[:, :, 3] > 0
+
+    def _check_echoes(self, subscription, values):
+        region = subscription._get_region(values)
+
+        above_lookup = numpy.zeros(len(values.lookup), dtype=bool)
+        on_scale = ~numpy.isnan(values.lookup)
+        above_lookup[on_scale] = values.lookup[on_scale] >= subscription.threshold
+        above = above_lookup.take(values.indexes[region.rows, region.cols]) & region.mask
+
+        previous = subscription._echoes
+        subscription._echoes = region, above
+        moved = previous is not None and previous[0] is not region
+        if previous is None:
+            previous = numpy.zeros_like(above)
+        else:
+            previous = previous[1]
+
+        pixels = int(numpy.count_nonzero(above))
+        previous_pixels = int(numpy.count_nonzero(previous))
+        if moved:
+            # The frame was placed differently, so echoes are compared by presence alone, never as new cells.
+            new_pixels = max(pixels - previous_pixels, 0)
+        else:
+            new_pixels = int(numpy.count_nonzero(above & ~previous))
+        if pixels >= subscription.min_pixels > previous_pixels:
+            kind = 'appeared'
+        elif previous_pixels >= subscription.min_pixels > pixels:
+            kind = 'cleared'
+        elif new_pixels >= subscription.min_pixels and not moved:
+            kind = 'new_cells'
+        else:
+            return None
+
+        return Change(subscription, kind, pixels, new_pixels, values.maximum(region))
+
+    def _check_warnings(self, subscription, values, drawn):
+        region = subscription._get_region(values)
+        if drawn.shape != values.indexes.shape:
+            logger.warning("The warnings of %s do not line up with its %s frame", subscription.tower_id,
+                           subscription.product)
+            return None
+
+        current = drawn[region.rows, region.cols] & region.mask
+        previous = subscription._warnings
+        subscription._warnings = region, current
+        if previous is None:
+            previous = numpy.zeros_like(current)
+        elif previous[0] is not region:
+            # The frame was placed differently, the warnings seen before do not line up with the region.
+            return None
+        else:
+            previous = previous[1]
+
+        if numpy.array_equal(current, previous):
+            return None
+        return Change(subscription, 'warnings', int(numpy.count_nonzero(current)),
+                      int(numpy.count_nonzero(current & ~previous)), float('nan'))
+
+    def poll(self):
+        """
+        Fetch the frames and warnings of every subscription once and call back the subscribers whose regions
+        meaningfully changed.
+        :rtype: list
+        :return: The noaa_radar.changes.Change instances reported.
+        """
+        subscriptions = list(self.subscriptions)
+
+        urls = {}
+        frames = {}
+        for subscription in subscriptions:
+            frame_url = self._frame_url(subscription.tower_id, subscription.product)
+            urls[frame_url] = 'radar'
+            frames[frame_url] = subscription.tower_id, subscription.product
+            if subscription.warnings:
+                urls[self._warnings_url(subscription.tower_id, subscription.product)] = 'warnings'
+        changed = self._fetch(urls)
+
+        for url, response in list(changed.items()):
+            try:
+                if urls[url] == 'warnings':
+                    self._warnings[url] = self._decode_warnings(response)
+                else:
+                    self._frames[url] = self._decode_frame(frames[url][0], frames[url][1], response)
+            except Exception:
+                logger.exception("Unable to decode %s", url)
+                # Forget the digest so the layer is decoded again on the next poll.
+                self._digests.pop(url, None)
+                del changed[url]
+
+        changes = []
+        for subscription in subscriptions:
+            frame_url = self._frame_url(subscription.tower_id, subscription.product)
+            values = self._frames.get(frame_url)
+            if values is None:
+                continue
+
+            found = []
+            # A subscription made since the frame last changed is checked against the frame it has not seen.
+            if subscription.threshold is not None and (frame_url in changed or subscription._echoes is None):
+                found.append(self._check_echoes(subscription, values))
+            if subscription.warnings:
+                warnings_url = self._warnings_url(subscription.tower_id, subscription.product)
+                if warnings_url in self._warnings and (warnings_url in changed or frame_url in changed or
+                                                       subscription._warnings is None):
+                    found.append(self._check_warnings(subscription, values, self._warnings[warnings_url]))
+
+            for change in found:
+                if change is None:
+                    continue
+                changes.append(change)
+                try:
+                    subscription.callback(change)
+                except Exception:
+                    logger.exception("A subscriber of %s %s failed", subscription.tower_id, subscription.product)
+
+        return changes
+
+    def run(self, cycles=None):
+        """
+        Poll each interval.
+        :param cycles: The number of polls.  None - poll until interrupted.
+        :type cycles: int
+        """
+        run_every(self.poll, self.interval, cycles)
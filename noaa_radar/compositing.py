@@ -0,0 +1,211 @@
+from threading import local, Lock
+from weakref import ref
+
+from PIL import Image
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__author__ = 'Chad Dotson'
+
+
+class PILCompositor:
+    """
+    Composites layers by converting each to RGBA and pasting it with itself as the mask.
+    """
+
+    def composite(self, base_image, layers):
+        """
+        Draw layers over a copy of an image.
+        :param base_image: The RGB image to draw over.  It is not modified.
+        :type base_image: PIL.Image
+        :param layers: The images to draw, bottom first.
+        :type layers: list
+        :rtype: PIL.Image
+        :return: A new RGB image.
+        """
+        combined_image = base_image.copy()
+        for layer in layers:
+            if layer.mode != "RGBA":
+                layer = layer.convert("RGBA")
+            combined_image.paste(layer, (0, 0), mask=layer)
+        return combined_image
+
+
+class NumpyCompositor:
+    """
+    Composites layers with numpy, giving the same pixels as the PILCompositor.
+
+    Layers are never converted to RGBA images.  Each is kept as an array of palette indexes, offset into one lookup
+    table holding every layer's colors.  A single index array records the topmost opaque layer of each pixel, and
+    one lookup and selection then writes the whole stack into a packed uint32 output buffer.  Layers with more than
+    256 colors are selected directly and layers with partial transparency, which a paste would blend, are pasted
+    with PIL instead.
+
+    The arrays for the base image and any layer that is not a palette image are kept for as long as the image
+    lives, so the memoized basemaps are only converted once.  Such images must not be modified afterwards.
+    """
+
+    def __init__(self):
+        if numpy is None:
+            raise ImportError("The NumpyCompositor requires numpy.")
+
+        self._arrays = {}
+        self._lock = Lock()
+        self._buffers = local()
+
+    def composite(self, base_image, layers):
+        """
+        Draw layers over a copy of an image.
+        :param base_image: The RGB image to draw over.  It is not modified.
+        :type base_image: PIL.Image
+        :param layers: The images to draw, bottom first.
+        :type layers: list
+        :rtype: PIL.Image
+        :return: A new RGB image.
+        """
+        base_pixels = self._get_arrays(base_image, self._pack)
+        buffers = self._get_buffers(base_pixels.shape)
+        pixels = buffers['pixels']
+        numpy.copyto(pixels, base_pixels)
+
+        # Runs of palette layers are resolved together, so only the top one is looked up for each pixel.
+        run = []
+        for layer in layers:
+            if layer.mode == "P":
+                arrays = self._palette_arrays(layer)
+            else:
+                arrays = self._get_arrays(layer, self._layer_arrays)
+
+            # Ranks are kept in one byte, so a run holds at most 255 layers.
+            if arrays[0] == 'palette' and len(run) < 255:
+                run.append(arrays[1:])
+                continue
+
+            self._draw_palette_layers(pixels, run, buffers)
+            run = []
+
+            if arrays[0] == 'palette':
+                run.append(arrays[1:])
+            elif arrays[0] == 'direct':
+                numpy.copyto(pixels, arrays[1], where=arrays[2])
+            else:
+                combined_image = self._to_image(pixels)
+                combined_image.paste(arrays[1], (0, 0), mask=arrays[1])
+                numpy.copyto(pixels, self._pack(combined_image))
+
+        self._draw_palette_layers(pixels, run, buffers)
+
+        return self._to_image(pixels)
+
+    def _get_buffers(self, shape):
+        """
+        Get this thread's working buffers for an image size.  Reusing them spares allocating and faulting in
+        fresh pages for every frame.
+        """
+        buffers = getattr(self._buffers, 'by_shape', None)
+        if buffers is None or buffers['pixels'].shape != shape:
+            buffers = {
+                'pixels': numpy.empty(shape, dtype=numpy.uint32),
+                'colors': numpy.empty(shape, dtype=numpy.uint32),
+                'keys': numpy.empty(shape, dtype=numpy.uint16),
+                'top': numpy.empty(shape, dtype=numpy.uint16),
+                'mask': numpy.empty(shape, dtype=bool),
+            }
+            self._buffers.by_shape = buffers
+        return buffers
+
+    def _get_arrays(self, image, convert):
+        key = id(image)
+        with self._lock:
+            if key in self._arrays:
+                return self._arrays[key][1]
+
+        arrays = convert(image)
+
+        def forget(_):
+            with self._lock:
+                self._arrays.pop(key, None)
+
+        with self._lock:
+            self._arrays[key] = (ref(image, forget), arrays)
+        return arrays
+
+    def _pack(self, image):
+        # Each pixel is packed into a single uint32, so every selection and lookup moves one value per pixel.
+        return numpy.array(image.convert("RGBX")).view(numpy.uint32)[..., 0]
+
+    def _to_image(self, pixels):
+        height, width = pixels.shape
+        return Image.frombuffer("RGBX", (width, height), pixels, "raw", "RGBX", 0, 1).convert("RGB")
+
+    def _is_partial(self, alpha):
+        # Subtracting one wraps 0 to 255 and takes 255 to 254, so only partial values end up below 254.
+        return bool(((alpha - numpy.uint8(1)) < 254).any())
+
+    def _palette_arrays(self, layer):
+        palette = layer.getpalette() or []
+        colors = numpy.zeros((256, 4), dtype=numpy.uint8)
+        colors[:, :3].flat[:len(palette)] = palette[:768]
+
+        alpha = numpy.full(256, 255, dtype=numpy.uint8)
+        transparency = layer.info.get("transparency")
+        if isinstance(transparency, int):
+            alpha[transparency] = 0
+        elif transparency is not None:
+            alpha[:len(transparency)] = numpy.frombuffer(transparency, dtype=numpy.uint8)[:256]
+
+        if self._is_partial(alpha):
+            return 'blend', layer.convert("RGBA")
+
+        return 'palette', numpy.asarray(layer), colors.view(numpy.uint32).ravel(), alpha == 255
+
+    def _layer_arrays(self, layer):
+        if layer.mode != "RGBA":
+            layer = layer.convert("RGBA")
+
+        rgba = numpy.asarray(layer)
+        if self._is_partial(rgba[..., 3]):
+            return 'blend', layer
+
+        packed = rgba.view(numpy.uint32)[..., 0]
+        colors, indexes = numpy.unique(packed, return_inverse=True)
+        if len(colors) > 256:
+            return 'direct', packed, rgba[..., 3] == 255
+
+        opaque = numpy.ones(256, dtype=bool)
+        opaque[:len(colors)] = colors.view(numpy.uint8).reshape(-1, 4)[:, 3] == 255
+        return ('palette', indexes.reshape(packed.shape).astype(numpy.uint8),
+                numpy.resize(colors, 256).astype(numpy.uint32), opaque)
+
+    def _draw_palette_layers(self, pixels, run, buffers):
+        if not run:
+            return
+
+        # Each layer gives every pixel a key of its rank, counting from 1, times 256 plus its palette index, with
+        # the rank zeroed where the layer is transparent.  The largest key of a pixel then belongs to its topmost
+        # opaque layer and indexes that layer's color in one lookup table holding every palette.
+        keys, top, mask = buffers['keys'], buffers['top'], buffers['mask']
+        for rank, (indexes, _, opaque) in enumerate(run, 1):
+            transparent = numpy.flatnonzero(~opaque)
+            if len(transparent) == 0:
+                keys.fill(rank << 8)
+            else:
+                if len(transparent) == 1:
+                    numpy.not_equal(indexes, numpy.uint8(transparent[0]), out=mask)
+                else:
+                    numpy.copyto(mask, numpy.take(opaque, indexes))
+                numpy.multiply(mask, numpy.uint16(rank << 8), out=keys)
+            numpy.bitwise_or(keys, indexes, out=keys)
+
+            if rank == 1:
+                numpy.copyto(top, keys)
+            else:
+                numpy.maximum(top, keys, out=top)
+
+        lookup = numpy.concatenate([numpy.zeros(256, dtype=numpy.uint32)] + [colors for _, colors, _ in run])
+        numpy.take(lookup, top, out=buffers['colors'], mode='clip')
+        numpy.greater_equal(top, 256, out=mask)
+        numpy.putmask(pixels, mask, buffers['colors'])
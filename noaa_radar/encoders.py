@@ -0,0 +1,260 @@
+from io import BytesIO
+from os import fdopen
+
+__author__ = 'Chad Dotson'
+
+# PIL is imported where it is used, so the encoder names can be listed, as for a command line's choices, without it.
+
+
+class Encoder:
+    """
+    The base of the encoders.  Subclasses name their PIL format and the options it is saved with.
+    """
+
+    name = None
+    content_type = None
+    extension = None
+    pil_format = None
+
+    @property
+    def key(self):
+        """
+        The settings that change the encoded bytes, for caching.
+        """
+        return (self.name,)
+
+    def _options(self):
+        return {}
+
+    def _prepare(self, image):
+        return image
+
+    def save(self, image, f):
+        """
+        Encode an image to a file object.
+        :param image: The image.
+        :type image: PIL.Image
+        :param f: A binary file object.
+        """
+        self._prepare(image).save(f, self.pil_format, **self._options())
+
+    def encode(self, image):
+        """
+        Encode an image to bytes.
+        :param image: The image.
+        :type image: PIL.Image
+        :rtype: bytes
+        """
+        buf = BytesIO()
+        self.save(image, buf)
+        return buf.getvalue()
+
+    def write(self, image, fd):
+        """
+        Encode an image to an open file descriptor, such as a socket or pipe.  PIL writes the encoder's output to the
+        descriptor as it is produced, without building the encoded image in memory.  The descriptor is left open.
+        :param image: The image.
+        :type image: PIL.Image
+        :param fd: The file descriptor.
+        :type fd: int
+        """
+        with fdopen(fd, "wb", closefd=False) as f:
+            self.save(image, f)
+
+
+class JPEGEncoder(Encoder):
+    """
+    Encodes JPEG images with optimized Huffman tables, which are smaller at no cost in quality.
+    """
+
+    name = 'jpeg'
+    content_type = 'image/jpeg'
+    extension = 'jpg'
+    pil_format = 'JPEG'
+    default_quality = 85
+
+    def __init__(self, quality=None, progressive=True, subsampling=None):
+        """
+        :param quality: The quality from 1 to 95.  None - default_quality.
+        :type quality: int
+        :param progressive: True - a progressive JPEG, usually smaller and shown sooner on slow connections.
+        :type progressive: bool
+        :param subsampling: The chroma subsampling, 0 for 4:4:4 which keeps colored lines sharp or 2 for 4:2:0.
+        None - the PIL default for the quality.
+        :type subsampling: int
+        """
+        self.quality = quality if quality is not None else self.default_quality
+        self.progressive = progressive
+        self.subsampling = subsampling
+
+    @property
+    def key(self):
+        return self.name, self.quality, self.progressive, self.subsampling
+
+    def _options(self):
+        options = dict(quality=self.quality, optimize=True, progressive=self.progressive)
+        if self.subsampling is not None:
+            options['subsampling'] = self.subsampling
+        return options
+
+    def _prepare(self, image):
+        return image if image.mode in ("RGB", "L") else image.convert("RGB")
+
+
+class BaselineJPEGEncoder(JPEGEncoder):
+    """
+    Encodes baseline JPEG images with the standard Huffman tables, at quality 99 by default, as
+    fetch_radar_image_cli did before the output format could be chosen.
+    """
+
+    name = 'jpeg_baseline'
+    default_quality = 99
+
+    def __init__(self, quality=None):
+        """
+        :param quality: The quality from 1 to 100.  None - default_quality.
+        :type quality: int
+        """
+        JPEGEncoder.__init__(self, quality, progressive=False)
+
+    def _options(self):
+        return dict(quality=self.quality)
+
+
+class PNGEncoder(Encoder):
+    """
+    Encodes lossless full color PNG images.
+    """
+
+    name = 'png'
+    content_type = 'image/png'
+    extension = 'png'
+    pil_format = 'PNG'
+
+    def __init__(self, compress_level=6):
+        """
+        :param compress_level: The zlib level from 1, fastest, to 9, smallest.
+        :type compress_level: int
+        """
+        self.compress_level = compress_level
+
+    @property
+    def key(self):
+        return self.name, self.compress_level
+
+    def _options(self):
+        return dict(compress_level=self.compress_level)
+
+
+class PalettePNGEncoder(PNGEncoder):
+    """
+    Encodes PNG images of at most 256 colors.
+
+    RIDGE layers are palette GIFs, so an image composited from them alone holds only the colors of their palettes.
+    When an image has at most 256 colors, those colors become its palette and it is encoded without loss.  Otherwise,
+    as when the topography is drawn, it is quantized without dithering, which would add noise to the flat areas
+    that make palette images small.
+    """
+
+    name = 'palette_png'
+
+    def __init__(self, colors=256, compress_level=6):
+        """
+        :param colors: The maximum number of colors when an image must be quantized.
+        :type colors: int
+        :param compress_level: The zlib level from 1, fastest, to 9, smallest.
+        :type compress_level: int
+        """
+        super(PalettePNGEncoder, self).__init__(compress_level)
+        self.colors = colors
+
+    @property
+    def key(self):
+        return self.name, self.colors, self.compress_level
+
+    def _prepare(self, image):
+        from PIL import Image
+
+        if image.mode == "P":
+            return image
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        colors = image.getcolors(256)
+        if colors is None:
+            return image.quantize(colors=self.colors, method=Image.FASTOCTREE, dither=Image.NONE)
+
+        palette = []
+        for _, color in colors:
+            palette.extend(color)
+        palette_image = Image.new("P", (1, 1))
+        palette_image.putpalette(palette)
+        return image.quantize(palette=palette_image, dither=Image.NONE)
+
+
+class WebPEncoder(Encoder):
+    """
+    Encodes WebP images, usually much smaller than a JPEG of the same quality.  Requires PIL built with libwebp.
+    """
+
+    name = 'webp'
+    content_type = 'image/webp'
+    extension = 'webp'
+    pil_format = 'WEBP'
+    default_quality = 80
+
+    def __init__(self, quality=None, lossless=False, method=4):
+        """
+        :param quality: The quality from 0 to 100, or the compression effort when lossless.  None - default_quality.
+        :type quality: int
+        :param lossless: True - encode without loss.
+        :type lossless: bool
+        :param method: The encoder effort from 0, fastest, to 6, smallest.
+        :type method: int
+        """
+        from PIL import features
+
+        if not features.check('webp'):
+            raise ImportError("WebP encoding requires PIL built with libwebp.")
+
+        self.quality = quality if quality is not None else self.default_quality
+        self.lossless = lossless
+        self.method = method
+
+    @property
+    def key(self):
+        return self.name, self.quality, self.lossless, self.method
+
+    def _options(self):
+        return dict(quality=self.quality, lossless=self.lossless, method=self.method)
+
+    def _prepare(self, image):
+        return image if image.mode in ("RGB", "RGBA") else image.convert("RGB")
+
+
+encoders = {
+    'jpeg': JPEGEncoder,
+    'jpeg_baseline': BaselineJPEGEncoder,
+    'png': PNGEncoder,
+    'palette_png': PalettePNGEncoder,
+    'webp': WebPEncoder,
+}
+
+
+def get_encoder(image_format, quality=None):
+    """
+    Get an encoder by name.
+    :param image_format: 'jpeg', 'jpeg_baseline', 'png', 'palette_png' or 'webp'.
+    :type image_format: str
+    :param quality: The JPEG or WebP quality.  None - the encoder's default.  It is ignored by the PNG encoders.
+    :type quality: int
+    :rtype: noaa_radar.encoders.Encoder
+    """
+    image_format = image_format.lower()
+    if image_format not in encoders:
+        raise ValueError("Unknown image format: %s" % image_format)
+
+    encoder_class = encoders[image_format]
+    if issubclass(encoder_class, PNGEncoder):
+        return encoder_class()
+    return encoder_class(quality=quality)
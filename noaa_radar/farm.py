@@ -0,0 +1,161 @@
+from collections import namedtuple
+from concurrent.futures import as_completed, ProcessPoolExecutor
+from logging import getLogger
+from multiprocessing import cpu_count, get_context
+from multiprocessing.util import Finalize
+from multiprocessing.shared_memory import SharedMemory
+from time import time
+
+from PIL import Image
+
+from noaa_radar.radar import Radar
+from noaa_radar.watch import write_job
+
+__author__ = 'Chad Dotson'
+
+logger = getLogger(__name__)
+
+
+# The outcome of a batch.  failures holds (job, error message) tuples.
+BatchReport = namedtuple('BatchReport', ['rendered', 'failures', 'seconds', 'fps'])
+
+# A decoded layer in shared memory: the name of the segment and what is needed to view its pixels as an image.
+SharedLayer = namedtuple('SharedLayer', ['segment', 'mode', 'size', 'palette', 'transparency'])
+
+_shared_modes = ("1", "L", "P", "RGB", "RGBA")
+
+_radar = None
+_attached = {}
+
+
+def _init_worker(compositor=None):
+    global _radar
+    _radar = Radar(compositor=compositor)
+    # Worker processes skip atexit, an exit priority has the Radar closed when the pool shuts the worker down.
+    Finalize(_radar, _radar.close, exitpriority=10)
+
+
+def _attach(shared):
+    """
+    View a shared layer as an image.  Segments stay attached for the life of the worker, so the layers shared by
+    many jobs, such as a tower's counties, are only mapped once.
+    """
+    entry = _attached.get(shared.segment)
+    if entry is None:
+        segment = SharedMemory(name=shared.segment)
+        image = Image.frombuffer(shared.mode, shared.size, segment.buf, "raw", shared.mode, 0, 1)
+        if shared.palette is not None:
+            image.putpalette(shared.palette)
+        if shared.transparency is not None:
+            image.info["transparency"] = shared.transparency
+        entry = _attached[shared.segment] = segment, image
+    return entry[1]
+
+
+def _render_job(job, layers, shared):
+    images = dict((url, _attach(shared[url])) for url in shared)
+    image = _radar._composite(layers, images, job.background, _radar._get_basemap(layers, job.background))
+    write_job(_radar, job, image)
+
+
+class RenderFarm:
+    """
+    Renders a batch of jobs in a pool of worker processes, so compositing and encoding, which hold the GIL, run on
+    every core.
+
+    The parent downloads every layer once, through the Radar's layer cache and worker threads, and decodes it into
+    shared memory.  Workers map the decoded layers instead of receiving pickled copies, and keep their own memoized
+    basemaps.  A job is handed to the pool as soon as its layers are ready.
+    """
+
+    def __init__(self, radar, workers=None, compositor=None):
+        """
+        :param radar: The radar to download with.
+        :type radar: noaa_radar.radar.Radar
+        :param workers: The number of worker processes.  None - one per cpu.
+        :type workers: int
+        :param compositor: The compositor the workers draw with.  It must be picklable.  None - the Radar default.
+        :type compositor: noaa_radar.compositing.PILCompositor
+        """
+        self.radar = radar
+        self.workers = workers or cpu_count()
+        self.compositor = compositor
+
+    def _share(self, image, segments):
+        if image.mode not in _shared_modes:
+            image = image.convert("RGBA")
+
+        data = image.tobytes()
+        segment = SharedMemory(create=True, size=max(1, len(data)))
+        segments.append(segment)
+        segment.buf[:len(data)] = data
+
+        palette = image.getpalette() if image.mode == "P" else None
+        return SharedLayer(segment.name, image.mode, image.size, palette, image.info.get("transparency"))
+
+    def run(self, jobs):
+        """
+        Render every job to its output file.
+        :param jobs: The jobs.
+        :type jobs: list of noaa_radar.watch.WatchJob
+        :rtype: noaa_radar.farm.BatchReport
+        """
+        started = time()
+        failures = []
+        segments = []
+        shared = {}
+        downloads = {}
+        waiting = {}
+
+        for job in jobs:
+            try:
+                layers = self.radar._plan(self.radar._check_tower(job.tower_id), job.product.upper(), job.layers)
+            except Exception as e:
+                failures.append((job, str(e) or e.__class__.__name__))
+                continue
+
+            for name, url, static in layers:
+                if url not in downloads:
+                    downloads[url] = self.radar._submit_layer(name, url, static)
+                    waiting[downloads[url]] = []
+
+            item = (job, layers, set(downloads[url] for _, url, _ in layers))
+            for future in item[2]:
+                waiting[future].append(item)
+
+        renders = []
+        executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context('spawn'),
+                                       initializer=_init_worker, initargs=(self.compositor,))
+        try:
+            for future in as_completed(list(waiting)):
+                for job, layers, pending in waiting[future]:
+                    pending.discard(future)
+                    if pending:
+                        continue
+
+                    try:
+                        for _, url, _ in layers:
+                            if url not in shared:
+                                shared[url] = self._share(downloads[url].result(), segments)
+                    except Exception as e:
+                        failures.append((job, str(e) or e.__class__.__name__))
+                        continue
+
+                    job_layers = dict((url, shared[url]) for _, url, _ in layers)
+                    renders.append((job, executor.submit(_render_job, job, layers, job_layers)))
+
+            rendered = 0
+            for job, future in renders:
+                try:
+                    future.result()
+                    rendered += 1
+                except Exception as e:
+                    failures.append((job, str(e) or e.__class__.__name__))
+        finally:
+            executor.shutdown()
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+
+        seconds = time() - started
+        return BatchReport(rendered, failures, seconds, rendered / seconds if seconds > 0 else 0.0)
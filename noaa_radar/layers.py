@@ -0,0 +1,164 @@
+from collections import namedtuple
+from json import load
+
+__author__ = 'Chad Dotson'
+
+
+# A layer of RIDGE images.  url_format is filled with the product code or the range, as keyed_by says, and the tower
+# id.  Layers are drawn in z_order, lowest first, only for products whose range is in ranges.  Static layers, such
+# as county lines, rarely change and are cached and flattened together.  Dynamic layers are fetched for every image.
+Layer = namedtuple('Layer', ['name', 'url_format', 'z_order', 'ranges', 'static', 'keyed_by'])
+
+# A radar product, drawn at the range of its radar frame.
+Product = namedtuple('Product', ['code', 'name', 'range'])
+
+ranges = ('Short', 'Long')
+
+# The RIDGE products, by code, with their names and ranges.
+ridge_products = {
+    'N0R': ('Base Reflectivity', 'Short'),
+    'N0S': ('Storm Relative Motion', 'Short'),
+    'N0V': ('Base Velocity', 'Short'),
+    'N1P': ('One-Hour Precipitation', 'Short'),
+    'NCR': ('Composite Reflectivity', 'Short'),
+    'NTP': ('Storm Total Precipitation', 'Short'),
+    'N0Z': ('Base Reflectivity', 'Long'),
+}
+
+topography_layer = Layer('topography', 'Overlays/Topo/{0}/{1}_Topo_{0}.jpg', 0, ranges, True, 'range')
+radar_layer = Layer('radar', 'RadarImg/{0}/{1}_{0}_0.gif', 10, ranges, False, 'product')
+rivers_layer = Layer('rivers', 'Overlays/Rivers/{0}/{1}_Rivers_{0}.gif', 20, ('Short',), True, 'range')
+counties_layer = Layer('counties', 'Overlays/County/{0}/{1}_County_{0}.gif', 30, ranges, True, 'range')
+highways_layer = Layer('highways', 'Overlays/Highways/{0}/{1}_Highways_{0}.gif', 40, ranges, True, 'range')
+cities_layer = Layer('cities', 'Overlays/Cities/{0}/{1}_City_{0}.gif', 50, ranges, True, 'range')
+warnings_layer = Layer('warnings', 'Warnings/{0}/{1}_Warnings_0.gif', 60, ranges, False, 'range')
+legend_layer = Layer('legend', 'Legend/{0}/{1}_{0}_Legend_0.gif', 70, ranges, False, 'product')
+
+default_layers = (topography_layer, radar_layer, rivers_layer, counties_layer, highways_layer, cities_layer,
+                  warnings_layer, legend_layer)
+
+
+class LayerRegistry:
+    """
+    The layers and products images are drawn from.  Planning an image resolves which layers apply to its product,
+    in what order they are drawn and which of them are static.
+    """
+
+    def __init__(self, products=None, layers=default_layers):
+        """
+        :param products: The products, as a dict of product code to (name, range).  None - ridge_products.
+        :type products: dict
+        :param layers: The layers.  One must be named 'radar'.
+        :type layers: list of noaa_radar.layers.Layer
+        """
+        self._layers = {}
+        self._products = {}
+
+        for layer in layers:
+            self.register_layer(layer)
+        for code, (name, range_string) in (products if products is not None else ridge_products).items():
+            self.register_product(code, name, range_string)
+
+        if 'radar' not in self._layers:
+            raise ValueError("There must be a radar layer")
+
+    def register_layer(self, layer):
+        """
+        Add a layer, replacing any layer of the same name.
+        :param layer: The layer.
+        :type layer: noaa_radar.layers.Layer
+        """
+        if layer.keyed_by not in ('product', 'range'):
+            raise ValueError("A layer is keyed by 'product' or 'range', not %s" % layer.keyed_by)
+        if layer.name == 'radar' and (layer.static or layer.keyed_by != 'product'):
+            raise ValueError("The radar layer must be dynamic and keyed by product")
+        self._layers[layer.name] = layer
+
+    def register_product(self, code, name, range_string):
+        """
+        Add a product, replacing any product with the same code.
+        :param code: The product code.  Ex 'N0R'.
+        :type code: str
+        :param name: The product name.  Ex 'Base Reflectivity'.
+        :type name: str
+        :param range_string: 'Short' or 'Long'.
+        :type range_string: str
+        """
+        if range_string not in ranges:
+            raise ValueError("Unknown range: %s" % range_string)
+        self._products[code.upper()] = Product(code.upper(), name, range_string)
+
+    def load(self, path):
+        """
+        Add the layers and products of a JSON file.
+
+        {"layers": [{"name": "states", "url": "Overlays/States/{0}/{1}_States_{0}.gif", "z_order": 35}],
+         "products": [{"code": "N0Z", "name": "Long Range Base Reflectivity", "range": "Long"}]}
+
+        A layer is static and keyed by range unless it says otherwise with "static" and "keyed_by", and applies to
+        both ranges unless it lists its "ranges".
+        :param path: The JSON file.
+        :type path: str
+        """
+        with open(path, "r") as f:
+            config = load(f)
+
+        for layer in config.get("layers", []):
+            self.register_layer(Layer(layer["name"], layer["url"], layer["z_order"],
+                                      tuple(layer.get("ranges", ranges)), layer.get("static", True),
+                                      layer.get("keyed_by", "range")))
+        for product in config.get("products", []):
+            self.register_product(product["code"], product["name"], product["range"])
+
+    @property
+    def layer_names(self):
+        """
+        The names of the layers, in drawing order.
+        """
+        return tuple(layer.name for layer in self.layers)
+
+    @property
+    def layers(self):
+        return sorted(self._layers.values(), key=lambda layer: (layer.z_order, layer.name))
+
+    @property
+    def products(self):
+        return dict(self._products)
+
+    def get_product(self, code):
+        """
+        :param code: The product code.
+        :type code: str
+        :rtype: noaa_radar.layers.Product
+        """
+        return self._products[code.upper()]
+
+    def plan(self, tower_id, product, layer_names=None):
+        """
+        List the layers of an image in drawing order.  The radar layer is always drawn and layers that do not apply
+        to the product's range are left out.
+        :param tower_id: The noaa tower id.
+        :type tower_id: str
+        :param product: The product code.
+        :type product: str
+        :param layer_names: The layers to draw.  None - every layer.
+        :type layer_names: list
+        :rtype: list
+        :return: (name, url path, static) tuples, bottom first.  The paths are relative to the RIDGE site.
+        """
+        product = self.get_product(product)
+
+        if layer_names is not None:
+            unknown = set(layer_names) - set(self._layers)
+            if unknown:
+                raise ValueError("Unknown layers: %s" % ", ".join(sorted(unknown)))
+
+        planned = []
+        for layer in self.layers:
+            if layer.name != 'radar' and layer_names is not None and layer.name not in layer_names:
+                continue
+            if product.range not in layer.ranges:
+                continue
+            key = product.code if layer.keyed_by == 'product' else product.range
+            planned.append((layer.name, layer.url_format.format(key, tower_id), layer.static))
+        return planned
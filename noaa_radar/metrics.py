@@ -0,0 +1,172 @@
+from threading import Lock
+from time import time
+
+__author__ = 'Chad Dotson'
+
+
+class _Timer:
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.started = None
+
+    def __enter__(self):
+        self.started = time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time() - self.started, **self.labels)
+
+
+class NullMetrics:
+    """
+    Discards every measurement.  Subclass it and override increment and observe to send measurements elsewhere.
+    """
+
+    def increment(self, name, value=1, **labels):
+        """
+        Add to a counter.
+        :param name: The counter name.  Ex 'bytes_downloaded'.
+        :type name: str
+        :param value: The amount to add.
+        :type value: int
+        :param labels: Labels identifying the series.  Ex layer='radar'.
+        """
+        pass
+
+    def observe(self, name, value, **labels):
+        """
+        Record a value in a histogram.
+        :param name: The histogram name.  Ex 'fetch_seconds'.
+        :type name: str
+        :param value: The value.
+        :type value: float
+        :param labels: Labels identifying the series.  Ex layer='radar'.
+        """
+        pass
+
+    def timer(self, name, **labels):
+        """
+        Time a block, recording the seconds taken in a histogram.
+        :param name: The histogram name.
+        :type name: str
+        :param labels: Labels identifying the series.
+        :return: A context manager.
+        """
+        return _Timer(self, name, labels)
+
+
+class Metrics(NullMetrics):
+    """
+    Keeps counters and histograms in memory.
+
+    Radar records:
+        bytes_downloaded, not_modified - counters per layer.
+        fetch_seconds, decode_seconds - histograms per layer.
+        composite_seconds, encode_seconds - histograms.  Compositing includes building the basemap.
+        cache_hits, cache_misses - counters per cache and tier.
+
+    HTTPTransport records:
+        retries - a counter per reason.  A Radar that creates its transport passes its metrics on to it.
+
+    ChangeDetector records:
+        unchanged_frames - a counter per layer of downloads whose bytes had not changed.
+    """
+
+    default_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets=None):
+        """
+        :param buckets: The upper bounds of the histogram buckets.  None - default_buckets.
+        :type buckets: tuple
+        """
+        self.buckets = tuple(sorted(buckets if buckets is not None else self.default_buckets))
+        self.counters = {}
+        self.histograms = {}
+        self._lock = Lock()
+
+    def _key(self, name, labels):
+        # Labels given as None are left out, so an unnamed layer is its own series.
+        return name, tuple(sorted((label, value) for label, value in labels.items() if value is not None))
+
+    def increment(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for number, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram['buckets'][number] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def get_counter(self, name, **labels):
+        """
+        Get the value of a counter, 0 if it was never incremented.
+        """
+        with self._lock:
+            return self.counters.get(self._key(name, labels), 0)
+
+    def get_histogram(self, name, **labels):
+        """
+        Get a histogram as a dict of cumulative 'buckets', 'sum' and 'count', None if nothing was observed.
+        """
+        with self._lock:
+            histogram = self.histograms.get(self._key(name, labels))
+            return None if histogram is None else dict(histogram, buckets=list(histogram['buckets']))
+
+
+def _format_labels(labels, extra=()):
+    labels = list(labels) + list(extra)
+    if not labels:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for name, value in labels]
+    return '{%s}' % ','.join('%s="%s"' % label for label in escaped)
+
+
+def to_prometheus(metrics, namespace='noaa_radar'):
+    """
+    Format metrics in the Prometheus text exposition format.
+    :param metrics: The metrics.
+    :type metrics: noaa_radar.metrics.Metrics
+    :param namespace: The prefix of every metric name.
+    :type namespace: str
+    :rtype: str
+    :return: The metrics as text.
+    """
+    with metrics._lock:
+        counters = sorted(metrics.counters.items())
+        histograms = sorted((key, dict(value, buckets=list(value['buckets'])))
+                            for key, value in metrics.histograms.items())
+
+    lines = []
+    previous = None
+    for (name, labels), value in counters:
+        full_name = '%s_%s_total' % (namespace, name)
+        if name != previous:
+            lines.append('# TYPE %s counter' % full_name)
+            previous = name
+        lines.append('%s%s %s' % (full_name, _format_labels(labels), value))
+
+    previous = None
+    for (name, labels), histogram in histograms:
+        full_name = '%s_%s' % (namespace, name)
+        if name != previous:
+            lines.append('# TYPE %s histogram' % full_name)
+            previous = name
+        for bound, count in zip(metrics.buckets, histogram['buckets']):
+            lines.append('%s_bucket%s %s' % (full_name, _format_labels(labels, [('le', repr(float(bound)))]), count))
+        lines.append('%s_bucket%s %s' % (full_name, _format_labels(labels, [('le', '+Inf')]), histogram['count']))
+        lines.append('%s_sum%s %r' % (full_name, _format_labels(labels), histogram['sum']))
+        lines.append('%s_count%s %s' % (full_name, _format_labels(labels), histogram['count']))
+
+    return '\n'.join(lines) + '\n'
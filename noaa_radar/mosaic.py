@@ -0,0 +1,155 @@
+from collections import OrderedDict
+from logging import getLogger
+from math import ceil, floor
+from threading import Lock
+
+from PIL import Image
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from noaa_radar.scales import mosaic_products, palette, palette_levels, product_scales
+from noaa_radar.utilities import geographic_to_pixel
+
+__author__ = 'Chad Dotson'
+
+logger = getLogger(__name__)
+
+
+class Mosaic:
+    """
+    Merges the radar frames of many towers onto one latitude/longitude grid, keeping the highest level where towers
+    overlap.
+
+    Each tower's frame is placed with its world file.  The grid pixels a tower covers and the frame pixels they are
+    sampled from, by nearest neighbor, are computed once per world file and kept, so placing a new frame is a single
+    gather.  Towers are fetched and sampled in parallel on the Radar's worker pool.
+    """
+
+    def __init__(self, radar, bounds, size, max_index_maps=128):
+        """
+        :param radar: The radar to fetch frames with.
+        :type radar: noaa_radar.radar.Radar
+        :param bounds: The (west, south, east, north) edges of the grid in degrees.
+        :type bounds: tuple
+        :param size: The (width, height) of the grid in pixels.
+        :type size: tuple
+        :param max_index_maps: The maximum number of tower placements kept.
+        :type max_index_maps: int
+        """
+        if numpy is None:
+            raise ImportError("The Mosaic requires numpy.")
+
+        self.radar = radar
+        self.bounds = tuple(bounds)
+        self.size = tuple(size)
+        self.max_index_maps = max_index_maps
+
+        self._index_maps = OrderedDict()
+        self._lock = Lock()
+
+    def _get_index_map(self, world, image_size):
+        key = (world, tuple(image_size))
+        with self._lock:
+            index_map = self._index_maps.pop(key, None)
+            if index_map is not None:
+                self._index_maps[key] = index_map
+                return index_map
+
+        index_map = self._build_index_map(world, image_size)
+
+        with self._lock:
+            self._index_maps[key] = index_map
+            while len(self._index_maps) > self.max_index_maps:
+                self._index_maps.popitem(last=False)
+
+        return index_map
+
+    def _build_index_map(self, world, image_size):
+        """
+        Find the grid pixels a frame covers and the frame pixel nearest the center of each.
+        :return: The flat grid indexes and the flat frame indexes, as int32 arrays of the same length.
+        """
+        x_scale, y_skew, x_skew, y_scale, x, y = world
+        width, height = image_size
+        grid_width, grid_height = self.size
+        west, south, east, north = self.bounds
+        lon_step = (east - west) / float(grid_width)
+        lat_step = (north - south) / float(grid_height)
+
+        # Only the grid window under the frame's corners is searched.
+        corners = [(x_scale * col + x_skew * row + x, y_skew * col + y_scale * row + y)
+                   for col in (-0.5, width - 0.5) for row in (-0.5, height - 0.5)]
+        left = max(0, int(floor((min(lon for lon, _ in corners) - west) / lon_step)))
+        right = min(grid_width, int(ceil((max(lon for lon, _ in corners) - west) / lon_step)))
+        top = max(0, int(floor((north - max(lat for _, lat in corners)) / lat_step)))
+        bottom = min(grid_height, int(ceil((north - min(lat for _, lat in corners)) / lat_step)))
+
+        if left >= right or top >= bottom:
+            return numpy.empty(0, dtype=numpy.int32), numpy.empty(0, dtype=numpy.int32)
+
+        longitudes = (west + (numpy.arange(left, right) + 0.5) * lon_step)[numpy.newaxis, :]
+        latitudes = (north - (numpy.arange(top, bottom) + 0.5) * lat_step)[:, numpy.newaxis]
+        cols, rows = geographic_to_pixel(world, latitudes, longitudes)
+        cols = numpy.rint(cols).astype(numpy.int64)
+        rows = numpy.rint(rows).astype(numpy.int64)
+
+        inside = (cols >= 0) & (cols < width) & (rows >= 0) & (rows < height)
+        grid_rows, grid_cols = numpy.nonzero(inside)
+        targets = (grid_rows + top) * grid_width + grid_cols + left
+        sources = rows[inside] * width + cols[inside]
+        return targets.astype(numpy.int32), sources.astype(numpy.int32)
+
+    def _get_tower(self, tower_id, product, scale):
+        """
+        Fetch a tower's frame and sample its levels onto the grid.
+        :return: The flat grid indexes covered and their levels.
+        """
+        radar = self.radar
+        world = radar._get_world_file(tower_id, product)
+        image = radar._get_layer(radar._url(radar._ridge_radar_format, product, tower_id), 'radar')
+        if image.mode != "P":
+            raise ValueError("The %s frame of %s is not a palette image" % (product, tower_id))
+
+        levels = numpy.array(palette_levels(image, scale), dtype=numpy.uint8)
+        targets, sources = self._get_index_map(world, image.size)
+        return targets, numpy.take(levels, numpy.take(numpy.asarray(image).ravel(), sources))
+
+    def get_mosaic(self, tower_ids, product='N0R'):
+        """
+        Get the latest frames of many towers merged onto the grid.  Unknown towers are refused before any download
+        and towers whose frames can not be fetched are logged and left out.
+        :param tower_ids: The noaa tower ids.  Ex ['HTX', 'BMX'].
+        :type tower_ids: list
+        :param product: The radar product.  One of noaa_radar.scales.mosaic_products.
+        :type product: str
+        :rtype: PIL.Image
+        :return: A palette image the size of the grid, holding the highest level seen at each pixel.  Index 0 is
+        transparent and index n is the nth level of the product's scale.
+        """
+        product = product.upper()
+        if product not in mosaic_products:
+            raise ValueError("Unable to mosaic %s, it is not a reflectivity product" % product)
+        scale = product_scales[product]
+
+        tower_ids = [self.radar._check_tower(tower_id) for tower_id in tower_ids]
+        futures = [(tower_id, self.radar._executor.submit(self._get_tower, tower_id, product, scale))
+                   for tower_id in tower_ids]
+
+        width, height = self.size
+        mosaic = numpy.zeros(width * height, dtype=numpy.uint8)
+        for tower_id, future in futures:
+            try:
+                targets, levels = future.result()
+            except Exception:
+                logger.exception("Leaving %s out of the mosaic", tower_id)
+                continue
+            mosaic[targets] = numpy.maximum(mosaic[targets], levels)
+
+        # Putting a palette on the grayscale image makes it a palette image with the same indexes.
+        image = Image.fromarray(mosaic.reshape(height, width))
+        image.putpalette(palette(scale))
+        image.info["transparency"] = 0
+        return image
@@ -1,113 +1,661 @@
+from collections import deque, namedtuple, OrderedDict
+from concurrent.futures import as_completed, ThreadPoolExecutor
+from functools import partial
+from hashlib import sha1
+from io import BytesIO
 from logging import getLogger
+from re import findall
+from threading import Lock
+from time import time
 from PIL import Image
-from noaa_radar.utilities import get_image_from_url
+from noaa_radar.cache import LayerCache, RenderCache
+from noaa_radar.compositing import PILCompositor
+from noaa_radar.encoders import get_encoder
+from noaa_radar.layers import (cities_layer, counties_layer, highways_layer, LayerRegistry, legend_layer,
+                               radar_layer, ridge_products, rivers_layer, topography_layer, warnings_layer)
+from noaa_radar.metrics import NullMetrics
+from noaa_radar.scales import product_scales
+from noaa_radar.towers import default_index
+from noaa_radar.transport import HTTPTransport
+from noaa_radar.utilities import get_image_from_bytes, parse_world_file
+from noaa_radar.values import RadarValues
 
 __author__ = 'Chad Dotson'
 
 logger = getLogger(__name__)
 
 
+RenderResult = namedtuple('RenderResult', ['request', 'image', 'error'])
+
+# The changing layers of an image, as downloaded or revalidated by Radar.get_versions.  layers is the planned
+# (name, url, static) tuples, versions identifies each dynamic layer in drawing order and responses holds their
+# transport responses by url.
+LayerVersions = namedtuple('LayerVersions', ['layers', 'versions', 'responses'])
+
+
 class Radar:
 
-    _ridge_radar_format = 'http://radar.weather.gov/ridge/RadarImg/{0}/{1}_{0}_0.gif'
-    _ridge_legend_format = 'http://radar.weather.gov/ridge/Legend/{0}/{1}_{0}_Legend_0.gif'
-    _ridge_warning_format = 'http://radar.weather.gov/ridge/Warnings/{0}/{1}_Warnings_0.gif'
-    _ridge_county_format = 'http://radar.weather.gov/ridge/Overlays/County/{0}/{1}_County_{0}.gif'
-    _ridge_highway_format = 'http://radar.weather.gov/ridge/Overlays/Highways/{0}/{1}_Highways_{0}.gif'
-    _ridge_topography_format = 'http://radar.weather.gov/ridge/Overlays/Topo/{0}/{1}_Topo_{0}.jpg'
-    _ridge_cities_format = 'http://radar.weather.gov/ridge/Overlays/Cities/{0}/{1}_City_{0}.gif'
-    _ridge_rivers_format = 'http://radar.weather.gov/ridge/Overlays/Rivers/{0}/{1}_Rivers_{0}.gif'
-
-    _radar_type_map = {
-        'N0R': ('Base Reflectivity', 'Short'),
-        'N0S': ('Storm Relative Motion', 'Short'),
-        'N0V': ('Base Velocity', 'Short'),
-        'N1P': ('One-Hour Precipitation', 'Short'),
-        'NCR': ('Composite Reflectivity', 'Short'),
-        'NTP': ('Storm Total Precipitation', 'Short'),
-        'N0Z': ('Base Reflectivity', 'Long'),
-    }
-
-    def __init__(self):
-        pass
+    _ridge_base_url = 'http://radar.weather.gov/ridge/'
+
+    _ridge_radar_format = radar_layer.url_format
+    _ridge_world_file_format = 'RadarImg/{0}/{1}_{0}_0.gfw'
+    _ridge_history_format = 'RadarImg/{0}/{1}/'
+    _ridge_history_file_pattern = r'href="({1}_\d{{8}}_\d{{4}}_{0}\.gif)"'
+    _ridge_legend_format = legend_layer.url_format
+    _ridge_warning_format = warnings_layer.url_format
+    _ridge_county_format = counties_layer.url_format
+    _ridge_highway_format = highways_layer.url_format
+    _ridge_topography_format = topography_layer.url_format
+    _ridge_cities_format = cities_layer.url_format
+    _ridge_rivers_format = rivers_layer.url_format
+
+    _radar_type_map = ridge_products
+
+    def __init__(self, layer_cache=None, max_workers=8, transport=None, base_url=None, max_basemaps=64,
+                 compositor=None, metrics=None, render_cache=None, tower_index=None, layer_registry=None,
+                 freshness=60):
+        """
+        :param layer_cache: The cache for the static overlay layers.  None - an in memory cache.
+        :type layer_cache: noaa_radar.cache.LayerCache
+        :param max_workers: The maximum number of layers downloaded at once.
+        :type max_workers: int
+        :param transport: The transport used to download layers.  None - a new noaa_radar.transport.HTTPTransport.
+        :type transport: noaa_radar.transport.HTTPTransport
+        :param base_url: The url of the RIDGE site.  None - the NOAA site.
+        :type base_url: str
+        :param max_basemaps: The maximum number of flattened static layer sets kept.
+        :type max_basemaps: int
+        :param compositor: Draws the layers of each image.  None - a noaa_radar.compositing.PILCompositor.
+        :type compositor: noaa_radar.compositing.PILCompositor
+        :param metrics: Records download, decode, compositing and cache measurements.  None - they are discarded.
+        Retries are counted by the transport, so they are only recorded when the Radar creates its transport, or
+        when the transport given was created with metrics.
+        :type metrics: noaa_radar.metrics.Metrics
+        :param render_cache: The cache for the encoded images of render_bytes.  None - an in memory cache.
+        :type render_cache: noaa_radar.cache.RenderCache
+        :param tower_index: The known towers.  Unknown tower ids are refused before any download.  None - the
+        bundled NEXRAD sites.
+        :type tower_index: noaa_radar.towers.TowerIndex
+        :param layer_registry: The layers and products images are drawn from.  None - the RIDGE layers and the
+        products of _radar_type_map.
+        :type layer_registry: noaa_radar.layers.LayerRegistry
+        :param freshness: The seconds render_bytes trusts the last validated versions of the radar frame, warnings
+        and legend, answering from the render cache without asking upstream.  0 - every call revalidates them.
+        :type freshness: float
+        """
+        self._metrics = metrics if metrics is not None else NullMetrics()
+        self._layer_cache = layer_cache if layer_cache is not None else LayerCache(metrics=self._metrics)
+        self._render_cache = render_cache if render_cache is not None else RenderCache(metrics=self._metrics)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._owns_transport = transport is None
+        self._transport = transport if transport is not None else HTTPTransport(metrics=self._metrics)
+        self._base_url = base_url if base_url is not None else self._ridge_base_url
+        self._max_basemaps = max_basemaps
+        self._compositor = compositor if compositor is not None else PILCompositor()
+        self._tower_index = tower_index
+        self._layer_registry = (layer_registry if layer_registry is not None
+                                else LayerRegistry(self._radar_type_map))
+        self._loops = {}
+        self._loops_lock = Lock()
+        self._basemaps = OrderedDict()
+        self._basemaps_lock = Lock()
+        self._freshness = freshness
+        self._validated = {}
+        self._validated_lock = Lock()
+
+    def close(self):
+        """
+        Stop the download threads and close the pooled connections of the transport the Radar created.  A transport
+        given to the Radar is left open for its owner.
+        """
+        self._executor.shutdown()
+        if self._owns_transport:
+            self._transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _check_tower(self, tower_id):
+        return (self._tower_index if self._tower_index is not None else default_index()).validate(tower_id)
+
+    def _url(self, url_format, *args):
+        return self._base_url + url_format.format(*args)
+
+    def _get_response(self, url, name='radar'):
+        with self._metrics.timer('fetch_seconds', layer=name):
+            response = self._transport.get(url)
+
+        if response.revalidated:
+            self._metrics.increment('not_modified', layer=name)
+        else:
+            self._metrics.increment('bytes_downloaded', len(response.body), layer=name)
+        return response
+
+    def _decode_layer(self, response, name='radar'):
+        with self._metrics.timer('decode_seconds', layer=name):
+            return get_image_from_bytes(response.body)
+
+    def _get_layer(self, url, name='radar'):
+        return self._decode_layer(self._get_response(url, name), name)
+
+    def _get_world_file(self, tower_id, radar_type_string):
+        url = self._url(self._ridge_world_file_format, radar_type_string, tower_id)
+        return parse_world_file(self._transport.get_bytes(url).decode("ascii"))
+
+    def _get_static_layer(self, url, name=None):
+        return self._layer_cache.get_image(url, partial(self._fetch_static_bytes, name=name), layer=name)
+
+    def _fetch_static_bytes(self, url, name=None):
+        with self._metrics.timer('fetch_seconds', layer=name):
+            data = self._transport.get_bytes(url)
+        self._metrics.increment('bytes_downloaded', len(data), layer=name)
+        return data
+
+    def _submit_layer(self, name, url, static):
+        return self._executor.submit(self._get_static_layer if static else self._get_layer, url, name)
 
     def _overlay(self, base_image, new_image):
         base_image.paste(new_image, (0, 0), mask=new_image)
 
-    def _add_topography(self, type, tower_id, image):
-        topo = get_image_from_url(self._ridge_topography_format.format(self._radar_type_map[type][1], tower_id)).convert("RGBA")
-        self._overlay(image, topo)
+    def _plan_layers(self, tower_id, radar_type_string, include_topography=True, include_legend=True,
+                     include_counties=True, include_warnings=True, include_highways=True, include_cities=True,
+                     include_rivers=True):
+        """
+        List the layers of an image, bottom first, as (name, url, static) tuples.
+        """
+        layer_names = self._layer_names(include_topography=include_topography, include_legend=include_legend,
+                                        include_counties=include_counties, include_warnings=include_warnings,
+                                        include_highways=include_highways, include_cities=include_cities,
+                                        include_rivers=include_rivers)
+        return self._plan(self._check_tower(tower_id), radar_type_string, layer_names)
 
-    def _add_legend(self, type, tower_id, image):
-        legend = get_image_from_url(self._ridge_legend_format.format(type, tower_id)).convert("RGBA")
-        self._overlay(image, legend)
+    def _layer_names(self, **include):
+        # Registered layers without an include_* argument are drawn.
+        return [name for name in self._layer_registry.layer_names if include.get('include_%s' % name, True)]
 
-    def _add_warnings(self, type, tower_id, image):
-        warnings = get_image_from_url(self._ridge_warning_format.format(self._radar_type_map[type][1], tower_id)).convert("RGBA")
-        self._overlay(image, warnings)
+    def _plan(self, tower_id, product, layer_names=None):
+        return [(name, self._base_url + path, static)
+                for name, path, static in self._layer_registry.plan(tower_id, product, layer_names)]
 
-    def _add_counties(self, type, tower_id, image):
-        county = get_image_from_url(self._ridge_county_format.format(self._radar_type_map[type][1], tower_id)).convert("RGBA")
-        self._overlay(image, county)
+    def _fetch_layers(self, layers):
+        """
+        Download the planned layers in parallel, returning a dict of url to image.
+        """
+        futures = dict((url, self._submit_layer(name, url, static)) for name, url, static in layers)
+        return dict((url, future.result()) for url, future in futures.items())
 
-    def _add_highways(self, type, tower_id, image):
-        highway = get_image_from_url(self._ridge_highway_format.format(self._radar_type_map[type][1], tower_id)).convert("RGBA")
-        self._overlay(image, highway)
+    def _basemap_key(self, layers, background):
+        # The dynamic layers are placeholders, the overlays of a basemap are split around them.
+        return background, tuple(url if static else name for name, url, static in layers)
 
-    def _add_cities(self, type, tower_id, image):
-        cities = get_image_from_url(self._ridge_cities_format.format(self._radar_type_map[type][1], tower_id)).convert("RGBA")
-        self._overlay(image, cities)
+    def _get_basemap(self, layers, background):
+        """
+        Get the memoized basemap for the planned layers, None if it has not been built yet.
+        """
+        key = self._basemap_key(layers, background)
+        with self._basemaps_lock:
+            basemap = self._basemaps.pop(key, None)
+            if basemap is not None:
+                self._basemaps[key] = basemap
 
-    def _add_rivers(self, type, tower_id, image):
-        if self._radar_type_map[type][1] == 'Short':
-            cities = get_image_from_url(self._ridge_rivers_format.format(self._radar_type_map[type][1], tower_id)).convert("RGBA")
-            self._overlay(image, cities)
+        self._metrics.increment('cache_hits' if basemap is not None else 'cache_misses', cache='basemap')
+        return basemap
+
+    def _build_basemap(self, layers, images, background):
+        """
+        Flatten the static layers below every dynamic layer into an underlay, and each run of static layers between
+        dynamic layers into an overlay, so an image is composited from the basemap and its dynamic layers alone.
+        """
+        size = images[[url for name, url, _ in layers if name == 'radar'][0]].size
+        underlay = Image.new("RGB", size, background)
+        overlays = []
+
+        overlay = None
+        below_dynamic = True
+        for name, url, static in layers:
+            if not static:
+                below_dynamic = False
+                overlay = None
+            elif below_dynamic:
+                self._overlay(underlay, images[url])
+            else:
+                if overlay is None:
+                    overlay = Image.new("RGBA", size, (0, 0, 0, 0))
+                    overlays.append(overlay)
+                self._overlay(overlay, images[url])
+
+        basemap = (underlay, [overlay if overlay.getbbox() else None for overlay in overlays])
+
+        with self._basemaps_lock:
+            self._basemaps[self._basemap_key(layers, background)] = basemap
+            while len(self._basemaps) > self._max_basemaps:
+                self._basemaps.popitem(last=False)
+
+        return basemap
+
+    def _layers_to_fetch(self, layers, basemap):
+        return [layer for layer in layers if basemap is None or not layer[2]]
+
+    def _get_images(self, layers, basemap, responses=None):
+        """
+        Get the planned layers that are not flattened into the basemap, decoding those already in responses and
+        downloading the rest at once.
+        """
+        responses = responses or {}
+        images = self._fetch_layers([layer for layer in self._layers_to_fetch(layers, basemap)
+                                     if layer[1] not in responses])
+        for name, url, _ in layers:
+            if url in responses:
+                images[url] = self._decode_layer(responses[url], name)
+        return images
+
+    def _get_responses(self, layers):
+        """
+        Download or revalidate the planned layers in parallel, returning a dict of url to response.
+        """
+        futures = dict((url, self._executor.submit(self._get_response, url, name)) for name, url, _ in layers)
+        return dict((url, future.result()) for url, future in futures.items())
+
+    def _version(self, response):
+        return response.etag or response.last_modified or sha1(response.body).hexdigest()
+
+    def get_versions(self, tower_id, product, layers=None):
+        """
+        Download or revalidate the layers of an image that change, such as the radar frame, warnings and legend, and
+        identify each by its validators or content.  The result can be given to get_image, which then draws those
+        layers without downloading them again.
+        :param tower_id: The noaa tower id.  Ex Huntsville, Al -> 'HTX'.
+        :type tower_id: str
+        :param product: The product code.  Ex Base Reflectivity -> 'N0R'.
+        :type product: str
+        :param layers: The names of the layers to draw over the radar.  None - every registered layer.
+        :type layers: list
+        :rtype: noaa_radar.radar.LayerVersions
+        :return: The versions, which are equal for as long as the image would be.
+        """
+        planned = self._plan(self._check_tower(tower_id), product.upper(), layers)
+        validated = time()
+        responses = self._get_responses([layer for layer in planned if not layer[2]])
+        versions = LayerVersions(planned, tuple(self._version(responses[url]) for _, url, static in planned
+                                                if not static), responses)
+
+        with self._validated_lock:
+            for url, version in zip([url for _, url, static in planned if not static], versions.versions):
+                self._validated[url] = (validated, version)
+        return versions
+
+    def _fresh_versions(self, layers):
+        """
+        The versions of the planned dynamic layers if each was validated within the freshness window, else None.
+        """
+        now = time()
+        with self._validated_lock:
+            entries = [self._validated.get(url) for _, url, static in layers if not static]
+        if any(entry is None or entry[0] + self._freshness <= now for entry in entries):
+            return None
+        return tuple(version for _, version in entries)
+
+    def _encode(self, image, encoder):
+        with self._metrics.timer('encode_seconds', format=encoder.name):
+            return encoder.encode(image)
+
+    def encode(self, image, image_format='jpeg', quality=None):
+        """
+        Encode an image, such as one from get_base_reflectivity.
+        :param image: The image.
+        :type image: PIL.Image
+        :param image_format: 'jpeg', 'png', 'palette_png' or 'webp'.  See noaa_radar.encoders.
+        :type image_format: str
+        :param quality: The JPEG or WebP quality.  None - the encoder's default.
+        :type quality: int
+        :rtype: bytes
+        :return: The encoded image.
+        """
+        return self._encode(image, get_encoder(image_format, quality))
+
+    def write(self, image, fd, image_format='jpeg', quality=None):
+        """
+        Encode an image straight to an open file descriptor, such as a file, pipe or socket, which is left open.
+        :param image: The image.
+        :type image: PIL.Image
+        :param fd: The file descriptor.
+        :type fd: int
+        :param image_format: 'jpeg', 'png', 'palette_png' or 'webp'.  See noaa_radar.encoders.
+        :type image_format: str
+        :param quality: The JPEG or WebP quality.  None - the encoder's default.
+        :type quality: int
+        """
+        encoder = get_encoder(image_format, quality)
+        with self._metrics.timer('encode_seconds', format=encoder.name):
+            encoder.write(image, fd)
 
     def _build_radar_image(self, tower_id, radar_type_string, background='#000000', include_topography=True, include_legend=True,
                            include_counties=True, include_warnings=True, include_highways=True, include_cities=True,
                            include_rivers=True):
-        radar_type_string = radar_type_string.upper()
-        tower_id = tower_id.upper()
+        layer_names = self._layer_names(include_topography=include_topography, include_legend=include_legend,
+                                        include_counties=include_counties, include_warnings=include_warnings,
+                                        include_highways=include_highways, include_cities=include_cities,
+                                        include_rivers=include_rivers)
+        return self.get_image(tower_id, radar_type_string, layers=layer_names, background=background)
+
+    def get_image(self, tower_id, product, layers=None, background='#000000', versions=None):
+        """
+        Get an image of any registered product drawn with any registered layers.  Only the layers that are not
+        already flattened into a memoized basemap or downloaded by get_versions are fetched, all of them at once.
+        :param tower_id: The noaa tower id.  Ex Huntsville, Al -> 'HTX'.
+        :type tower_id: str
+        :param product: The product code.  Ex Base Reflectivity -> 'N0R'.
+        :type product: str
+        :param layers: The names of the layers to draw over the radar.  Ex ['counties', 'warnings'].  None - every
+        registered layer.
+        :type layers: list
+        :param background: The hex background color.
+        :type background: str
+        :param versions: The dynamic layers, from get_versions for the same tower, product and layers.  None - they
+        are downloaded.
+        :type versions: noaa_radar.radar.LayerVersions
+        :rtype: PIL.Image
+        :return: A PIL.Image instance with the layers drawn in order.
+        """
+        tower_id = self._check_tower(tower_id)
+        product = product.upper()
 
         logger.debug("Tower ID: %s", tower_id)
-        logger.debug("Type: %s", radar_type_string)
+        logger.debug("Type: %s", product)
         logger.debug("Background: %s", background)
-        logger.debug("Include Topography: %s", include_topography)
-        logger.debug("Include Legend: %s", include_legend)
-        logger.debug("Include Counties: %s", include_counties)
-        logger.debug("Include Warnings: %s", include_warnings)
-        logger.debug("Include Highways: %s", include_highways)
-        logger.debug("Include Cities: %s", include_cities)
-        logger.debug("Include Rivers: %s", include_rivers)
-
-        radar = get_image_from_url(self._ridge_radar_format.format(radar_type_string, tower_id)).convert("RGBA")
-
-        combined_image = Image.new("RGB", radar.size, background)
+        logger.debug("Layers: %s", layers)
+
+        planned = self._plan(tower_id, product, layers)
+        basemap = self._get_basemap(planned, background)
+        images = self._get_images(planned, basemap, versions.responses if versions is not None else None)
+        return self._composite(planned, images, background, basemap)
+
+    def _composite(self, layers, images, background, basemap=None):
+        with self._metrics.timer('composite_seconds'):
+            if basemap is None:
+                basemap = self._build_basemap(layers, images, background)
+            return self._composite_basemap(layers, images, basemap)
+
+    def _composite_basemap(self, layers, images, basemap):
+        underlay, overlays = basemap
+        overlays = iter(overlays)
+
+        stack = []
+        below_dynamic = True
+        in_run = False
+        for name, url, static in layers:
+            if not static:
+                stack.append(images[url])
+                below_dynamic = in_run = False
+            elif not below_dynamic and not in_run:
+                in_run = True
+                overlay = next(overlays)
+                if overlay is not None:
+                    stack.append(overlay)
+
+        return self._compositor.composite(underlay, stack)
+
+    def render_many(self, requests):
+        """
+        Render many images at once.  Layers shared between requests, such as a tower's counties for two products,
+        are only downloaded once and all downloads share the Radar's worker pool.
+        :param requests: (tower_id, product, options) tuples.  product is a key of _radar_type_map and options is
+        an optional dict of the background and include_* keyword arguments taken by the get_* methods.
+        :type requests: iterable
+        :rtype: generator
+        :return: A noaa_radar.radar.RenderResult per request, in the order they finish.  Either image or error is set.
+        """
+        downloads = {}
+        waiting = {}
+        failed = []
+
+        for request in requests:
+            try:
+                tower_id, product = request[0].upper(), request[1].upper()
+                options = dict(request[2]) if len(request) > 2 and request[2] else {}
+                background = options.pop('background', '#000000')
+                layers = self._plan_layers(tower_id, product, **options)
+            except Exception as e:
+                failed.append(RenderResult(request, None, e))
+                continue
+
+            basemap = self._get_basemap(layers, background)
+            needed = self._layers_to_fetch(layers, basemap)
+
+            for name, url, static in needed:
+                if url not in downloads:
+                    downloads[url] = self._submit_layer(name, url, static)
+                    waiting[downloads[url]] = []
+
+            item = (request, layers, background, basemap, needed, set(downloads[url] for _, url, _ in needed))
+            for future in item[5]:
+                waiting[future].append(item)
+
+        for result in failed:
+            yield result
+
+        for future in as_completed(list(waiting)):
+            for request, layers, background, basemap, needed, pending in waiting[future]:
+                pending.discard(future)
+                if pending:
+                    continue
+
+                try:
+                    images = dict((url, downloads[url].result()) for _, url, _ in needed)
+                    yield RenderResult(request, self._composite(layers, images, background, basemap), None)
+                except Exception as e:
+                    yield RenderResult(request, None, e)
+
+    def _get_history(self, tower_id, radar_type_string):
+        """
+        List the past radar frames of a product, oldest first.
+        :return: The url of the frame directory and the frame file names.
+        """
+        url = self._url(self._ridge_history_format, radar_type_string, tower_id)
+        listing = self._transport.get_bytes(url).decode("latin-1")
+        pattern = self._ridge_history_file_pattern.format(radar_type_string, tower_id)
+        return url, sorted(set(findall(pattern, listing)))
 
-        if include_topography:
-            self._add_topography(radar_type_string, tower_id, combined_image)
+    def _get_loop_frames(self, tower_id, radar_type_string, frames):
+        """
+        Get the latest radar frames of a product, oldest first.  Frames are kept in a ring buffer per tower and
+        product, so only the ones published since the last call are downloaded.
+        """
+        url, names = self._get_history(tower_id, radar_type_string)
+        names = names[-frames:]
+        if not names:
+            raise IOError("No frames listed at %s" % url)
+
+        key = (tower_id, radar_type_string)
+        with self._loops_lock:
+            ring = self._loops.get(key)
+            if ring is None or ring.maxlen < frames:
+                ring = self._loops[key] = deque(ring or [], maxlen=frames)
+            known = dict(ring)
+
+        new_names = [name for name in names if name not in known]
+        logger.debug("Fetching %d new frames of %d", len(new_names), len(names))
+
+        futures = [(name, self._executor.submit(self._get_layer, url + name, 'radar')) for name in new_names]
+        for name, future in futures:
+            known[name] = future.result()
+
+        with self._loops_lock:
+            for name in new_names:
+                ring.append((name, known[name]))
+
+        return [known[name] for name in names]
+
+    def _encode_loop(self, frames, image_format, duration):
+        # One palette is shared by every frame, so each frame is only mapped onto it and no frame needs a
+        # palette of its own.
+        palette = frames[-1].quantize(colors=256, method=Image.MEDIANCUT)
+        indexed = [frame.quantize(palette=palette, dither=Image.NONE) for frame in frames]
+
+        buf = BytesIO()
+        with self._metrics.timer('encode_seconds', format=image_format.lower()):
+            indexed[0].save(buf, image_format, save_all=True, append_images=indexed[1:], duration=duration, loop=0)
+        return buf.getvalue()
+
+    def get_loop(self, tower_id, product, frames=6, output='gif', duration=500, background='#000000',
+                 include_legend=True, include_counties=True, include_warnings=True, include_highways=True,
+                 include_cities=True, include_rivers=True, include_topography=True):
+        """
+        Get an animated loop of the latest radar frames for a noaa radar site.  The static layers, warnings and
+        legend are fetched once and drawn on every frame.
+        :param tower_id: The noaa tower id.  Ex Huntsville, Al -> 'HTX'.
+        :type tower_id: str
+        :param product: The radar product.  Ex Base Reflectivity -> 'N0R'.
+        :type product: str
+        :param frames: The maximum number of frames.
+        :type frames: int
+        :param output: 'gif' - an animated GIF, 'png' - an animated PNG, 'frames' - a list of images.
+        :type output: str
+        :param duration: The time each frame is shown in milliseconds.
+        :type duration: int
+        :param background: The hex background color.
+        :type background: str
+        :param include_legend: True - include legend.
+        :type include_legend: bool
+        :param include_counties: True - include county lines.
+        :type include_counties: bool
+        :param include_warnings: True - include warning lines.
+        :type include_warnings: bool
+        :param include_highways: True - include highways.
+        :type include_highways: bool
+        :param include_cities: True - include city labels.
+        :type include_cities: bool
+        :param include_rivers: True - include rivers
+        :type include_rivers: bool
+        :param include_topography: True - include topography
+        :type include_topography: bool
+        :rtype: bytes
+        :return: The encoded loop, or a list of PIL.Image instances, oldest first, for 'frames'.
+        """
+        if output not in ('gif', 'png', 'frames'):
+            raise ValueError("Unknown loop output: %s" % output)
 
-        combined_image.paste(radar, (0, 0), mask=radar)
+        tower_id = tower_id.upper()
+        product = product.upper()
+
+        layers = self._plan_layers(tower_id, product, include_topography=include_topography,
+                                   include_legend=include_legend, include_counties=include_counties,
+                                   include_warnings=include_warnings, include_highways=include_highways,
+                                   include_cities=include_cities, include_rivers=include_rivers)
+        radar_url = [url for name, url, _ in layers if name == 'radar'][0]
+
+        basemap = self._get_basemap(layers, background)
+        images = self._fetch_layers([layer for layer in self._layers_to_fetch(layers, basemap)
+                                     if layer[1] != radar_url])
+        radar_frames = self._get_loop_frames(tower_id, product, frames)
+
+        combined_frames = []
+        for radar in radar_frames:
+            images[radar_url] = radar
+            with self._metrics.timer('composite_seconds'):
+                # The basemap is built from the first frame and reused for the rest.
+                if basemap is None:
+                    basemap = self._build_basemap(layers, images, background)
+                combined_frames.append(self._composite_basemap(layers, images, basemap))
+
+        if output == 'frames':
+            return combined_frames
+
+        return self._encode_loop(combined_frames, output.upper(), duration)
+
+    def render_bytes(self, tower_id, product, image_format='jpeg', quality=None, background='#000000',
+                     include_legend=True, include_counties=True, include_warnings=True, include_highways=True,
+                     include_cities=True, include_rivers=True, include_topography=True, layers=None):
+        """
+        Get an encoded image for a noaa radar site.  Images are cached by their options and the versions of the
+        radar frame, warnings and legend, so the image is only composited and encoded again once one of those
+        changes upstream.  Those layers are only revalidated once their versions are older than the freshness
+        window.
+        :param tower_id: The noaa tower id.  Ex Huntsville, Al -> 'HTX'.
+        :type tower_id: str
+        :param product: The radar product.  Ex Base Reflectivity -> 'N0R'.
+        :type product: str
+        :param image_format: 'jpeg', 'png', 'palette_png' or 'webp'.  See noaa_radar.encoders.
+        :type image_format: str
+        :param quality: The JPEG or WebP quality.  None - the encoder's default.
+        :type quality: int
+        :param background: The hex background color.
+        :type background: str
+        :param include_legend: True - include legend.
+        :type include_legend: bool
+        :param include_counties: True - include county lines.
+        :type include_counties: bool
+        :param include_warnings: True - include warning lines.
+        :type include_warnings: bool
+        :param include_highways: True - include highways.
+        :type include_highways: bool
+        :param include_cities: True - include city labels.
+        :type include_cities: bool
+        :param include_rivers: True - include rivers
+        :type include_rivers: bool
+        :param include_topography: True - include topography
+        :type include_topography: bool
+        :param layers: The names of the layers to draw over the radar, as for get_image.  It replaces the include_*
+        arguments.  None - the layers they select.
+        :type layers: list
+        :rtype: bytes
+        :return: The encoded image.
+        """
+        encoder = get_encoder(image_format, quality)
 
-        if include_rivers:
-            self._add_rivers(radar_type_string, tower_id, combined_image)
+        tower_id = self._check_tower(tower_id)
+        product = product.upper()
+        if layers is None:
+            layers = self._layer_names(include_topography=include_topography, include_legend=include_legend,
+                                       include_counties=include_counties, include_warnings=include_warnings,
+                                       include_highways=include_highways, include_cities=include_cities,
+                                       include_rivers=include_rivers)
 
-        if include_counties:
-            self._add_counties(radar_type_string, tower_id, combined_image)
+        planned = self._plan(tower_id, product, layers)
+        key = (tower_id, product, encoder.key, background, tuple(url for _, url, _ in planned))
 
-        if include_highways:
-            self._add_highways(radar_type_string, tower_id, combined_image)
+        # Within the freshness window a cached image is returned without any request.
+        versions = self._fresh_versions(planned)
+        if versions is not None:
+            data = self._render_cache.get(key + (versions,))
+            if data is not None:
+                return data
 
-        if include_cities:
-            self._add_cities(radar_type_string, tower_id, combined_image)
+        versions = self.get_versions(tower_id, product, layers)
+        key += (versions.versions,)
+        data = self._render_cache.get(key)
+        if data is not None:
+            return data
 
-        if include_warnings:
-            self._add_warnings(radar_type_string, tower_id, combined_image)
+        basemap = self._get_basemap(planned, background)
+        images = self._get_images(planned, basemap, versions.responses)
 
-        if include_legend:
-            self._add_legend(radar_type_string, tower_id, combined_image)
+        data = self._encode(self._composite(planned, images, background, basemap), encoder)
+        self._render_cache.put(key, data)
+        return data
 
-        return combined_image
+    def get_values(self, tower_id, product):
+        """
+        Get the values of the latest radar frame for a noaa radar site, such as the reflectivity in dBZ, velocity in
+        knots or precipitation in inches, for sampling points and polygons.  Requires numpy.
+        :param tower_id: The noaa tower id.  Ex Huntsville, Al -> 'HTX'.
+        :type tower_id: str
+        :param product: The radar product.  Ex Base Reflectivity -> 'N0R'.
+        :type product: str
+        :rtype: noaa_radar.values.RadarValues
+        :return: The frame's palette indexes, their values and its placement.
+        """
+        tower_id = self._check_tower(tower_id)
+        product = product.upper()
+        if product not in self._radar_type_map:
+            raise KeyError(product)
+
+        world = self._executor.submit(self._get_world_file, tower_id, product)
+        image = self._get_layer(self._url(self._ridge_radar_format, product, tower_id), 'radar')
+        return RadarValues.from_image(image, world.result(), product_scales[product])
 
     def get_composite_reflectivity(self, tower_id, background='#000000', include_legend=True, include_counties=True,
                                    include_warnings=True, include_highways=True, include_cities=True,
@@ -0,0 +1,134 @@
+from collections import namedtuple
+
+__author__ = 'Chad Dotson'
+
+
+# The color legend of a radar product.  levels holds (value, (red, green, blue)) pairs, lowest value first.
+Scale = namedtuple('Scale', ['name', 'unit', 'levels'])
+
+
+reflectivity = Scale('Reflectivity', 'dBZ', (
+    (5, (4, 233, 231)),
+    (10, (1, 159, 244)),
+    (15, (3, 0, 244)),
+    (20, (2, 253, 2)),
+    (25, (1, 197, 1)),
+    (30, (0, 142, 0)),
+    (35, (253, 248, 2)),
+    (40, (229, 188, 0)),
+    (45, (253, 149, 0)),
+    (50, (253, 0, 0)),
+    (55, (212, 0, 0)),
+    (60, (188, 0, 0)),
+    (65, (248, 0, 253)),
+    (70, (152, 84, 198)),
+    (75, (253, 253, 253)),
+))
+
+# Range folded pixels, where the velocity is unknown, are purple and left off the scale.
+velocity = Scale('Radial Velocity', 'kt', (
+    (-64, (2, 252, 2)),
+    (-50, (1, 228, 1)),
+    (-36, (1, 197, 1)),
+    (-26, (7, 172, 4)),
+    (-20, (6, 143, 3)),
+    (-10, (4, 114, 2)),
+    (-1, (124, 151, 123)),
+    (0, (152, 119, 119)),
+    (10, (137, 0, 0)),
+    (20, (162, 0, 0)),
+    (26, (185, 0, 0)),
+    (36, (216, 0, 0)),
+    (50, (239, 0, 0)),
+    (64, (254, 0, 0)),
+))
+
+one_hour_precipitation = Scale('One-Hour Precipitation', 'in', (
+    (0.1, (170, 170, 170)),
+    (0.25, (118, 118, 118)),
+    (0.5, (0, 255, 255)),
+    (0.75, (0, 175, 175)),
+    (1.0, (0, 255, 0)),
+    (1.25, (0, 143, 0)),
+    (1.5, (255, 0, 255)),
+    (1.75, (175, 50, 125)),
+    (2.0, (0, 0, 255)),
+    (2.5, (50, 0, 150)),
+    (3.0, (255, 255, 0)),
+    (4.0, (255, 170, 0)),
+    (5.0, (255, 0, 0)),
+    (6.0, (174, 0, 0)),
+    (8.0, (255, 255, 255)),
+))
+
+storm_total_precipitation = Scale('Storm Total Precipitation', 'in', (
+    (0.3, (170, 170, 170)),
+    (0.6, (118, 118, 118)),
+    (1.0, (0, 255, 255)),
+    (1.5, (0, 175, 175)),
+    (2.0, (0, 255, 0)),
+    (2.5, (0, 143, 0)),
+    (3.0, (255, 0, 255)),
+    (4.0, (175, 50, 125)),
+    (5.0, (0, 0, 255)),
+    (6.0, (50, 0, 150)),
+    (8.0, (255, 255, 0)),
+    (10.0, (255, 170, 0)),
+    (12.0, (255, 0, 0)),
+    (15.0, (174, 0, 0)),
+    (20.0, (255, 255, 255)),
+))
+
+product_scales = {
+    'N0R': reflectivity,
+    'NCR': reflectivity,
+    'N0Z': reflectivity,
+    'N0V': velocity,
+    'N0S': velocity,
+    'N1P': one_hour_precipitation,
+    'NTP': storm_total_precipitation,
+}
+
+# Products that may be merged by their highest level, because higher levels are stronger echoes.
+mosaic_products = ('N0R', 'NCR', 'N0Z')
+
+
+def palette_levels(image, scale):
+    """
+    Map each palette index of a radar image to its level on a scale.
+    :param image: A palette (P mode) radar image.
+    :type image: PIL.Image
+    :param scale: The scale of the image's product.
+    :type scale: noaa_radar.scales.Scale
+    :rtype: list
+    :return: 256 levels, 0 for indexes that are transparent or not on the scale and n for the nth value of the scale.
+    """
+    levels_by_color = dict((color, level) for level, (_, color) in enumerate(scale.levels, 1))
+    palette = (image.getpalette() or [])[:768]
+
+    levels = [levels_by_color.get(tuple(palette[index:index + 3]), 0) for index in range(0, len(palette), 3)]
+    levels.extend([0] * (256 - len(levels)))
+
+    transparency = image.info.get("transparency")
+    if isinstance(transparency, int):
+        levels[transparency] = 0
+    elif transparency is not None:
+        for index, alpha in enumerate(bytearray(transparency)):
+            if alpha == 0:
+                levels[index] = 0
+
+    return levels
+
+
+def palette(scale):
+    """
+    Get the palette of an image holding levels of a scale, with index 0 black and each level n at index n.
+    :param scale: The scale.
+    :type scale: noaa_radar.scales.Scale
+    :rtype: list
+    :return: A palette for PIL.Image.putpalette.
+    """
+    colors = [0, 0, 0]
+    for _, color in scale.levels:
+        colors.extend(color)
+    return colors + [0] * (768 - len(colors))
@@ -0,0 +1,144 @@
+from io import BytesIO
+from os import listdir, utime
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import sleep, time
+from unittest import TestCase
+
+from PIL import Image
+
+from noaa_radar import cache as cache_module
+from noaa_radar.cache import LayerCache, RenderCache
+
+__author__ = 'Chad Dotson'
+
+
+def make_gif(color, size=(20, 10)):
+    buf = BytesIO()
+    Image.new("P", size, color).save(buf, "GIF", transparency=0)
+    return buf.getvalue()
+
+
+class CountingFetch:
+
+    def __init__(self):
+        self.urls = []
+
+    def __call__(self, url):
+        self.urls.append(url)
+        return make_gif(len(self.urls))
+
+
+class TestLayerCache(TestCase):
+
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.fetch = CountingFetch()
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_memory_hit(self):
+        cache = LayerCache()
+        first = cache.get_image('http://example/a.gif', self.fetch)
+        second = cache.get_image('http://example/a.gif', self.fetch)
+        assert first is second
+        assert first.mode == "RGBA"
+        assert self.fetch.urls == ['http://example/a.gif']
+
+    def test_disk_hit_across_instances(self):
+        LayerCache(self.directory).get_image('http://example/a.gif', self.fetch)
+        image = LayerCache(self.directory).get_image('http://example/a.gif', self.fetch)
+        assert image.size == (20, 10)
+        assert self.fetch.urls == ['http://example/a.gif']
+
+    def test_memory_eviction(self):
+        cache = LayerCache(max_images=1)
+        cache.get_image('http://example/a.gif', self.fetch)
+        cache.get_image('http://example/b.gif', self.fetch)
+        cache.get_image('http://example/a.gif', self.fetch)
+        assert len(self.fetch.urls) == 3
+
+    def test_disk_eviction(self):
+        size = len(make_gif(1))
+        cache = LayerCache(self.directory, max_bytes=size * 2, max_images=0)
+        for name in ('a', 'b', 'c'):
+            cache.get_image('http://example/%s.gif' % name, self.fetch)
+        assert len(listdir(self.directory)) == 2
+
+    def test_evicted_after_read(self):
+        LayerCache(self.directory).get_image('http://example/a.gif', self.fetch)
+
+        def evicted(path, times):
+            raise OSError("No such file or directory: %s" % path)
+
+        utime, cache_module.utime = cache_module.utime, evicted
+        try:
+            image = LayerCache(self.directory).get_image('http://example/a.gif', self.fetch)
+        finally:
+            cache_module.utime = utime
+        assert image.size == (20, 10)
+        assert self.fetch.urls == ['http://example/a.gif']
+
+    def test_clear(self):
+        cache = LayerCache(self.directory)
+        cache.get_image('http://example/a.gif', self.fetch)
+        cache.clear()
+        assert listdir(self.directory) == []
+        cache.get_image('http://example/a.gif', self.fetch)
+        assert len(self.fetch.urls) == 2
+
+
+class TestRenderCache(TestCase):
+
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.key = ('HTX', 'N0R', 'jpeg', 99, '#000000', (), ('"etag"',))
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_memory_hit(self):
+        cache = RenderCache()
+        assert cache.get(self.key) is None
+        cache.put(self.key, b'jpeg')
+        assert cache.get(self.key) == b'jpeg'
+        assert cache.get(self.key[:-1] + (('"other"',),)) is None
+
+    def test_expiry(self):
+        cache = RenderCache(self.directory, ttl=0.05)
+        cache.put(self.key, b'jpeg')
+        sleep(0.1)
+        assert cache.get(self.key) is None
+        assert RenderCache(self.directory, ttl=0.05).get(self.key) is None
+
+    def test_disk_hit_keeps_expiry(self):
+        RenderCache(self.directory, ttl=10).put(self.key, b'jpeg')
+        stored = time() - 9.9
+        utime(join(self.directory, listdir(self.directory)[0]), (stored, stored))
+
+        cache = RenderCache(self.directory, ttl=10)
+        assert cache.get(self.key) == b'jpeg'
+        assert abs(cache._entries[self.key][0] - (stored + 10)) < 0.01
+        sleep(0.15)
+        assert cache.get(self.key) is None
+
+    def test_memory_eviction(self):
+        cache = RenderCache(max_bytes=8)
+        cache.put(('a',), b'1234')
+        cache.put(('b',), b'1234')
+        cache.get(('a',))
+        cache.put(('c',), b'1234')
+        assert cache.get(('a',)) == b'1234'
+        assert cache.get(('b',)) is None
+
+    def test_disk_hit_across_instances(self):
+        RenderCache(self.directory).put(self.key, b'jpeg')
+        assert RenderCache(self.directory).get(self.key) == b'jpeg'
+
+    def test_disk_eviction(self):
+        cache = RenderCache(self.directory, max_disk_bytes=8)
+        for name in ('a', 'b', 'c'):
+            cache.put((name,), b'1234')
+        assert len(listdir(self.directory)) == 2
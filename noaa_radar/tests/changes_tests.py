@@ -0,0 +1,163 @@
+from io import BytesIO
+from unittest import skipIf, TestCase
+
+from PIL import Image
+
+from noaa_radar.changes import ChangeDetector, numpy
+from noaa_radar.metrics import Metrics
+from noaa_radar.radar import Radar
+from noaa_radar.tests.stand_in import RidgeStandIn
+from noaa_radar.tests.values_tests import make_frame
+
+__author__ = 'Chad Dotson'
+
+
+def make_warnings(pixels, size=(4, 4)):
+    """
+    A transparent warnings overlay with red at the given (column, row) pixels.
+    """
+    image = Image.new("P", size, 0)
+    image.putpalette([0, 0, 0, 255, 0, 0] + [0] * 762)
+    for pixel in pixels:
+        image.putpixel(pixel, 1)
+    buf = BytesIO()
+    image.save(buf, "GIF", transparency=0)
+    return buf.getvalue()
+
+
+@skipIf(numpy is None, "numpy is not installed")
+class TestChangeDetector(TestCase):
+
+    def setUp(self):
+        self.stand_in = RidgeStandIn(size=(60, 55)).start()
+        # One pixel per tenth of a degree, with the center of the top left pixel at 35N 87W.
+        self.stand_in.set_file('RadarImg/N0R/HTX_N0R_0.gfw', b'0.1\n0.0\n0.0\n-0.1\n-87.0\n35.0\n')
+        self.stand_in.set_file('Warnings/Short/HTX_Warnings_0.gif', make_warnings([]))
+        self.set_frame([[0, 0, 0, 0]] * 4)
+
+        self.radar = Radar(base_url=self.stand_in.base_url)
+        self.detector = ChangeDetector(self.radar, interval=0)
+        self.changes = []
+
+        # The right half of the frame.
+        self.polygon = [(35.05, -86.85), (35.05, -86.65), (34.65, -86.65), (34.65, -86.85)]
+
+    def tearDown(self):
+        self.radar.close()
+        self.stand_in.stop()
+
+    def set_frame(self, rows):
+        self.stand_in.set_file('RadarImg/N0R/HTX_N0R_0.gif', make_frame(rows))
+
+    def test_threshold_crossed(self):
+        self.detector.subscribe(self.changes.append, 'htx', polygon=self.polygon, threshold=50)
+        assert self.detector.poll() == []
+
+        # 55 dBZ inside the region.
+        self.set_frame([[0, 0, 0, 11], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]])
+        self.detector.poll()
+        assert [(change.kind, change.pixels, change.new_pixels, change.maximum) for change in self.changes] == \
+            [('appeared', 1, 1, 55)]
+
+        # Heavier rain where there already was some is not a new change.
+        self.set_frame([[0, 0, 0, 13], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]])
+        assert self.detector.poll() == []
+
+        self.set_frame([[0, 0, 9, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]])
+        self.detector.poll()
+        assert [change.kind for change in self.changes] == ['appeared', 'cleared']
+
+    def test_new_cells(self):
+        self.set_frame([[0, 0, 0, 11], [0, 0, 0, 11], [0, 0, 0, 0], [0, 0, 0, 0]])
+        self.detector.subscribe(self.changes.append, 'HTX', polygon=self.polygon, threshold=50, min_pixels=2)
+        self.detector.poll()
+
+        # Fewer new pixels than min_pixels.
+        self.set_frame([[0, 0, 0, 11], [0, 0, 0, 11], [0, 0, 0, 11], [0, 0, 0, 0]])
+        assert self.detector.poll() == []
+
+        # A second cell in a region that already has echoes.
+        self.set_frame([[0, 0, 0, 11], [0, 0, 0, 11], [0, 0, 0, 11], [0, 0, 12, 12]])
+        self.detector.poll()
+        assert [(change.kind, change.pixels, change.new_pixels) for change in self.changes] == \
+            [('appeared', 2, 2), ('new_cells', 5, 2)]
+
+    def test_outside_region(self):
+        self.detector.subscribe(self.changes.append, 'HTX', polygon=self.polygon, threshold=50)
+        self.detector.poll()
+        self.set_frame([[15, 15, 0, 0]] * 4)
+        self.detector.poll()
+        assert self.changes == []
+
+    def test_unchanged_frame_not_decoded(self):
+        metrics = Metrics()
+        detector = ChangeDetector(Radar(base_url=self.stand_in.base_url, metrics=metrics))
+        detector.subscribe(self.changes.append, 'HTX', threshold=50)
+        detector.poll()
+
+        # The same bytes set again.
+        self.set_frame([[0, 0, 0, 0]] * 4)
+        detector.poll()
+        detector.poll()
+        assert metrics.get_histogram('decode_seconds', layer='radar')['count'] == 1
+        assert metrics.get_counter('not_modified', layer='radar') == 2
+        assert self.stand_in.count('HTX_N0R_0.gfw') == 1
+
+    def test_warnings(self):
+        self.detector.subscribe(self.changes.append, 'HTX', polygon=self.polygon, warnings=True)
+        self.detector.poll()
+        assert self.changes == []
+
+        self.stand_in.set_file('Warnings/Short/HTX_Warnings_0.gif', make_warnings([(3, 3)]))
+        self.detector.poll()
+        assert [(change.kind, change.pixels) for change in self.changes] == [('warnings', 1)]
+
+        # A warning drawn outside the region.
+        self.stand_in.set_file('Warnings/Short/HTX_Warnings_0.gif', make_warnings([(3, 3), (0, 0)]))
+        self.detector.poll()
+        assert len(self.changes) == 1
+
+    def test_existing_echoes_reported(self):
+        self.set_frame([[15] * 4] * 4)
+        self.detector.subscribe(self.changes.append, 'HTX', threshold=50)
+        self.detector.poll()
+        later = []
+        self.detector.subscribe(later.append, 'HTX', threshold=70, min_pixels=16)
+        self.detector.poll()
+        assert [(change.kind, change.pixels) for change in self.changes + later] == \
+            [('appeared', 16), ('appeared', 16)]
+
+    def test_frame_moved(self):
+        self.set_frame([[0, 0, 0, 11], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]])
+        self.stand_in.set_file('Warnings/Short/HTX_Warnings_0.gif', make_warnings([(3, 0)]))
+        self.detector.subscribe(self.changes.append, 'HTX', polygon=self.polygon, threshold=50, warnings=True)
+        self.detector.poll()
+        assert [change.kind for change in self.changes] == ['appeared', 'warnings']
+
+        # The frame shifted a pixel west, the echo and warning still lie in the region.
+        self.stand_in.set_file('RadarImg/N0R/HTX_N0R_0.gfw', b'0.1\n0.0\n0.0\n-0.1\n-87.1\n35.0\n')
+        self.set_frame([[0, 0, 0, 0], [0, 0, 0, 11], [0, 0, 0, 0], [0, 0, 0, 0]])
+        self.stand_in.set_file('Warnings/Short/HTX_Warnings_0.gif', make_warnings([(3, 1)]))
+        assert self.detector.poll() == []
+
+        self.set_frame([[0, 0, 0, 0]] * 4)
+        self.detector.poll()
+        assert [change.kind for change in self.changes] == ['appeared', 'warnings', 'cleared']
+
+    def test_failing_subscriber(self):
+        def fail(change):
+            raise RuntimeError("subscriber failed")
+
+        self.set_frame([[15] * 4] * 4)
+        self.detector.subscribe(fail, 'HTX', threshold=50)
+        self.detector.subscribe(self.changes.append, 'HTX', threshold=50)
+        self.detector.poll()
+        assert len(self.changes) == 1
+
+    def test_subscribe_checks(self):
+        with self.assertRaises(ValueError):
+            self.detector.subscribe(self.changes.append, 'ZZZ', threshold=50)
+        with self.assertRaises(ValueError):
+            self.detector.subscribe(self.changes.append, 'HTX')
+        with self.assertRaises(KeyError):
+            self.detector.subscribe(self.changes.append, 'HTX', product='XXX', threshold=50)
@@ -0,0 +1,67 @@
+from io import BytesIO
+from unittest import skipIf, TestCase
+
+from PIL import Image
+
+from noaa_radar.compositing import numpy, NumpyCompositor, PILCompositor
+from noaa_radar.tests.stand_in import synthesize
+
+__author__ = 'Chad Dotson'
+
+
+def open_image(data):
+    image = Image.open(BytesIO(data))
+    image.load()
+    return image
+
+
+@skipIf(numpy is None, "numpy is not installed")
+class TestNumpyCompositor(TestCase):
+
+    def setUp(self):
+        size = (90, 70)
+        self.base = open_image(synthesize('/ridge/Overlays/Topo/Short/HTX_Topo_Short.jpg', size))
+        self.layers = [open_image(synthesize(path, size)) for path in (
+            '/ridge/RadarImg/N0R/HTX_N0R_0.gif',
+            '/ridge/Overlays/County/Short/HTX_County_Short.gif',
+            '/ridge/Warnings/Short/HTX_Warnings_0.gif',
+            '/ridge/Legend/N0R/HTX_N0R_Legend_0.gif')]
+
+    def assert_same(self, base, layers):
+        expected = PILCompositor().composite(base, layers)
+        actual = NumpyCompositor().composite(base, layers)
+        assert actual.mode == expected.mode
+        assert actual.tobytes() == expected.tobytes()
+
+    def test_palette_layers(self):
+        self.assert_same(self.base, self.layers)
+
+    def test_rgba_layers(self):
+        self.assert_same(self.base, [self.layers[0], self.layers[1].convert("RGBA"), self.layers[2]])
+
+    def test_per_index_transparency(self):
+        layer = self.layers[1].copy()
+        layer.info["transparency"] = bytes(bytearray([0, 255, 0] + [255] * 253))
+        self.assert_same(self.base, [self.layers[0], layer])
+
+    def test_partial_transparency(self):
+        layer = self.layers[1].convert("RGBA")
+        layer.putalpha(layer.getchannel("A").point(lambda alpha: alpha // 2))
+        partial = self.layers[2].copy()
+        partial.info["transparency"] = bytes(bytearray([0] + [128] * 255))
+        self.assert_same(self.base, [self.layers[0], layer, partial, self.layers[3]])
+
+    def test_many_colors(self):
+        layer = Image.new("RGBA", self.base.size)
+        layer.putdata([(x * 2, y * 3, x + y, 255) for y in range(70) for x in range(90)])
+        assert layer.getcolors(256) is None
+        layer.putalpha(self.layers[1].convert("RGBA").getchannel("A"))
+        self.assert_same(self.base, [self.layers[0], layer, self.layers[2]])
+
+    def test_long_run(self):
+        self.assert_same(self.base, self.layers * 70)
+
+    def test_base_not_modified(self):
+        before = self.base.tobytes()
+        NumpyCompositor().composite(self.base, self.layers)
+        assert self.base.tobytes() == before
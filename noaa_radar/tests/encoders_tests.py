@@ -0,0 +1,106 @@
+from io import BytesIO
+from os import close, pipe, read
+from unittest import skipIf, TestCase
+
+from PIL import features, Image
+
+from noaa_radar.encoders import BaselineJPEGEncoder, get_encoder, JPEGEncoder, PalettePNGEncoder, PNGEncoder, WebPEncoder
+from noaa_radar.metrics import Metrics
+from noaa_radar.radar import Radar
+from noaa_radar.tests.stand_in import RidgeStandIn
+
+__author__ = 'Chad Dotson'
+
+
+def make_image(noisy=False):
+    """
+    A composite like image: a flat background crossed by colored lines, or with a gradient of many colors.
+    """
+    image = Image.new("RGB", (64, 48), (0, 0, 0))
+    for x in range(64):
+        image.putpixel((x, 10), (253, 0, 0))
+        image.putpixel((x, x % 48), (4, 233, 231))
+        if noisy:
+            for y in range(48):
+                image.putpixel((x, y), (x * 4, y * 5, (x * y) % 256))
+    return image
+
+
+class TestEncoders(TestCase):
+
+    def test_palette_png_lossless(self):
+        image = make_image()
+        data = PalettePNGEncoder().encode(image)
+        decoded = Image.open(BytesIO(data))
+        assert decoded.mode == "P"
+        assert decoded.convert("RGB").tobytes() == image.tobytes()
+
+    def test_palette_png_quantized(self):
+        decoded = Image.open(BytesIO(PalettePNGEncoder(colors=64).encode(make_image(noisy=True))))
+        assert decoded.mode == "P"
+        assert len(decoded.getcolors(256)) <= 64
+
+    def test_jpeg(self):
+        image = make_image()
+        assert len(JPEGEncoder(quality=50).encode(image)) < len(JPEGEncoder(quality=95).encode(image))
+        assert Image.open(BytesIO(JPEGEncoder().encode(image.convert("RGBA")))).format == "JPEG"
+
+    def test_baseline_jpeg(self):
+        image = make_image()
+        buf = BytesIO()
+        image.save(buf, "JPEG", quality=99)
+        assert BaselineJPEGEncoder().encode(image) == buf.getvalue()
+        assert 'progressive' not in Image.open(BytesIO(BaselineJPEGEncoder().encode(image))).info
+
+    @skipIf(not features.check('webp'), "PIL is built without libwebp")
+    def test_webp(self):
+        decoded = Image.open(BytesIO(WebPEncoder().encode(make_image())))
+        assert decoded.format == "WEBP"
+        assert decoded.size == (64, 48)
+
+    def test_write(self):
+        image = make_image()
+        encoder = PalettePNGEncoder()
+        read_fd, write_fd = pipe()
+        try:
+            encoder.write(image, write_fd)
+        finally:
+            close(write_fd)
+        data = read(read_fd, 1 << 20)
+        close(read_fd)
+        assert data == encoder.encode(image)
+
+    def test_get_encoder(self):
+        assert get_encoder('JPEG', quality=70).key == JPEGEncoder(quality=70).key
+        assert get_encoder('png', quality=70).key == PNGEncoder().key
+        assert get_encoder('jpeg').key != get_encoder('jpeg', quality=95).key
+        with self.assertRaises(ValueError):
+            get_encoder('bmp')
+
+
+class TestRadarEncode(TestCase):
+
+    def setUp(self):
+        self.stand_in = RidgeStandIn(size=(60, 55)).start()
+        self.metrics = Metrics()
+        self.radar = Radar(base_url=self.stand_in.base_url, metrics=self.metrics)
+
+    def tearDown(self):
+        self.radar.close()
+        self.stand_in.stop()
+
+    def test_render_palette_png(self):
+        options = dict(include_topography=False, include_legend=False, include_highways=False,
+                       include_cities=False, include_rivers=False)
+        data = self.radar.render_bytes('HTX', 'N0R', image_format='palette_png', **options)
+        image = self.radar._build_radar_image('HTX', 'N0R', **options)
+        assert Image.open(BytesIO(data)).convert("RGB").tobytes() == image.tobytes()
+        assert len(data) < len(self.radar.render_bytes('HTX', 'N0R', image_format='png', **options))
+        assert self.metrics.get_histogram('encode_seconds', format='palette_png')['count'] == 1
+
+    def test_encode(self):
+        image = make_image()
+        assert self.radar.encode(image, 'png') == PNGEncoder().encode(image)
+        assert self.metrics.get_histogram('encode_seconds', format='png')['count'] == 1
+        with self.assertRaises(ValueError):
+            self.radar.render_bytes('HTX', 'N0R', image_format='bmp')
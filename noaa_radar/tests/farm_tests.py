@@ -0,0 +1,81 @@
+from os.path import exists, join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from PIL import Image
+
+from noaa_radar.farm import RenderFarm
+from noaa_radar.layers import Layer, LayerRegistry
+from noaa_radar.radar import Radar
+from noaa_radar.tests.stand_in import RidgeStandIn
+from noaa_radar.watch import WatchJob
+
+__author__ = 'Chad Dotson'
+
+
+class TestRenderFarm(TestCase):
+
+    def setUp(self):
+        self.stand_in = RidgeStandIn(size=(60, 55)).start()
+        self.radar = Radar(base_url=self.stand_in.base_url)
+        self.directory = mkdtemp()
+
+    def tearDown(self):
+        self.radar.close()
+        self.stand_in.stop()
+        rmtree(self.directory)
+
+    def job(self, tower_id, product, name, layers=None, image_format='png'):
+        if layers is None:
+            layers = LayerRegistry().layer_names
+        return WatchJob(tower_id, product, join(self.directory, name), '#000000', layers, image_format)
+
+    def test_batch(self):
+        jobs = [self.job('HTX', 'N0R', 'htx.png'),
+                self.job('HTX', 'NCR', 'htx_ncr.png', ('counties', 'warnings')),
+                self.job('BMX', 'N0R', 'bmx.jpg', image_format='jpeg'),
+                self.job('ZZZ', 'N0R', 'zzz.png'),
+                self.job('FFC', 'N0R', 'ffc.png')]
+
+        report = RenderFarm(self.radar, workers=2).run(jobs)
+
+        assert report.rendered == 4
+        assert report.failures == [(jobs[3], 'Unknown tower: ZZZ')]
+        assert report.fps > 0
+
+        for job in jobs[:2]:
+            expected = self.radar.get_image(job.tower_id, job.product, layers=job.layers)
+            assert Image.open(job.output_file).convert("RGB").tobytes() == expected.tobytes()
+        assert not exists(jobs[3].output_file)
+
+    def test_render_failure(self):
+        job = self.job('HTX', 'N0R', join('missing', 'htx.png'))
+        report = RenderFarm(self.radar, workers=1).run([job, self.job('HTX', 'N0R', 'htx.png')])
+        assert report.rendered == 1
+        assert [failed for failed, _ in report.failures] == [job]
+
+    def test_layers_downloaded_once(self):
+        jobs = [self.job('HTX', 'N0R', 'n0r.png'), self.job('HTX', 'NCR', 'ncr.png'),
+                self.job('HTX', 'N0R', 'n0r_counties.png', ('counties',))]
+
+        report = RenderFarm(self.radar, workers=2).run(jobs)
+
+        assert report.rendered == 3
+        assert report.failures == []
+        assert self.stand_in.count('/County/') == 1
+        assert self.stand_in.count('HTX_N0R_0.gif') == 1
+
+    def test_registry_layers(self):
+        registry = LayerRegistry()
+        registry.register_layer(Layer('labels', 'Overlays/Cities/{0}/{1}_City_{0}.gif', 65, ('Short', 'Long'), True,
+                                      'range'))
+        self.radar.close()
+        self.radar = Radar(base_url=self.stand_in.base_url, layer_registry=registry)
+        job = self.job('HTX', 'N0R', 'labels.png', ('warnings', 'labels'))
+
+        report = RenderFarm(self.radar, workers=1).run([job])
+
+        assert report.failures == []
+        expected = self.radar.get_image('HTX', 'N0R', layers=job.layers)
+        assert Image.open(job.output_file).convert("RGB").tobytes() == expected.tobytes()
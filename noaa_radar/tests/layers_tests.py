@@ -0,0 +1,108 @@
+from json import dump
+from os import remove
+from tempfile import mkstemp
+from unittest import TestCase
+
+from PIL import Image
+
+from noaa_radar.layers import default_layers, Layer, LayerRegistry
+from noaa_radar.radar import Radar
+from noaa_radar.tests.stand_in import RidgeStandIn
+from noaa_radar.utilities import get_image_from_url
+
+__author__ = 'Chad Dotson'
+
+
+class TestLayerRegistry(TestCase):
+
+    def setUp(self):
+        self.registry = LayerRegistry(Radar._radar_type_map)
+
+    def test_plan(self):
+        assert self.registry.plan('HTX', 'n0r') == [
+            ('topography', 'Overlays/Topo/Short/HTX_Topo_Short.jpg', True),
+            ('radar', 'RadarImg/N0R/HTX_N0R_0.gif', False),
+            ('rivers', 'Overlays/Rivers/Short/HTX_Rivers_Short.gif', True),
+            ('counties', 'Overlays/County/Short/HTX_County_Short.gif', True),
+            ('highways', 'Overlays/Highways/Short/HTX_Highways_Short.gif', True),
+            ('cities', 'Overlays/Cities/Short/HTX_City_Short.gif', True),
+            ('warnings', 'Warnings/Short/HTX_Warnings_0.gif', False),
+            ('legend', 'Legend/N0R/HTX_N0R_Legend_0.gif', False),
+        ]
+
+    def test_plan_selected_layers(self):
+        # The radar is always drawn and rivers are only published for the short range.
+        assert [name for name, _, _ in self.registry.plan('HTX', 'N0Z', ['legend', 'rivers', 'counties'])] == \
+            ['radar', 'counties', 'legend']
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            self.registry.plan('HTX', 'N0R', ['clouds'])
+        with self.assertRaises(KeyError):
+            self.registry.plan('HTX', 'XXX')
+        with self.assertRaises(ValueError):
+            self.registry.register_product('XXX', 'Unknown', 'Medium')
+        with self.assertRaises(ValueError):
+            LayerRegistry(Radar._radar_type_map, [layer for layer in default_layers if layer.name != 'radar'])
+
+    def test_load(self):
+        handle, path = mkstemp(suffix=".json")
+        try:
+            with open(path, "w") as f:
+                dump({"layers": [{"name": "states", "url": "Overlays/States/{0}/{1}_States_{0}.gif",
+                                  "z_order": 35, "ranges": ["Long"]}],
+                      "products": [{"code": "n1z", "name": "Long Range Reflectivity", "range": "Long"}]}, f)
+            self.registry.load(path)
+        finally:
+            remove(path)
+
+        assert self.registry.get_product('N1Z').range == 'Long'
+        assert [name for name, _, _ in self.registry.plan('HTX', 'N1Z', ['counties', 'states'])] == \
+            ['radar', 'counties', 'states']
+        assert 'states' not in [name for name, _, _ in self.registry.plan('HTX', 'N0R')]
+
+
+class TestRadarLayers(TestCase):
+
+    def setUp(self):
+        self.stand_in = RidgeStandIn(size=(60, 55)).start()
+
+        self.registry = LayerRegistry(Radar._radar_type_map)
+        # A static layer drawn above the warnings, so the static layers are split around them.
+        self.registry.register_layer(Layer('labels', 'Overlays/Cities/{0}/{1}_City_{0}.gif', 65,
+                                           ('Short', 'Long'), True, 'range'))
+        self.radar = Radar(base_url=self.stand_in.base_url, layer_registry=self.registry)
+
+    def tearDown(self):
+        self.radar.close()
+        self.stand_in.stop()
+
+    def paste_chain(self, tower_id, product, layers=None):
+        images = [get_image_from_url(self.stand_in.base_url + path).convert("RGBA")
+                  for _, path, _ in self.registry.plan(tower_id, product, layers)]
+        combined_image = Image.new("RGB", images[0].size, '#000000')
+        for image in images:
+            combined_image.paste(image, (0, 0), mask=image)
+        return combined_image
+
+    def test_static_layer_above_dynamic(self):
+        for layers in (None, ['topography', 'counties', 'warnings', 'labels'], ['labels']):
+            expected = self.paste_chain('HTX', 'N0R', layers).tobytes()
+            assert self.radar.get_image('htx', 'n0r', layers=layers).tobytes() == expected
+            assert self.radar.get_image('HTX', 'N0R', layers=layers).tobytes() == expected
+
+    def test_basemap_split_by_dynamic_layers(self):
+        # The same static layers, split around the warnings in only one of the images.
+        for order in ((['counties', 'labels'], ['counties', 'warnings', 'labels']),
+                      (['counties', 'warnings', 'labels'], ['counties', 'labels'])):
+            radar = Radar(base_url=self.stand_in.base_url, layer_registry=self.registry)
+            for layers in order:
+                assert radar.get_image('HTX', 'N0R', layers=layers).tobytes() == \
+                    self.paste_chain('HTX', 'N0R', layers).tobytes()
+
+    def test_get_methods_unchanged(self):
+        radar = Radar(base_url=self.stand_in.base_url)
+        expected = radar.get_image('HTX', 'NCR', layers=['counties', 'warnings', 'legend'])
+        image = radar.get_composite_reflectivity('HTX', include_topography=False, include_highways=False,
+                                                 include_cities=False, include_rivers=False)
+        assert image.tobytes() == expected.tobytes()
@@ -0,0 +1,97 @@
+from unittest import TestCase
+
+from noaa_radar.metrics import Metrics, to_prometheus
+from noaa_radar.radar import Radar
+from noaa_radar.tests.stand_in import RidgeStandIn
+from noaa_radar.transport import HTTPTransport
+
+__author__ = 'Chad Dotson'
+
+
+class TestMetrics(TestCase):
+
+    def test_counter(self):
+        metrics = Metrics()
+        metrics.increment('bytes_downloaded', 10, layer='radar')
+        metrics.increment('bytes_downloaded', 5, layer='radar')
+        metrics.increment('bytes_downloaded', 1, layer='legend')
+        assert metrics.get_counter('bytes_downloaded', layer='radar') == 15
+        assert metrics.get_counter('bytes_downloaded', layer='legend') == 1
+        assert metrics.get_counter('bytes_downloaded', layer='counties') == 0
+
+    def test_histogram(self):
+        metrics = Metrics(buckets=(0.1, 1.0))
+        metrics.observe('fetch_seconds', 0.05)
+        metrics.observe('fetch_seconds', 0.5)
+        metrics.observe('fetch_seconds', 5)
+        histogram = metrics.get_histogram('fetch_seconds')
+        assert histogram['buckets'] == [1, 2]
+        assert histogram['count'] == 3
+        assert histogram['sum'] == 5.55
+
+    def test_timer(self):
+        metrics = Metrics()
+        with metrics.timer('composite_seconds'):
+            pass
+        assert metrics.get_histogram('composite_seconds')['count'] == 1
+
+    def test_prometheus(self):
+        metrics = Metrics(buckets=(0.5,))
+        metrics.increment('cache_hits', cache='layer', tier='memory')
+        metrics.observe('decode_seconds', 0.25, layer='ra"dar')
+        text = to_prometheus(metrics)
+        assert '# TYPE noaa_radar_cache_hits_total counter\n' in text
+        assert 'noaa_radar_cache_hits_total{cache="layer",tier="memory"} 1\n' in text
+        assert '# TYPE noaa_radar_decode_seconds histogram\n' in text
+        assert 'noaa_radar_decode_seconds_bucket{layer="ra\\"dar",le="0.5"} 1\n' in text
+        assert 'noaa_radar_decode_seconds_bucket{layer="ra\\"dar",le="+Inf"} 1\n' in text
+        assert 'noaa_radar_decode_seconds_sum{layer="ra\\"dar"} 0.25\n' in text
+        assert 'noaa_radar_decode_seconds_count{layer="ra\\"dar"} 1\n' in text
+
+
+class TestRadarMetrics(TestCase):
+
+    def setUp(self):
+        self.stand_in = RidgeStandIn(size=(60, 55)).start()
+        self.metrics = Metrics()
+        self.radar = Radar(base_url=self.stand_in.base_url, metrics=self.metrics)
+
+    def tearDown(self):
+        self.radar.close()
+        self.stand_in.stop()
+
+    def test_stages_recorded(self):
+        self.radar.get_base_reflectivity('HTX')
+        self.radar.get_base_reflectivity('HTX')
+
+        assert self.metrics.get_counter('bytes_downloaded', layer='radar') > 0
+        assert self.metrics.get_counter('bytes_downloaded', layer='counties') > 0
+        assert self.metrics.get_counter('not_modified', layer='radar') == 1
+        assert self.metrics.get_histogram('fetch_seconds', layer='radar')['count'] == 2
+        assert self.metrics.get_histogram('decode_seconds', layer='radar')['count'] == 2
+        assert self.metrics.get_histogram('decode_seconds', layer='counties')['count'] == 1
+        assert self.metrics.get_histogram('composite_seconds')['count'] == 2
+        assert self.metrics.get_counter('cache_misses', cache='basemap') == 1
+        assert self.metrics.get_counter('cache_hits', cache='basemap') == 1
+        assert self.metrics.get_counter('cache_misses', cache='layer') == 5
+
+    def test_retries_counted(self):
+        radar = Radar(base_url=self.stand_in.base_url, transport=HTTPTransport(backoff=0, metrics=self.metrics))
+        self.stand_in.fail(2)
+        radar.get_base_reflectivity('HTX', include_topography=False, include_counties=False,
+                                    include_highways=False, include_cities=False, include_rivers=False,
+                                    include_warnings=False, include_legend=False)
+        assert self.metrics.get_counter('retries', reason='503') == 2
+
+    def test_retries_counted_by_created_transport(self):
+        self.radar._transport.backoff = 0
+        self.stand_in.fail(1)
+        self.radar.get_base_reflectivity('HTX', include_topography=False, include_counties=False,
+                                         include_highways=False, include_cities=False, include_rivers=False,
+                                         include_warnings=False, include_legend=False)
+        assert self.metrics.get_counter('retries', reason='503') == 1
+
+    def test_loop_composite_includes_basemap(self):
+        self.stand_in.set_history('N0R', 'HTX', ['20201101_1200', '20201101_1205'])
+        self.radar.get_loop('HTX', 'N0R', frames=2, output='frames')
+        assert self.metrics.get_histogram('composite_seconds')['count'] == 2
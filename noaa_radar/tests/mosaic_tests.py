@@ -0,0 +1,95 @@
+from io import BytesIO
+from unittest import skipIf, TestCase
+
+from PIL import Image
+
+from noaa_radar.mosaic import Mosaic, numpy
+from noaa_radar.radar import Radar
+from noaa_radar.scales import palette, palette_levels, reflectivity
+from noaa_radar.tests.stand_in import RidgeStandIn
+from noaa_radar.utilities import geographic_to_pixel, parse_world_file
+
+__author__ = 'Chad Dotson'
+
+
+def make_frame(levels):
+    """
+    A 4x4 frame whose columns hold the given reflectivity levels.
+    """
+    image = Image.new("P", (4, 4), 0)
+    image.putpalette(palette(reflectivity))
+    for col, level in enumerate(levels):
+        for row in range(4):
+            image.putpixel((col, row), level)
+    buf = BytesIO()
+    image.save(buf, "GIF", transparency=0)
+    return buf.getvalue()
+
+
+class TestScales(TestCase):
+
+    def test_palette_levels(self):
+        image = Image.open(BytesIO(make_frame([0, 1, 15, 7])))
+        levels = palette_levels(image, reflectivity)
+        assert [levels[image.getpixel((col, 0))] for col in range(4)] == [0, 1, 15, 7]
+
+
+@skipIf(numpy is None, "numpy is not installed")
+class TestMosaic(TestCase):
+
+    def setUp(self):
+        self.stand_in = RidgeStandIn(size=(60, 55)).start()
+        self.radar = Radar(base_url=self.stand_in.base_url)
+        # Each grid pixel is one degree.  HTX covers columns 0-3 and BMX columns 2-5.
+        self.stand_in.set_file('RadarImg/N0R/HTX_N0R_0.gif', make_frame([3, 3, 3, 3]))
+        self.stand_in.set_file('RadarImg/N0R/HTX_N0R_0.gfw', b'1.0\n0.0\n0.0\n-1.0\n0.5\n3.5\n')
+        self.stand_in.set_file('RadarImg/N0R/BMX_N0R_0.gif', make_frame([1, 5, 5, 5]))
+        self.stand_in.set_file('RadarImg/N0R/BMX_N0R_0.gfw', b'1.0\n0.0\n0.0\n-1.0\n2.5\n3.5\n')
+        self.mosaic = Mosaic(self.radar, (0, 0, 8, 4), (8, 4))
+
+    def tearDown(self):
+        self.radar.close()
+        self.stand_in.stop()
+
+    def test_parse_world_file(self):
+        assert parse_world_file('0.01\n0\n0\n-0.01\n-90.5\n38.1\n') == (0.01, 0.0, 0.0, -0.01, -90.5, 38.1)
+        with self.assertRaises(ValueError):
+            parse_world_file('0.01\n0\n')
+
+    def test_geographic_to_pixel(self):
+        world = (0.5, 0.0, 0.0, -0.25, -90.0, 38.0)
+        assert geographic_to_pixel(world, 37.5, -89.0) == (2.0, 2.0)
+
+    def test_max_merge(self):
+        image = self.mosaic.get_mosaic(['htx', 'BMX'])
+        assert image.mode == "P"
+        assert image.size == (8, 4)
+        assert image.info["transparency"] == 0
+        assert [image.getpixel((col, 1)) for col in range(8)] == [3, 3, 3, 5, 5, 5, 0, 0]
+
+    def test_index_maps_kept(self):
+        self.mosaic.get_mosaic(['HTX', 'BMX'])
+        index_maps = dict(self.mosaic._index_maps)
+        self.mosaic.get_mosaic(['HTX', 'BMX'])
+        assert len(index_maps) == 2
+        for key, index_map in self.mosaic._index_maps.items():
+            assert index_maps[key] is index_map
+
+    def test_failed_tower_left_out(self):
+        self.stand_in.set_file('RadarImg/N0R/BMX_N0R_0.gfw', b'not a world file')
+        image = self.mosaic.get_mosaic(['HTX', 'BMX'])
+        assert [image.getpixel((col, 1)) for col in range(8)] == [3, 3, 3, 3, 0, 0, 0, 0]
+
+    def test_synthesized_towers(self):
+        mosaic = Mosaic(self.radar, (-125, 25, -65, 50), (240, 100))
+        image = mosaic.get_mosaic(['ATX', 'BOX', 'FWS'])
+        assert len(image.getcolors()) > 1
+
+    def test_unknown_tower(self):
+        with self.assertRaises(ValueError):
+            self.mosaic.get_mosaic(['HTX', 'ZZZ'])
+        assert self.stand_in.requests == []
+
+    def test_product_without_scale(self):
+        with self.assertRaises(ValueError):
+            self.mosaic.get_mosaic(['HTX'], product='N0V')
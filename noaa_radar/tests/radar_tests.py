@@ -0,0 +1,229 @@
+from io import BytesIO
+from threading import Barrier, Lock
+from unittest import skipIf, TestCase
+
+from PIL import Image
+
+from noaa_radar.compositing import numpy, NumpyCompositor
+from noaa_radar.radar import Radar
+from noaa_radar.tests.stand_in import RidgeStandIn
+from noaa_radar.transport import HTTPTransport
+from noaa_radar.utilities import get_image_from_url
+
+__author__ = 'Chad Dotson'
+
+
+class OfflineRadar(Radar):
+    """
+    A Radar that draws each layer as a one pixel wide stripe instead of downloading it.
+    """
+
+    _layer_columns = {'Topo': 0, 'RadarImg': 1, 'Rivers': 2, 'County': 3, 'Highways': 4, 'Cities': 5,
+                      'Warnings': 6, 'Legend': 7}
+
+    def __init__(self, barrier=None, **kwargs):
+        """
+        :param barrier: Every draw waits at it, so no draw finishes until the barrier's parties are in flight.
+        :type barrier: threading.Barrier
+        """
+        Radar.__init__(self, **kwargs)
+        self.barrier = barrier
+        self.fail_tower = None
+        self.urls = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = Lock()
+
+    def _draw(self, url):
+        with self._lock:
+            self.urls.append(url)
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            if self.barrier is not None:
+                self.barrier.wait()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+        if self.fail_tower and '/%s_' % self.fail_tower in url:
+            raise IOError("Unable to fetch %s" % url)
+
+        image = Image.new("RGBA", (8, 2), (0, 0, 0, 0))
+        for name, column in self._layer_columns.items():
+            if '/%s/' % name in url:
+                image.putpixel((column, 0), (column * 30, 10, 20, 255))
+                # Every layer also covers the top-right pixel, so the last layer drawn wins there.
+                image.putpixel((7, 1), (column * 30, 10, 20, 255))
+        return image
+
+    def _get_layer(self, url, name='radar'):
+        return self._draw(url)
+
+    def _get_static_layer(self, url, name=None):
+        return self._draw(url)
+
+
+class TestRadar(TestCase):
+
+    def test_layers_downloaded_in_parallel(self):
+        # Downloaded one at a time, the first draw would wait at the barrier until it timed out.
+        radar = OfflineRadar(barrier=Barrier(8, timeout=10))
+        radar.get_base_reflectivity('htx')
+        assert radar.peak_in_flight == 8
+        assert len(radar.urls) == 8
+
+    def test_layers_composited_in_order(self):
+        image = OfflineRadar().get_base_reflectivity('HTX', include_legend=False)
+        assert image.mode == "RGB"
+        assert image.getpixel((7, 1)) == (6 * 30, 10, 20)
+        assert image.getpixel((7, 0)) == (0, 0, 0)
+
+    def test_only_requested_layers_fetched(self):
+        radar = OfflineRadar()
+        radar.get_base_reflectivity('HTX', include_topography=False, include_cities=False)
+        assert len(radar.urls) == 6
+        assert not [url for url in radar.urls if 'Topo' in url or 'City' in url]
+
+    def test_long_range_has_no_rivers(self):
+        radar = OfflineRadar()
+        radar._build_radar_image('HTX', 'N0Z')
+        assert not [url for url in radar.urls if 'Rivers' in url]
+
+    def test_render_many_shares_downloads(self):
+        radar = OfflineRadar()
+        results = list(radar.render_many([('HTX', 'N0R'), ('htx', 'ncr', {'include_legend': False}),
+                                          ('FFC', 'N0R', {'background': '#ffffff'})]))
+        assert len(results) == 3
+        assert not [result for result in results if result.error]
+        assert len([url for url in radar.urls if '/County/' in url]) == 2
+        assert len(radar.urls) == len(set(radar.urls))
+
+    def test_render_many_reports_errors_per_item(self):
+        radar = OfflineRadar()
+        radar.fail_tower = 'BMX'
+        results = list(radar.render_many([('HTX', 'N0R'), ('HTX', 'XXX'), ('BMX', 'N0R'), ('ZZZ', 'N0R'),
+                                          ('HTX', 'N0R', {'include_nothing': True})]))
+        errors = dict((result.request[:2], result.error) for result in results if result.error)
+        assert isinstance(errors[('HTX', 'XXX')], KeyError)
+        assert isinstance(errors[('BMX', 'N0R')], IOError)
+        assert isinstance(errors[('ZZZ', 'N0R')], ValueError)
+        assert isinstance(errors[('HTX', 'N0R')], TypeError)
+        assert [result.image.size for result in results if result.image] == [(8, 2)]
+
+
+class TestRadarStandIn(TestCase):
+
+    def setUp(self):
+        self.stand_in = RidgeStandIn(size=(120, 110)).start()
+        self.radar = Radar(base_url=self.stand_in.base_url)
+
+    def tearDown(self):
+        self.radar.close()
+        self.stand_in.stop()
+
+    def test_render_bytes_cached(self):
+        first = self.radar.render_bytes('htx', 'N0R')
+        assert Image.open(BytesIO(first)).format == "JPEG"
+
+        self.radar._compositor = None
+        assert self.radar.render_bytes('HTX', 'N0R') is first
+
+    def test_close(self):
+        transport = HTTPTransport()
+        with Radar(base_url=self.stand_in.base_url, transport=transport) as radar:
+            radar.get_image('HTX', 'N0R', layers=[])
+        assert transport._idle
+        with self.assertRaises(RuntimeError):
+            radar.get_image('HTX', 'N0R', layers=[])
+
+        self.radar.get_image('HTX', 'N0R', layers=[])
+        self.radar.close()
+        assert not self.radar._transport._idle
+
+    def test_render_bytes_fresh(self):
+        for _ in range(3):
+            self.radar.render_bytes('HTX', 'N0R')
+        assert len([path for path, _ in self.stand_in.requests if 'HTX_N0R_0.gif' in path]) == 1
+
+    def test_render_bytes_new_frame(self):
+        self.radar.close()
+        self.radar = Radar(base_url=self.stand_in.base_url, freshness=0)
+        first = self.radar.render_bytes('HTX', 'N0R', image_format='png')
+        self.stand_in.set_file('RadarImg/N0R/HTX_N0R_0.gif', self.radar._transport.get_bytes(
+            self.stand_in.base_url + 'RadarImg/N0Z/HTX_N0Z_0.gif'))
+        second = self.radar.render_bytes('HTX', 'N0R', image_format='png')
+        assert second != first
+        assert self.stand_in.count('/Topo/') == 1
+
+    def test_render_bytes_options_in_key(self):
+        first = self.radar.render_bytes('HTX', 'N0R')
+        assert self.radar.render_bytes('HTX', 'N0R', include_counties=False) != first
+        assert self.radar.render_bytes('HTX', 'N0R', quality=50) != first
+
+    def paste_chain(self, tower_id, product, background='#000000', **options):
+        layers = self.radar._plan_layers(tower_id, product, **options)
+        images = [get_image_from_url(url).convert("RGBA") for _, url, _ in layers]
+        combined_image = Image.new("RGB", images[0].size, background)
+        for image in images:
+            combined_image.paste(image, (0, 0), mask=image)
+        return combined_image
+
+    def test_basemap_matches_paste_chain(self):
+        for options in ({}, {'include_topography': False}, {'include_counties': False, 'include_legend': False},
+                        {'background': '#336699', 'include_topography': False}):
+            expected = self.paste_chain('HTX', 'N0R', **options)
+            assert self.radar.get_base_reflectivity('HTX', **options).tobytes() == expected.tobytes()
+            assert self.radar.get_base_reflectivity('HTX', **options).tobytes() == expected.tobytes()
+
+    @skipIf(numpy is None, "numpy is not installed")
+    def test_numpy_compositor_matches_paste_chain(self):
+        radar = Radar(base_url=self.stand_in.base_url, compositor=NumpyCompositor())
+        for product in radar._radar_type_map:
+            expected = self.paste_chain('HTX', product)
+            assert radar._build_radar_image('HTX', product).tobytes() == expected.tobytes()
+
+    def test_basemap_reused(self):
+        self.radar.get_base_reflectivity('HTX')
+        self.radar.get_composite_reflectivity('HTX')
+        assert len(self.radar._basemaps) == 1
+        assert self.stand_in.count('/Overlays/') == 5
+        assert self.stand_in.count('/RadarImg/') == 2
+
+    def test_basemap_eviction(self):
+        radar = Radar(base_url=self.stand_in.base_url, max_basemaps=1)
+        radar.get_base_reflectivity('HTX')
+        radar.get_base_reflectivity('FFC')
+        assert list(radar._basemaps) == [radar._basemap_key(radar._plan_layers('FFC', 'N0R'), '#000000')]
+
+    def test_loop(self):
+        self.stand_in.set_history('N0R', 'HTX', ['20201101_1200', '20201101_1205', '20201101_1210'])
+        data = self.radar.get_loop('htx', 'n0r', frames=2)
+        loop = Image.open(BytesIO(data))
+        assert loop.format == 'GIF'
+        assert loop.n_frames == 2
+        assert self.stand_in.count('_N0R.gif') == 2
+
+    def test_loop_fetches_only_new_frames(self):
+        self.stand_in.set_history('N0R', 'HTX', ['20201101_1200', '20201101_1205'])
+        first = self.radar.get_loop('HTX', 'N0R', frames=2, output='frames')
+        self.stand_in.set_history('N0R', 'HTX', ['20201101_1200', '20201101_1205', '20201101_1210'])
+        second = self.radar.get_loop('HTX', 'N0R', frames=2, output='frames')
+
+        assert self.stand_in.count('_N0R.gif') == 3
+        assert second[0].tobytes() == first[1].tobytes()
+        assert [name for name, _ in self.radar._loops[('HTX', 'N0R')]] == ['HTX_20201101_1205_N0R.gif',
+                                                                           'HTX_20201101_1210_N0R.gif']
+
+    def test_loop_frames_match_single_images(self):
+        self.stand_in.set_history('N0R', 'HTX', ['20201101_1200'])
+        self.stand_in.set_file('RadarImg/N0R/HTX/HTX_20201101_1200_N0R.gif',
+                               self.radar._transport.get_bytes(self.stand_in.base_url + 'RadarImg/N0R/HTX_N0R_0.gif'))
+        frame = self.radar.get_loop('HTX', 'N0R', output='frames')[0]
+        assert frame.tobytes() == self.radar.get_base_reflectivity('HTX').tobytes()
+
+    def test_apng_loop(self):
+        self.stand_in.set_history('N0R', 'HTX', ['20201101_1200', '20201101_1205'])
+        loop = Image.open(BytesIO(self.radar.get_loop('HTX', 'N0R', output='png')))
+        assert loop.format == 'PNG'
+        assert loop.n_frames == 2
@@ -0,0 +1,111 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from multiprocessing import get_context
+from unittest import TestCase
+
+from PIL import Image
+
+from noaa_radar.layers import Layer, LayerRegistry
+from noaa_radar.tests.stand_in import RidgeStandIn
+from scripts.radar_server import _init_worker, RadarServer
+
+__author__ = 'Chad Dotson'
+
+
+class TestRadarServer(TestCase):
+
+    def setUp(self):
+        self.stand_in = RidgeStandIn(size=(60, 55)).start()
+        self.executor = ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn'), initializer=_init_worker,
+                                            initargs=(self.stand_in.base_url,))
+        self.server = RadarServer(self.executor, max_age=30)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.stand_in.stop()
+
+    def respond(self, target, headers=None):
+        return asyncio.run(self.server.respond('GET', target, headers or {}))
+
+    def test_png(self):
+        status, headers, body = self.respond('/radar/htx/N0R.png?layers=counties,warnings')
+        headers = dict(headers)
+        assert status == 200
+        assert headers['Content-Type'] == 'image/png'
+        assert headers['Cache-Control'] == 'public, max-age=30'
+        assert Image.open(BytesIO(body)).size == (60, 55)
+        assert self.stand_in.count('/Topo/') == 0
+
+    def test_not_modified(self):
+        _, headers, _ = self.respond('/radar/HTX/N0R.jpg')
+        status, _, body = self.respond('/radar/HTX/N0R.jpg', {'if-none-match': dict(headers)['ETag']})
+        assert status == 304
+        assert body == b''
+
+    def test_bad_requests(self):
+        assert self.respond('/radar/HTX/XXX.png')[0] == 404
+        assert self.respond('/radar/ZZZ/N0R.png')[0] == 404
+        assert self.respond('/other')[0] == 404
+        assert self.respond('/radar/HTX/N0R.png?layers=clouds')[0] == 400
+        assert self.respond('/radar/HTX/N0R.png?background=%23zzzzzz')[0] == 400
+        assert self.respond('/radar/HTX/N0R.png?background=navy')[0] == 200
+        assert self.server.renders == 1
+
+    def test_registry(self):
+        registry = LayerRegistry()
+        registry.register_layer(Layer('labels', 'Overlays/Cities/{0}/{1}_City_{0}.gif', 65, ('Short', 'Long'), True,
+                                      'range'))
+        registry.register_product('N1Z', 'Long Range Reflectivity', 'Long')
+        server = RadarServer(self.executor, registry=registry)
+        assert server._parse('/radar/htx/n1z.png?layers=labels') == ('HTX', 'N1Z', 'png', '#000000', ('labels',))
+        assert self.server._parse('/radar/HTX/N1Z.png') is None
+        with self.assertRaises(ValueError):
+            self.server._parse('/radar/HTX/N0R.png?layers=labels')
+
+    def test_concurrent_requests_share_render(self):
+        async def request_many():
+            return await asyncio.gather(*[self.server.respond('GET', '/radar/HTX/N0R.png', {}) for _ in range(5)])
+
+        responses = asyncio.run(request_many())
+        assert set(status for status, _, _ in responses) == {200}
+        assert len(set(body for _, _, body in responses)) == 1
+        assert self.server.renders == 1
+        assert self.stand_in.count('/RadarImg/') == 1
+
+    def exchange(self, data):
+        """
+        Send raw bytes on one connection and read everything the server answers until it closes the connection.
+        """
+        async def request():
+            server = await asyncio.start_server(self.server.handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(data)
+            response = await reader.read()
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return response
+
+        return asyncio.run(request())
+
+    def test_connection(self):
+        response = self.exchange(b'GET /radar/HTX/N0R.png HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n')
+        head, _, body = response.partition(b'\r\n\r\n')
+        assert head.startswith(b'HTTP/1.1 200 OK')
+        assert Image.open(BytesIO(body)).format == 'PNG'
+
+    def test_request_body_drained(self):
+        response = self.exchange(b'POST /radar/HTX/N0R.png HTTP/1.1\r\nContent-Length: 14\r\n\r\n'
+                                 b'GET / HTTP/1.1'
+                                 b'HEAD /radar/HTX/N0R.png HTTP/1.1\r\nConnection: close\r\n\r\n')
+        assert response.startswith(b'HTTP/1.1 405 Method Not Allowed')
+        assert response.count(b'HTTP/1.1 ') == 2
+        assert b'\r\n\r\nHTTP/1.1 200 OK' in response
+
+    def test_malformed_request_line(self):
+        response = self.exchange(b'GARBAGE\r\nHost: localhost\r\n\r\nGET /radar/HTX/N0R.png HTTP/1.1\r\n\r\n')
+        assert response.startswith(b'HTTP/1.1 400 Bad Request')
+        assert b'Connection: close' in response
+        assert response.count(b'HTTP/1.1 ') == 1
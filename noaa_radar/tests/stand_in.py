@@ -0,0 +1,204 @@
+"""
+A local stand-in for the NOAA RIDGE site, serving synthesized radar images so the tests can run offline.
+"""
+
+from email.utils import formatdate
+from hashlib import sha1
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO
+from os import sep, walk
+from os.path import join, relpath
+from random import Random
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
+
+from PIL import Image, ImageDraw
+
+__author__ = 'Chad Dotson'
+
+
+_radar_colors = [(4, 233, 231), (1, 159, 244), (3, 0, 244), (2, 253, 2), (1, 197, 1), (0, 142, 0), (253, 248, 2),
+                 (229, 188, 0), (253, 149, 0), (253, 0, 0), (212, 0, 0), (188, 0, 0), (248, 0, 253), (152, 84, 198),
+                 (253, 253, 253)]
+
+
+def _gif(image, transparency=0):
+    buf = BytesIO()
+    image.save(buf, "GIF", transparency=transparency)
+    return buf.getvalue()
+
+
+def synthesize(path, size=(600, 550)):
+    """
+    Draw a RIDGE-like image for a path.  The same path always gives the same image.
+    """
+    random = Random(sha1(path.encode("utf-8")).hexdigest())
+    width, height = size
+
+    if path.endswith(".gfw"):
+        # A world file placing the tower, named by the file, somewhere in the United States.  Every image covers
+        # the same area whatever its size.
+        tower = Random(path.rsplit("/", 1)[-1].split("_")[0])
+        x_scale, y_scale = 0.011785 * 600 / width, -0.009991 * 550 / height
+        west, north = tower.uniform(-120, -80), tower.uniform(32, 48)
+        return ("%f\n0.0\n0.0\n%f\n%f\n%f\n" % (x_scale, y_scale, west, north)).encode("ascii")
+
+    if path.endswith(".jpg"):
+        image = Image.new("RGB", size)
+        draw = ImageDraw.Draw(image)
+        for y in range(0, height, 10):
+            shade = random.randint(60, 160)
+            draw.rectangle([0, y, width, y + 10], fill=(shade, shade - 20, shade - 50))
+        buf = BytesIO()
+        image.save(buf, "JPEG", quality=90)
+        return buf.getvalue()
+
+    image = Image.new("P", size, 0)
+    palette = [0, 0, 0]
+    for color in _radar_colors:
+        palette.extend(color)
+    image.putpalette(palette + [0] * (768 - len(palette)))
+    draw = ImageDraw.Draw(image)
+
+    if "/RadarImg/" in path:
+        for _ in range(12):
+            x, y, radius = random.randint(0, width), random.randint(0, height), random.randint(10, 60)
+            for level in range(random.randint(1, len(_radar_colors))):
+                shrink = radius * level // len(_radar_colors)
+                draw.ellipse([x - radius + shrink, y - radius + shrink, x + radius - shrink, y + radius - shrink],
+                             fill=level + 1)
+    elif "/Legend/" in path:
+        for level in range(len(_radar_colors)):
+            draw.rectangle([width - 20, level * 20, width, level * 20 + 20], fill=level + 1)
+    else:
+        for _ in range(15):
+            draw.line([random.randint(0, width), random.randint(0, height),
+                       random.randint(0, width), random.randint(0, height)],
+                      fill=random.randint(1, len(_radar_colors)), width=random.randint(1, 3))
+
+    return _gif(image)
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        status, headers, body = self.server.stand_in.respond(self.path, self.headers)
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+
+class RidgeStandIn:
+    """
+    Serves /ridge/... on localhost.  Files can be replaced with set_file and failures injected with fail.
+    """
+
+    def __init__(self, size=(600, 550)):
+        self.size = size
+        self.requests = []
+
+        self._lock = Lock()
+        self._files = {}
+        self._failures = []
+        self._server = None
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:%s/ridge/" % self._server.server_address[1]
+
+    def start(self):
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.stand_in = self
+        thread = Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05})
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def set_file(self, path, data):
+        """
+        Serve data for a path relative to /ridge/.
+        """
+        with self._lock:
+            self._files["/ridge/" + path] = self._entry(data)
+
+    def load_fixtures(self, directory):
+        """
+        Serve every file below directory at its relative path, such as RadarImg/N0R/HTX_N0R_0.gif.
+        """
+        for root, _, names in walk(directory):
+            for name in names:
+                path = join(root, name)
+                with open(path, "rb") as f:
+                    self.set_file(relpath(path, directory).replace(sep, "/"), f.read())
+
+    def set_history(self, product, tower_id, times):
+        """
+        List frames of a product for a tower, named by "YYYYMMDD_HHMM" times.
+        """
+        names = ['{1}_{2}_{0}.gif'.format(product, tower_id, time) for time in times]
+        links = ''.join('<a href="%s">%s</a>\n' % (name, name) for name in names)
+        self.set_file('RadarImg/{0}/{1}/'.format(product, tower_id),
+                      ('<html><body><a href="../">Parent Directory</a>\n%s</body></html>' % links).encode("utf-8"))
+
+    def fail(self, count, status=503):
+        """
+        Answer the next count requests with status.
+        """
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def count(self, fragment):
+        """
+        The number of requests whose path contains fragment and were answered with a body.
+        """
+        with self._lock:
+            return len([path for path, status in self.requests if fragment in path and status == 200])
+
+    def _entry(self, data):
+        return data, '"%s"' % sha1(data).hexdigest()[:16], formatdate(usegmt=True)
+
+    def respond(self, path, headers):
+        with self._lock:
+            if self._failures:
+                status = self._failures.pop(0)
+                self.requests.append((path, status))
+                return status, [], b""
+
+            if path not in self._files:
+                if not path.startswith("/ridge/"):
+                    self.requests.append((path, 404))
+                    return 404, [], b""
+                self._files[path] = self._entry(synthesize(path, self.size))
+
+            data, etag, last_modified = self._files[path]
+
+            if headers.get("If-None-Match") == etag:
+                self.requests.append((path, 304))
+                return 304, [("ETag", etag), ("Last-Modified", last_modified)], b""
+
+            self.requests.append((path, 200))
+            return 200, [("ETag", etag), ("Last-Modified", last_modified)], data
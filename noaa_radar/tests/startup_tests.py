@@ -0,0 +1,100 @@
+from io import BytesIO
+from json import dump, loads
+from os import environ, pathsep
+from os.path import abspath, dirname, join
+from shutil import rmtree
+from subprocess import PIPE, Popen
+from sys import executable
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from PIL import Image
+
+from noaa_radar.tests.stand_in import RidgeStandIn, synthesize
+
+__author__ = 'Chad Dotson'
+
+root = dirname(dirname(dirname(abspath(__file__))))
+script = join(root, 'scripts', 'fetch_radar_image_cli.py')
+
+heavy_modules = ('PIL', 'noaa_radar.radar', 'noaa_radar.transport', 'http.client')
+
+# Runs code in a fresh interpreter, then prints which of the heavy modules it loaded, even if the code exits.
+probe = """
+import json, sys
+try:
+    exec(sys.argv[1])
+except SystemExit:
+    pass
+finally:
+    sys.stderr.write(json.dumps([name for name in %r if name in sys.modules]))
+""" % (heavy_modules,)
+
+
+def loaded_modules(code):
+    env = dict(environ)
+    env['PYTHONPATH'] = pathsep.join(filter(None, [root, environ.get('PYTHONPATH')]))
+    process = Popen([executable, '-c', probe, code], stdout=PIPE, stderr=PIPE, env=env, cwd=root)
+    stdout, stderr = process.communicate()
+    return stdout, loads(stderr.decode().splitlines()[-1])
+
+
+def run_script(*arguments):
+    return "import runpy; sys.argv = %r; runpy.run_path(%r, run_name='__main__')" % ([script] + list(arguments),
+                                                                                    script)
+
+
+class TestStartup(TestCase):
+
+    def test_import_package(self):
+        assert loaded_modules('import noaa_radar')[1] == []
+        assert loaded_modules('import noaa_radar.cache, noaa_radar.towers, noaa_radar.watch')[1] == []
+        assert 'PIL' in loaded_modules('from noaa_radar import Radar')[1]
+
+    def test_help_and_validation(self):
+        assert loaded_modules(run_script('--help'))[1] == []
+        assert loaded_modules(run_script('ZZZ', 'out.jpg', '--base_reflectivity'))[1] == []
+        assert loaded_modules(run_script('HTX', 'out.jpg', '--product', 'XXX'))[1] == []
+
+    def test_cache_hit(self):
+        directory = mkdtemp()
+        try:
+            with RidgeStandIn(size=(60, 55)) as stand_in:
+                arguments = ('htx', '-', '--product', 'n0r', '--layers', 'counties', '--format', 'png',
+                             '--cache_dir', directory, '--base_url', stand_in.base_url)
+                first = loaded_modules(run_script(*arguments))[0]
+                second = loaded_modules(run_script(*arguments))[0]
+                assert Image.open(BytesIO(first)).format == 'PNG'
+                assert second == first
+                assert stand_in.count('/County/') == 1
+
+                # A new radar frame upstream is drawn, not answered from the cache.
+                stand_in.set_file('RadarImg/N0R/HTX_N0R_0.gif', synthesize('/ridge/RadarImg/N0R/FFC_N0R_0.gif',
+                                                                           (60, 55)))
+                assert loaded_modules(run_script(*arguments))[0] != first
+        finally:
+            rmtree(directory)
+
+    def test_default_format(self):
+        with RidgeStandIn(size=(60, 55)) as stand_in:
+            baseline = loaded_modules(run_script('HTX', '-', '--product', 'N0R', '--base_url', stand_in.base_url))[0]
+            tuned = loaded_modules(run_script('HTX', '-', '--product', 'N0R', '--quality', '90',
+                                              '--base_url', stand_in.base_url))[0]
+        assert 'progressive' not in Image.open(BytesIO(baseline)).info
+        assert 'progressive' in Image.open(BytesIO(tuned)).info
+
+    def test_cache_keyed_on_registry_contents(self):
+        directory = mkdtemp()
+        registry = join(directory, 'registry.json')
+        try:
+            with RidgeStandIn(size=(60, 55)) as stand_in:
+                arguments = ('HTX', '-', '--product', 'N0R', '--layers', 'counties', '--registry', registry,
+                             '--cache_dir', join(directory, 'cache'), '--base_url', stand_in.base_url)
+                for code in ('N1Z', 'N1Z', 'N2Z'):
+                    with open(registry, 'w') as f:
+                        dump({"products": [{"code": code, "name": "Long Range Reflectivity", "range": "Long"}]}, f)
+                    loaded_modules(run_script(*arguments))
+                # Only the edited registry missed the cache and drew the image again.
+                assert stand_in.count('/County/') == 2
+        finally:
+            rmtree(directory)
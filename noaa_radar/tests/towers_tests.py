@@ -0,0 +1,57 @@
+from unittest import TestCase
+
+from noaa_radar.towers import default_index, distance_km, load_towers, nearest_towers, Tower, TowerIndex
+
+__author__ = 'Chad Dotson'
+
+
+class TestTowers(TestCase):
+
+    def test_bundled_towers(self):
+        towers = load_towers()
+        assert len(towers) > 150
+        assert len(set(tower.id for tower in towers)) == len(towers)
+        assert default_index().get('htx').name == 'Huntsville'
+
+    def test_validate(self):
+        assert default_index().validate('htx') == 'HTX'
+        assert 'BMX' in default_index()
+        with self.assertRaises(ValueError):
+            default_index().validate('ZZZ')
+
+    def test_distance(self):
+        assert abs(distance_km(34.931, -86.084, 33.172, -86.770) - 205) < 2
+
+    def test_nearest(self):
+        towers = nearest_towers(34.73, -86.59, k=3)
+        assert [tower.id for tower, _ in towers] == ['HTX', 'OHX', 'BMX']
+        assert [distance for _, distance in towers] == sorted(distance for _, distance in towers)
+
+    def test_nearest_matches_brute_force(self):
+        index = default_index()
+        for latitude in range(-10, 75, 7):
+            for longitude in range(-180, 180, 13):
+                expected = sorted((distance_km(latitude, longitude, tower.latitude, tower.longitude), tower.id)
+                                  for tower in index)[:4]
+                found = index.nearest_towers(latitude, longitude, k=4)
+                assert [tower.id for tower, _ in found] == [tower_id for _, tower_id in expected]
+
+    def test_nearest_across_antimeridian(self):
+        index = TowerIndex([Tower('EEE', 'East', '', 0.0, 179.5), Tower('WWW', 'West', '', 0.0, -170.0)])
+        assert index.nearest_towers(0.0, -179.5, k=1)[0][0].id == 'EEE'
+
+    def test_nearest_none(self):
+        assert nearest_towers(34.73, -86.59, k=0) == []
+        with self.assertRaises(ValueError):
+            nearest_towers(34.73, -86.59, k=-1)
+
+    def test_nearest_in_range(self):
+        assert nearest_towers(0.0, -140.0, product='N0R') == []
+        assert [tower.id for tower, _ in nearest_towers(34.73, -86.59, k=10, product='N0R')][:2] == ['HTX', 'OHX']
+        assert len(nearest_towers(34.73, -86.59, k=50, product='N0Z')) > len(
+            nearest_towers(34.73, -86.59, k=50, product='N0R'))
+
+    def test_products(self):
+        products = dict(default_index().products('HTX'))
+        assert products['N0R'] == 'Short'
+        assert products['N0Z'] == 'Long'
@@ -0,0 +1,83 @@
+from unittest import TestCase
+
+from noaa_radar.radar import Radar
+from noaa_radar.tests.stand_in import RidgeStandIn
+from noaa_radar.transport import HTTPTransport, TransportError
+
+__author__ = 'Chad Dotson'
+
+
+class TestHTTPTransport(TestCase):
+
+    def setUp(self):
+        self.stand_in = RidgeStandIn(size=(60, 55)).start()
+        self.transport = HTTPTransport(backoff=0)
+        self.url = self.stand_in.base_url + 'RadarImg/N0R/HTX_N0R_0.gif'
+
+    def tearDown(self):
+        self.transport.close()
+        self.stand_in.stop()
+
+    def test_get(self):
+        response = self.transport.get(self.url)
+        assert response.body.startswith(b'GIF')
+        assert response.etag
+        assert response.last_modified
+        assert not response.revalidated
+
+    def test_revalidation(self):
+        first = self.transport.get(self.url)
+        second = self.transport.get(self.url)
+        assert second.revalidated
+        assert second.body == first.body
+        assert [status for _, status in self.stand_in.requests] == [200, 304]
+
+    def test_changed_file_downloaded(self):
+        self.transport.get(self.url)
+        self.stand_in.set_file('RadarImg/N0R/HTX_N0R_0.gif', b'GIF89a changed')
+        response = self.transport.get(self.url)
+        assert not response.revalidated
+        assert response.body == b'GIF89a changed'
+
+    def test_connection_reused(self):
+        self.transport.get(self.url)
+        self.transport.get(self.stand_in.base_url + 'Warnings/Short/HTX_Warnings_0.gif')
+        assert len(self.transport._idle[('http', self.url.split('/')[2])]) == 1
+
+    def test_retry(self):
+        self.stand_in.fail(2)
+        assert self.transport.get(self.url).body.startswith(b'GIF')
+
+    def test_retries_exhausted(self):
+        self.stand_in.fail(4)
+        with self.assertRaises(TransportError) as context:
+            self.transport.get(self.url)
+        assert context.exception.status == 503
+
+    def test_not_found(self):
+        with self.assertRaises(TransportError) as context:
+            self.transport.get(self.url.replace('/ridge/', '/missing/'))
+        assert context.exception.status == 404
+
+    def test_radar_uses_transport(self):
+        radar = Radar(transport=self.transport, base_url=self.stand_in.base_url)
+        image = radar.get_base_reflectivity('HTX')
+        assert image.size == (60, 55)
+        assert self.stand_in.count('/RadarImg/') == 1
+
+        radar.get_base_reflectivity('HTX')
+        assert self.stand_in.count('/RadarImg/') == 1
+        assert self.stand_in.count('/Topo/') == 1
+
+    def test_revalidated_bodies_bounded_in_bytes(self):
+        size = len(self.transport.get(self.url).body)
+        transport = HTTPTransport(max_revalidated_bytes=size)
+        try:
+            transport.get(self.url)
+            transport.get(self.stand_in.base_url + 'Warnings/Short/HTX_Warnings_0.gif')
+            assert list(transport._revalidated) == [self.stand_in.base_url + 'Warnings/Short/HTX_Warnings_0.gif']
+            assert transport._revalidated_bytes <= size
+
+            assert not transport.get(self.url).revalidated
+        finally:
+            transport.close()
@@ -0,0 +1,37 @@
+from unittest import TestCase
+
+from noaa_radar.tests.stand_in import RidgeStandIn, synthesize
+from noaa_radar.transport import HTTPTransport
+from noaa_radar.utilities import get_image_from_bytes, get_image_from_url
+
+__author__ = 'Chad Dotson'
+
+
+class TestUtilities(TestCase):
+
+    def test_image_loaded(self):
+        image = get_image_from_bytes(synthesize('/ridge/RadarImg/N0R/HTX_N0R_0.gif', (600, 550)))
+        assert image.mode == "P"
+        assert image.size == (600, 550)
+        assert image.info.get("transparency") == 0
+        assert image.getpixel((0, 0)) is not None
+
+    def test_reduced_gif(self):
+        data = synthesize('/ridge/RadarImg/N0R/HTX_N0R_0.gif', (600, 550))
+        image = get_image_from_bytes(data, size=(150, 150))
+        assert image.mode == "P"
+        assert image.size == (150, 138)
+
+    def test_reduced_jpeg(self):
+        data = synthesize('/ridge/Overlays/Topo/Short/HTX_Topo_Short.jpg', (600, 550))
+        image = get_image_from_bytes(data, size=(150, 150))
+        assert image.mode == "RGB"
+        assert image.size == (150, 138)
+
+    def test_image_from_url(self):
+        with RidgeStandIn(size=(60, 55)) as stand_in:
+            transport = HTTPTransport()
+            image = get_image_from_url(stand_in.base_url + 'RadarImg/N0R/HTX_N0R_0.gif', transport=transport,
+                                       size=(30, 30))
+            transport.close()
+        assert image.size == (30, 28)
@@ -0,0 +1,128 @@
+from io import BytesIO
+from math import isnan
+from time import time
+from unittest import skipIf, TestCase
+
+from PIL import Image
+
+from noaa_radar.radar import Radar
+from noaa_radar.scales import palette, reflectivity, velocity
+from noaa_radar.tests.stand_in import RidgeStandIn
+from noaa_radar import values as values_module
+from noaa_radar.values import numpy, RadarValues, value_lookup
+
+__author__ = 'Chad Dotson'
+
+
+def make_frame(rows, scale=reflectivity):
+    """
+    A frame whose pixels hold the given levels of a scale, 0 for no echo.
+    """
+    image = Image.new("P", (len(rows[0]), len(rows)), 0)
+    image.putpalette(palette(scale))
+    for row, levels in enumerate(rows):
+        for col, level in enumerate(levels):
+            image.putpixel((col, row), level)
+    buf = BytesIO()
+    image.save(buf, "GIF", transparency=0)
+    return buf.getvalue()
+
+
+@skipIf(numpy is None, "numpy is not installed")
+class TestRadarValues(TestCase):
+
+    def setUp(self):
+        # One pixel per tenth of a degree, with the center of the top left pixel at 35N 87W.
+        self.world = (0.1, 0.0, 0.0, -0.1, -87.0, 35.0)
+        image = Image.open(BytesIO(make_frame([[0, 1, 2, 3],
+                                               [4, 5, 6, 7],
+                                               [8, 9, 10, 11],
+                                               [12, 13, 14, 15]])))
+        self.values = RadarValues.from_image(image, self.world, reflectivity)
+
+    def test_lookup(self):
+        image = Image.open(BytesIO(make_frame([[0, 1, 14]], velocity)))
+        lookup = value_lookup(image, velocity)
+        assert [lookup[image.getpixel((col, 0))] for col in (1, 2)] == [-64, 64]
+        assert isnan(lookup[image.getpixel((0, 0))])
+
+    def test_values(self):
+        values = self.values.values()
+        assert values.dtype == numpy.float32
+        assert isnan(values[0, 0])
+        assert values[3, 3] == 75
+        assert self.values.indexes.dtype == numpy.uint8
+
+    def test_point(self):
+        assert self.values.at(34.9, -86.9) == 25
+        assert self.values.at(34.71, -86.79) == 70
+        assert self.values.at(34.7, -86.7) == 75
+        assert isnan(self.values.at(35.0, -87.0))
+        assert isnan(self.values.at(40.0, -87.0))
+
+    def test_polygon(self):
+        # Around the centers of the top right two by two pixels.
+        polygon = [(35.05, -86.85), (35.05, -86.65), (34.85, -86.65), (34.85, -86.85)]
+        assert sorted(self.values.values_in(polygon)) == [10, 15, 30, 35]
+        assert self.values.maximum(polygon) == 35
+        assert self.values.minimum(polygon) == 10
+
+    def test_triangle(self):
+        # Every pixel whose column and row add up to at most 4, leaving out 50, 70 and 75 dBZ.
+        polygon = [(35.05, -87.05), (35.05, -86.45), (34.45, -87.05)]
+        assert len(self.values.values_in(polygon)) == 13
+        assert self.values.maximum(polygon) == 65
+
+    def test_polygon_without_echo(self):
+        assert isnan(self.values.maximum([(35.0, -87.0), (35.0, -87.0), (35.0, -87.0)]))
+        assert isnan(self.values.maximum([(45.0, -70.0), (45.0, -69.0), (44.0, -69.0)]))
+
+    def test_region_reused(self):
+        region = self.values.region([(35.05, -87.05), (35.05, -86.65), (34.65, -86.65), (34.65, -87.05)])
+        assert self.values.maximum(region) == 75
+
+        started = time()
+        for _ in range(1000):
+            self.values.maximum(region)
+        assert time() - started < 1
+
+
+@skipIf(numpy is None, "numpy is not installed")
+class TestRadarGetValues(TestCase):
+
+    def setUp(self):
+        self.stand_in = RidgeStandIn(size=(60, 55)).start()
+        self.radar = Radar(base_url=self.stand_in.base_url)
+
+    def tearDown(self):
+        self.radar.close()
+        self.stand_in.stop()
+
+    def test_get_values(self):
+        self.stand_in.set_file('RadarImg/N0R/HTX_N0R_0.gif', make_frame([[0, 10], [3, 0]]))
+        self.stand_in.set_file('RadarImg/N0R/HTX_N0R_0.gfw', b'0.5\n0.0\n0.0\n-0.5\n-87.0\n35.0\n')
+        values = self.radar.get_values('htx', 'n0r')
+        assert values.unit == 'dBZ'
+        assert values.at(35.0, -86.5) == 50
+        assert values.maximum([(35.2, -87.2), (35.2, -86.3), (34.3, -86.3), (34.3, -87.2)]) == 50
+
+    def test_synthesized_frame(self):
+        values = self.radar.get_values('HTX', 'N0R')
+        assert values.indexes.shape == (55, 60)
+        assert numpy.nanmax(values.values()) >= 5
+
+    def test_unknown_product(self):
+        with self.assertRaises(KeyError):
+            self.radar.get_values('HTX', 'XXX')
+
+
+class TestWithoutNumpy(TestCase):
+
+    def test_from_image(self):
+        image = Image.open(BytesIO(make_frame([[0, 10], [3, 0]])))
+        installed, values_module.numpy = values_module.numpy, None
+        try:
+            with self.assertRaises(ImportError):
+                RadarValues.from_image(image, (0.5, 0.0, 0.0, -0.5, -87.0, 35.0), reflectivity)
+        finally:
+            values_module.numpy = installed
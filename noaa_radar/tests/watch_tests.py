@@ -0,0 +1,95 @@
+from json import dump
+from os import listdir
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from PIL import Image
+
+from noaa_radar.layers import Layer, LayerRegistry
+from noaa_radar.radar import Radar
+from noaa_radar.tests.stand_in import RidgeStandIn
+from noaa_radar.watch import load_config, Watcher, WatchJob
+
+__author__ = 'Chad Dotson'
+
+
+class TestWatcher(TestCase):
+
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.stand_in = RidgeStandIn(size=(60, 55)).start()
+        self.radar = Radar(base_url=self.stand_in.base_url)
+        self.output_file = join(self.directory, 'htx.jpg')
+        self.watcher = Watcher(self.radar, [WatchJob('HTX', 'N0R', self.output_file, '#000000', ('warnings',))])
+
+    def tearDown(self):
+        self.radar.close()
+        self.stand_in.stop()
+        rmtree(self.directory)
+
+    def test_renders_only_changes(self):
+        assert len(self.watcher.run_once()) == 1
+        assert Image.open(self.output_file).size == (60, 55)
+
+        assert self.watcher.run_once() == []
+
+        self.stand_in.set_file('Warnings/Short/HTX_Warnings_0.gif', self.radar._transport.get_bytes(
+            self.stand_in.base_url + 'Overlays/County/Short/HTX_County_Short.gif'))
+        assert len(self.watcher.run_once()) == 1
+        assert listdir(self.directory) == ['htx.jpg']
+
+    def test_dynamic_layers_requested_once_per_poll(self):
+        def requests(fragment):
+            return len([path for path, _ in self.stand_in.requests if fragment in path])
+
+        for polls in (1, 2):
+            self.watcher.run_once()
+            assert requests('HTX_N0R_0.gif') == polls
+            assert requests('HTX_Warnings_0.gif') == polls
+
+    def test_removed_output_rendered_again(self):
+        self.watcher.run(cycles=1)
+        rmtree(self.directory)
+        self.directory = mkdtemp()
+        self.watcher.jobs = [self.watcher.jobs[0]._replace(output_file=join(self.directory, 'htx.jpg'))]
+        assert len(self.watcher.run_once()) == 1
+
+    def test_failed_job_does_not_stop_others(self):
+        self.watcher.jobs.insert(0, WatchJob('HTX', 'XXX', join(self.directory, 'bad.jpg'), '#000000', ()))
+        assert len(self.watcher.run_once()) == 1
+        assert listdir(self.directory) == ['htx.jpg']
+
+    def test_load_config(self):
+        path = join(self.directory, 'config.json')
+        with open(path, 'w') as f:
+            dump({'interval': 30, 'jobs': [{'tower': 'htx', 'product': 'n0r', 'output': 'htx.jpg',
+                                            'layers': ['counties']}]}, f)
+        config = load_config(path)
+        assert config['interval'] == 30
+        assert config['jobs'] == [WatchJob('HTX', 'N0R', 'htx.jpg', '#000000', ('counties',))]
+
+    def test_load_config_registry(self):
+        registry = LayerRegistry()
+        registry.register_layer(Layer('labels', 'Overlays/Cities/{0}/{1}_City_{0}.gif', 65, ('Short', 'Long'), True,
+                                      'range'))
+        path = join(self.directory, 'config.json')
+        with open(path, 'w') as f:
+            dump({'jobs': [{'tower': 'htx', 'product': 'n0r', 'output': self.output_file,
+                            'layers': ['warnings', 'labels']},
+                           {'tower': 'htx', 'product': 'n0r', 'output': 'all.jpg'}]}, f)
+        jobs = load_config(path, registry)['jobs']
+        assert 'labels' in jobs[1].layers
+
+        self.watcher = Watcher(Radar(base_url=self.stand_in.base_url, layer_registry=registry), jobs[:1])
+        assert len(self.watcher.run_once()) == 1
+        with self.assertRaises(ValueError):
+            load_config(path)
+
+    def test_load_config_unknown_layer(self):
+        path = join(self.directory, 'config.json')
+        with open(path, 'w') as f:
+            dump({'jobs': [{'tower': 'htx', 'product': 'n0r', 'output': 'htx.jpg', 'layers': ['roads']}]}, f)
+        with self.assertRaises(ValueError):
+            load_config(path)
@@ -0,0 +1,204 @@
+from collections import namedtuple
+from csv import DictReader
+from math import asin, cos, floor, radians, sin, sqrt
+from pkgutil import get_data
+from threading import Lock
+
+from noaa_radar.layers import ridge_products
+
+__author__ = 'Chad Dotson'
+
+
+Tower = namedtuple('Tower', ['id', 'name', 'state', 'latitude', 'longitude'])
+
+# The coverage radius of the short and long range products in kilometers.
+range_km = {'Short': 230.0, 'Long': 460.0}
+
+_earth_radius_km = 6371.0
+_km_per_degree = 111.19
+
+_default_index = None
+_default_index_lock = Lock()
+
+
+def distance_km(latitude, longitude, other_latitude, other_longitude):
+    """
+    Get the great circle distance between two points.
+    :rtype: float
+    :return: The distance in kilometers.
+    """
+    latitude, other_latitude = radians(latitude), radians(other_latitude)
+    haversine = (sin((other_latitude - latitude) / 2) ** 2 +
+                 cos(latitude) * cos(other_latitude) * sin(radians(other_longitude - longitude) / 2) ** 2)
+    return 2 * _earth_radius_km * asin(min(1.0, sqrt(haversine)))
+
+
+def load_towers():
+    """
+    Read the bundled list of NEXRAD sites.
+    :rtype: list
+    :return: A noaa_radar.towers.Tower per site.
+    """
+    lines = get_data('noaa_radar', 'data/towers.csv').decode('utf-8').splitlines()
+    return [Tower(row['id'], row['name'], row['state'], float(row['latitude']), float(row['longitude']))
+            for row in DictReader(lines)]
+
+
+def default_index():
+    """
+    Get the index of the bundled NEXRAD sites.  It is loaded on first use and shared.
+    :rtype: noaa_radar.towers.TowerIndex
+    """
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = TowerIndex(load_towers())
+        return _default_index
+
+
+def nearest_towers(latitude, longitude, k=1, product=None):
+    """
+    Find the nearest NEXRAD sites to a point.  See noaa_radar.towers.TowerIndex.nearest_towers.
+    """
+    return default_index().nearest_towers(latitude, longitude, k=k, product=product)
+
+
+class TowerIndex:
+    """
+    Looks up radar sites by id and by location.  Sites are bucketed into a grid of cells bucket_degrees on a side,
+    and a nearest site search visits rings of cells outwards from the point until no unvisited cell can hold a
+    nearer site.
+    """
+
+    def __init__(self, towers, bucket_degrees=2.0):
+        """
+        :param towers: The sites.
+        :type towers: list of noaa_radar.towers.Tower
+        :param bucket_degrees: The size of a grid cell in degrees.
+        :type bucket_degrees: float
+        """
+        self.bucket_degrees = bucket_degrees
+
+        self._columns = int(round(360 / bucket_degrees))
+        self._max_ring = self._columns // 2 + 1
+        self._towers = dict((tower.id, tower) for tower in towers)
+        self._buckets = {}
+        for tower in self._towers.values():
+            self._buckets.setdefault(self._bucket(tower.latitude, tower.longitude), []).append(tower)
+
+    def __contains__(self, tower_id):
+        return tower_id.upper() in self._towers
+
+    def __iter__(self):
+        return iter(sorted(self._towers.values()))
+
+    def __len__(self):
+        return len(self._towers)
+
+    def _bucket(self, latitude, longitude):
+        return int(floor(latitude / self.bucket_degrees)), self._wrap(int(floor(longitude / self.bucket_degrees)))
+
+    def _wrap(self, col):
+        # Columns wrap around at the antimeridian.
+        return (col + self._columns // 2) % self._columns - self._columns // 2
+
+    def get(self, tower_id):
+        """
+        Get a site.
+        :param tower_id: The noaa tower id.  Ex Huntsville, Al -> 'HTX'.
+        :type tower_id: str
+        :rtype: noaa_radar.towers.Tower
+        :return: The site, None if there is no such site.
+        """
+        return self._towers.get(tower_id.upper())
+
+    def validate(self, tower_id):
+        """
+        Check a tower id, without any network access.
+        :param tower_id: The noaa tower id.
+        :type tower_id: str
+        :rtype: str
+        :return: The tower id in upper case.
+        """
+        tower_id = tower_id.upper()
+        if tower_id not in self._towers:
+            raise ValueError("Unknown tower: %s" % tower_id)
+        return tower_id
+
+    def products(self, tower_id):
+        """
+        List the products of a site.  Every NEXRAD site publishes every RIDGE product.
+        :rtype: list
+        :return: The product codes with their range, as (product, 'Short' or 'Long') tuples.
+        """
+        self.validate(tower_id)
+        return sorted((product, info[1]) for product, info in ridge_products.items())
+
+    def nearest_towers(self, latitude, longitude, k=1, product=None):
+        """
+        Find the nearest sites to a point.
+        :param latitude: The latitude in degrees.
+        :type latitude: float
+        :param longitude: The longitude in degrees.
+        :type longitude: float
+        :param k: The maximum number of sites.  A negative k raises ValueError.
+        :type k: int
+        :param product: Only sites whose range for this product covers the point.  None - any site.
+        :type product: str
+        :rtype: list
+        :return: (noaa_radar.towers.Tower, distance in kilometers) tuples, nearest first.
+        """
+        if k < 0:
+            raise ValueError("k must not be negative: %s" % k)
+        if k == 0:
+            return []
+
+        max_distance = None
+        if product is not None:
+            max_distance = range_km[ridge_products[product.upper()][1]]
+
+        row, col = self._bucket(latitude, longitude)
+        found = []
+        visited = set()
+
+        for ring in range(self._max_ring + 1):
+            buckets = self._ring(row, col, ring)
+            # Far from every site a ring holds more cells than there are occupied ones, so the rest of the occupied
+            # cells are checked directly instead.
+            exhausted = len(buckets) > len(self._buckets)
+            if exhausted:
+                buckets = list(self._buckets)
+
+            for bucket in buckets:
+                if bucket in visited:
+                    continue
+                visited.add(bucket)
+                for tower in self._buckets.get(bucket, ()):
+                    distance = distance_km(latitude, longitude, tower.latitude, tower.longitude)
+                    if max_distance is None or distance <= max_distance:
+                        found.append((distance, tower.id, tower))
+
+            found.sort()
+            if exhausted:
+                break
+
+            # Unvisited cells are at least ring cells away in latitude or longitude, and a degree of longitude is
+            # shortest at the highest latitude those cells reach.
+            degrees = ring * self.bucket_degrees
+            nearest_unvisited = degrees * _km_per_degree * cos(radians(min(89.0, abs(latitude) + degrees)))
+            if len(found) >= k and found[k - 1][0] <= nearest_unvisited:
+                break
+            if max_distance is not None and nearest_unvisited > max_distance:
+                break
+
+        return [(tower, distance) for distance, _, tower in found[:k]]
+
+    def _ring(self, row, col, ring):
+        if ring == 0:
+            return [(row, col)]
+
+        buckets = [(row - ring, col + offset) for offset in range(-ring, ring + 1)]
+        buckets += [(row + ring, col + offset) for offset in range(-ring, ring + 1)]
+        buckets += [(row + offset, col - ring) for offset in range(-ring + 1, ring)]
+        buckets += [(row + offset, col + ring) for offset in range(-ring + 1, ring)]
+        return [(bucket_row, self._wrap(bucket_col)) for bucket_row, bucket_col in buckets]
@@ -0,0 +1,227 @@
+from collections import namedtuple, OrderedDict
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from logging import getLogger
+from socket import error as SocketError
+from threading import Lock
+from time import sleep
+from urllib.parse import urljoin, urlsplit
+
+from noaa_radar.metrics import NullMetrics
+
+__author__ = 'Chad Dotson'
+
+logger = getLogger(__name__)
+
+
+Response = namedtuple('Response', ['url', 'body', 'etag', 'last_modified', 'revalidated'])
+
+
+class TransportError(IOError):
+    """
+    Raised when a url can not be fetched.
+    """
+
+    def __init__(self, url, status=None, reason=None):
+        IOError.__init__(self, "Unable to fetch %s: %s %s" % (url, status, reason))
+        self.url = url
+        self.status = status
+        self.reason = reason
+
+
+class HTTPTransport:
+    """
+    Fetches urls over pooled keep-alive connections.
+
+    Failed requests are retried with an exponential backoff.  The validators and body of the last response for each
+    url are remembered so the next request for it can be made conditional with If-None-Match and If-Modified-Since.
+    When the server answers 304 Not Modified the remembered body is returned instead of downloading it again.  The
+    least recently used bodies are forgotten once they total more than max_revalidated_bytes, and a url whose body
+    was forgotten is downloaded in full.
+    """
+
+    user_agent = 'Mozilla/4.0 (compatible; MSIE 5.01; Windows NT 5.0)'
+
+    _redirect_statuses = (301, 302, 303, 307, 308)
+    _retry_statuses = (500, 502, 503, 504)
+
+    def __init__(self, timeout=10, retries=3, backoff=0.5, max_connections=8, max_redirects=5, revalidate=True,
+                 max_revalidated=512, max_revalidated_bytes=16 * 1024 * 1024, metrics=None):
+        """
+        :param timeout: The socket timeout in seconds.
+        :type timeout: float
+        :param retries: The number of times a failed request is retried.
+        :type retries: int
+        :param backoff: The delay before the first retry in seconds, doubled for each further retry.
+        :type backoff: float
+        :param max_connections: The maximum number of idle connections kept per host.
+        :type max_connections: int
+        :param max_redirects: The maximum number of redirects followed.
+        :type max_redirects: int
+        :param revalidate: True - make conditional requests for urls fetched before.
+        :type revalidate: bool
+        :param max_revalidated: The maximum number of responses remembered for revalidation.
+        :type max_revalidated: int
+        :param max_revalidated_bytes: The maximum total size in bytes of the bodies remembered for revalidation.
+        :type max_revalidated_bytes: int
+        :param metrics: Counts the retries.  None - they are not counted.
+        :type metrics: noaa_radar.metrics.Metrics
+        """
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self.max_redirects = max_redirects
+        self.revalidate = revalidate
+        self.max_revalidated = max_revalidated
+        self.max_revalidated_bytes = max_revalidated_bytes
+        self.metrics = metrics if metrics is not None else NullMetrics()
+
+        self._lock = Lock()
+        self._idle = {}
+        # url - (etag, last modified, body), least recently used first.
+        self._revalidated = OrderedDict()
+        self._revalidated_bytes = 0
+
+    def get(self, url):
+        """
+        Fetch a url.
+        :param url: The url.
+        :type url: str
+        :rtype: noaa_radar.transport.Response
+        :return: The response.  revalidated is True when the body was unchanged since the last fetch.
+        """
+        requested_url = url
+
+        for _ in range(self.max_redirects + 1):
+            headers = {'User-Agent': self.user_agent}
+
+            previous = self._previous_response(requested_url) if self.revalidate else None
+            if previous is not None:
+                if previous.etag:
+                    headers['If-None-Match'] = previous.etag
+                if previous.last_modified:
+                    headers['If-Modified-Since'] = previous.last_modified
+
+            status, reason, response_headers, body = self._request(url, headers)
+
+            if status in self._redirect_statuses and response_headers.get('location'):
+                url = urljoin(url, response_headers['location'])
+                continue
+
+            if status == 304 and previous is not None:
+                logger.debug("Not modified: %s", requested_url)
+                return previous._replace(revalidated=True)
+
+            if status != 200:
+                raise TransportError(requested_url, status, reason)
+
+            response = Response(requested_url, body, response_headers.get('etag'),
+                                response_headers.get('last-modified'), False)
+            if self.revalidate and (response.etag or response.last_modified):
+                self._remember_response(response)
+            return response
+
+        raise TransportError(requested_url, reason="Too many redirects")
+
+    def get_bytes(self, url):
+        """
+        Fetch the body of a url.
+        :param url: The url.
+        :type url: str
+        :rtype: bytes
+        :return: The body.
+        """
+        return self.get(url).body
+
+    def close(self):
+        """
+        Close every idle connection.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _previous_response(self, url):
+        with self._lock:
+            entry = self._revalidated.pop(url, None)
+            if entry is None:
+                return None
+            self._revalidated[url] = entry
+
+        etag, last_modified, body = entry
+        return Response(url, body, etag, last_modified, False)
+
+    def _remember_response(self, response):
+        if len(response.body) > self.max_revalidated_bytes:
+            return
+
+        with self._lock:
+            previous = self._revalidated.pop(response.url, None)
+            if previous is not None:
+                self._revalidated_bytes -= len(previous[2])
+            self._revalidated[response.url] = (response.etag, response.last_modified, response.body)
+            self._revalidated_bytes += len(response.body)
+            while (len(self._revalidated) > self.max_revalidated or
+                   self._revalidated_bytes > self.max_revalidated_bytes):
+                _, (_, _, evicted) = self._revalidated.popitem(last=False)
+                self._revalidated_bytes -= len(evicted)
+
+    def _acquire(self, scheme, netloc):
+        with self._lock:
+            connections = self._idle.get((scheme, netloc))
+            if connections:
+                return connections.pop(), True
+
+        if scheme == 'https':
+            return HTTPSConnection(netloc, timeout=self.timeout), False
+        return HTTPConnection(netloc, timeout=self.timeout), False
+
+    def _release(self, scheme, netloc, connection):
+        with self._lock:
+            connections = self._idle.setdefault((scheme, netloc), [])
+            if len(connections) < self.max_connections:
+                connections.append(connection)
+                return
+
+        connection.close()
+
+    def _request(self, url, headers):
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        attempt = 0
+        while True:
+            connection, reused = self._acquire(parts.scheme, parts.netloc)
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (HTTPException, SocketError) as e:
+                connection.close()
+                if reused:
+                    # The server closed the idle connection, try again on a fresh one.
+                    continue
+                if attempt >= self.retries:
+                    raise TransportError(url, reason=str(e))
+                logger.debug("Retrying %s after: %s", url, e)
+                self.metrics.increment('retries', reason=type(e).__name__)
+            else:
+                if response.will_close:
+                    connection.close()
+                else:
+                    self._release(parts.scheme, parts.netloc, connection)
+
+                if response.status not in self._retry_statuses or attempt >= self.retries:
+                    response_headers = dict((name.lower(), value) for name, value in response.getheaders())
+                    return response.status, response.reason, response_headers, body
+
+                logger.debug("Retrying %s after: %s %s", url, response.status, response.reason)
+                self.metrics.increment('retries', reason=str(response.status))
+
+            sleep(self.backoff * 2 ** attempt)
+            attempt += 1
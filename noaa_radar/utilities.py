@@ -1,17 +1,99 @@
-from six.moves import cStringIO
+from io import BytesIO
+from threading import Lock
+from time import sleep, time
 
-try:
-    from urllib2 import build_opener
-except ImportError:
-    from urllib.request import build_opener
+__author__ = 'Chad Dotson'
 
-from PIL import Image
+# PIL and the HTTP transport are imported on first use, so modules that only need the helpers below, such as the
+# caches, stay quick to import.
+_default_transport = None
+_default_transport_lock = Lock()
 
-__author__ = 'Chad Dotson'
 
-def get_image_from_url(url):
-    opener = build_opener()
-    opener.addheaders = [('User-agent', 'Mozilla/4.0 (compatible; MSIE 5.01; Windows NT 5.0)')]
-    response = opener.open(url)
-    im = cStringIO(response.read())
-    return Image.open(im)
+def _get_default_transport():
+    global _default_transport
+    with _default_transport_lock:
+        if _default_transport is None:
+            from noaa_radar.transport import HTTPTransport
+            _default_transport = HTTPTransport()
+        return _default_transport
+
+
+def get_bytes_from_url(url, transport=None):
+    return (transport or _get_default_transport()).get_bytes(url)
+
+
+def get_image_from_bytes(data, size=None):
+    """
+    Decode an image.  The pixels are loaded before returning and the buffer over data is closed, so the image keeps
+    no reference to data.  The buffer is a view of data, it is not copied.
+    :param data: The encoded image.
+    :type data: bytes
+    :param size: The (width, height) to fit the image in, keeping its aspect ratio.  None - the full size.  JPEG
+    images are decoded at a reduced scale, others are reduced after decoding.
+    :type size: tuple
+    :rtype: PIL.Image
+    :return: The image.
+    """
+    from PIL import Image
+
+    with BytesIO(data) as buf:
+        image = Image.open(buf)
+        if size is not None:
+            image.draft(image.mode, size)
+        image.load()
+
+    if size is not None:
+        image.thumbnail(size)
+    return image
+
+
+def get_image_from_url(url, transport=None, size=None):
+    return get_image_from_bytes(get_bytes_from_url(url, transport=transport), size=size)
+
+
+def parse_world_file(data):
+    """
+    Parse a world file, such as the .gfw published beside each RIDGE radar image.
+    :param data: The world file.
+    :type data: str
+    :rtype: tuple
+    :return: The x scale, y skew, x skew, y scale and the longitude and latitude of the center of the top left pixel.
+    """
+    values = [float(value) for value in data.split()]
+    if len(values) != 6:
+        raise ValueError("A world file holds 6 values, not %d" % len(values))
+    return tuple(values)
+
+
+def geographic_to_pixel(world, latitude, longitude):
+    """
+    Place a point on an image with its world file.  Works on numbers and numpy arrays alike.
+    :param world: The parsed world file.
+    :type world: tuple
+    :return: The (column, row) of the point, as fractional pixels from the center of the top left pixel.
+    """
+    x_scale, y_skew, x_skew, y_scale, x, y = world
+    determinant = x_scale * y_scale - x_skew * y_skew
+    return ((y_scale * (longitude - x) - x_skew * (latitude - y)) / determinant,
+            (x_scale * (latitude - y) - y_skew * (longitude - x)) / determinant)
+
+
+def run_every(function, interval, cycles=None):
+    """
+    Call a function each interval, such as a poll.  The time a call takes counts toward the interval.
+    :param function: The function, called without arguments.
+    :type function: callable
+    :param interval: The seconds from the start of one call to the start of the next.
+    :type interval: float
+    :param cycles: The number of calls.  None - call until interrupted.
+    :type cycles: int
+    """
+    cycle = 0
+    while cycles is None or cycle < cycles:
+        started = time()
+        function()
+        cycle += 1
+
+        if cycles is None or cycle < cycles:
+            sleep(max(0, interval - (time() - started)))
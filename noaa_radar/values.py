@@ -0,0 +1,170 @@
+from collections import namedtuple
+from math import ceil, floor
+
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from noaa_radar.scales import palette_levels
+from noaa_radar.utilities import geographic_to_pixel
+
+__author__ = 'Chad Dotson'
+
+
+# The pixels of a frame inside a polygon: the rows and columns slices of its bounding box and a mask of the box.
+Region = namedtuple('Region', ['rows', 'cols', 'mask'])
+
+
+def value_lookup(image, scale):
+    """
+    Build the table mapping each palette index of a radar image to its value.
+    :param image: A palette (P mode) radar image.
+    :type image: PIL.Image
+    :param scale: The scale of the image's product.
+    :type scale: noaa_radar.scales.Scale
+    :rtype: numpy.ndarray
+    :return: 256 float32 values, NaN for indexes that are transparent or not on the scale.
+    """
+    if numpy is None:
+        raise ImportError("Radar values require numpy.")
+
+    values = numpy.array([numpy.nan] + [value for value, _ in scale.levels], dtype=numpy.float32)
+    return values.take(palette_levels(image, scale))
+
+
+class RadarValues:
+    """
+    The values of a radar frame: its palette indexes, the table mapping each index to a value of its product's scale
+    and the world file placing it.  Values are only looked up for the pixels sampled.
+    """
+
+    def __init__(self, indexes, lookup, world, scale):
+        """
+        :param indexes: The palette index of each pixel, as a uint8 array of rows.
+        :type indexes: numpy.ndarray
+        :param lookup: The value of each palette index.
+        :type lookup: numpy.ndarray
+        :param world: The parsed world file of the frame.
+        :type world: tuple
+        :param scale: The scale of the frame's product.
+        :type scale: noaa_radar.scales.Scale
+        """
+        self.indexes = indexes
+        self.lookup = lookup
+        self.world = world
+        self.scale = scale
+
+    @classmethod
+    def from_image(cls, image, world, scale):
+        """
+        :param image: A palette (P mode) radar frame.
+        :type image: PIL.Image
+        :param world: The parsed world file of the frame.
+        :type world: tuple
+        :param scale: The scale of the frame's product.
+        :type scale: noaa_radar.scales.Scale
+        :rtype: noaa_radar.values.RadarValues
+        """
+        if numpy is None:
+            raise ImportError("Radar values require numpy.")
+        if image.mode != "P":
+            raise ValueError("Radar values are read from palette images, not %s" % image.mode)
+        return cls(numpy.asarray(image), value_lookup(image, scale), world, scale)
+
+    @property
+    def unit(self):
+        return self.scale.unit
+
+    def values(self):
+        """
+        Get the value of every pixel.
+        :rtype: numpy.ndarray
+        :return: A float32 array of rows, NaN where there is no echo.
+        """
+        return self.lookup.take(self.indexes)
+
+    def pixel(self, latitude, longitude):
+        """
+        Get the pixel nearest a point.
+        :rtype: tuple
+        :return: The (column, row) of the pixel, None if the point is outside the frame.
+        """
+        col, row = geographic_to_pixel(self.world, latitude, longitude)
+        col, row = int(floor(col + 0.5)), int(floor(row + 0.5))
+        height, width = self.indexes.shape
+        if 0 <= col < width and 0 <= row < height:
+            return col, row
+        return None
+
+    def at(self, latitude, longitude):
+        """
+        Get the value at a point.
+        :rtype: float
+        :return: The value, NaN where there is no echo or outside the frame.
+        """
+        pixel = self.pixel(latitude, longitude)
+        if pixel is None:
+            return float('nan')
+        return float(self.lookup[self.indexes[pixel[1], pixel[0]]])
+
+    def region(self, polygon):
+        """
+        Find the pixels inside a polygon.  A region can be kept and sampled again on later frames of the same tower
+        and product.
+        :param polygon: The (latitude, longitude) vertices of the polygon.
+        :type polygon: list
+        :rtype: noaa_radar.values.Region
+        """
+        points = [geographic_to_pixel(self.world, latitude, longitude) for latitude, longitude in polygon]
+        height, width = self.indexes.shape
+
+        left = max(0, int(floor(min(col for col, _ in points))))
+        right = min(width, int(ceil(max(col for col, _ in points))) + 1)
+        top = max(0, int(floor(min(row for _, row in points))))
+        bottom = min(height, int(ceil(max(row for _, row in points))) + 1)
+        if left >= right or top >= bottom:
+            return Region(slice(0, 0), slice(0, 0), numpy.zeros((0, 0), dtype=bool))
+
+        # A pixel is inside when its center is, by the even-odd rule.
+        cols = numpy.arange(left, right, dtype=numpy.float64)[numpy.newaxis, :]
+        rows = numpy.arange(top, bottom, dtype=numpy.float64)[:, numpy.newaxis]
+        mask = numpy.zeros((bottom - top, right - left), dtype=bool)
+        for (col, row), (next_col, next_row) in zip(points, points[1:] + points[:1]):
+            if row == next_row:
+                continue
+            crosses = (rows < row) != (rows < next_row)
+            crossing_cols = col + (rows - row) * (next_col - col) / (next_row - row)
+            mask ^= crosses & (cols < crossing_cols)
+
+        return Region(slice(top, bottom), slice(left, right), mask)
+
+    def values_in(self, region):
+        """
+        Get the values of the pixels in a region.
+        :param region: A region or a polygon of (latitude, longitude) vertices.
+        :rtype: numpy.ndarray
+        :return: The values, NaN where there is no echo.
+        """
+        if not isinstance(region, Region):
+            region = self.region(region)
+        return self.lookup.take(self.indexes[region.rows, region.cols][region.mask])
+
+    def maximum(self, region):
+        """
+        Get the highest value in a region.
+        :param region: A region or a polygon of (latitude, longitude) vertices.
+        :rtype: float
+        :return: The value, NaN if there is no echo in the region.
+        """
+        return float(numpy.fmax.reduce(self.values_in(region), initial=numpy.nan))
+
+    def minimum(self, region):
+        """
+        Get the lowest value in a region.
+        :param region: A region or a polygon of (latitude, longitude) vertices.
+        :rtype: float
+        :return: The value, NaN if there is no echo in the region.
+        """
+        return float(numpy.fmin.reduce(self.values_in(region), initial=numpy.nan))
@@ -0,0 +1,143 @@
+from collections import namedtuple
+from json import load
+from logging import getLogger
+from os import close, remove, replace
+from os.path import abspath, dirname, exists
+from tempfile import mkstemp
+
+from noaa_radar.encoders import get_encoder
+from noaa_radar.layers import LayerRegistry
+from noaa_radar.utilities import run_every
+
+__author__ = 'Chad Dotson'
+
+logger = getLogger(__name__)
+
+
+WatchJob = namedtuple('WatchJob', ['tower_id', 'product', 'output_file', 'background', 'layers', 'image_format',
+                                   'quality'])
+WatchJob.__new__.__defaults__ = ('jpeg', None)
+
+
+def load_config(path, registry=None):
+    """
+    Read a watch config file.  It is a JSON object with a list of jobs and optionally the poll interval in seconds
+    and a directory to cache the static layers in.
+
+    {"interval": 60, "cache_dir": "/var/cache/noaa_radar",
+     "jobs": [{"tower": "HTX", "product": "N0R", "output": "htx.jpg", "layers": ["counties", "warnings"]},
+              {"tower": "BMX", "product": "N0R", "output": "bmx.webp", "format": "webp", "quality": 70}]}
+
+    A job without layers draws every layer of the registry.
+    :param path: The config file.
+    :type path: str
+    :param registry: The layers jobs may draw.  None - the RIDGE layers.
+    :type registry: noaa_radar.layers.LayerRegistry
+    :rtype: dict
+    :return: The config, with each job as a noaa_radar.watch.WatchJob.
+    """
+    with open(path, "r") as f:
+        config = load(f)
+
+    layer_names = (registry if registry is not None else LayerRegistry()).layer_names
+
+    jobs = []
+    for job in config.get("jobs", []):
+        layers = tuple(job.get("layers", layer_names))
+        unknown = set(layers) - set(layer_names)
+        if unknown:
+            raise ValueError("Unknown layers: %s" % ", ".join(sorted(unknown)))
+
+        image_format = job.get("format", "jpeg")
+        # Unknown formats are refused before anything is watched.
+        get_encoder(image_format)
+
+        jobs.append(WatchJob(job["tower"].upper(), job["product"].upper(), job["output"],
+                             job.get("background", "#000000"), layers, image_format, job.get("quality")))
+
+    config["jobs"] = jobs
+    return config
+
+
+def write_job(radar, job, image):
+    """
+    Encode a job's image to its output file.  The file is replaced at once, so readers never see a partial image.
+    :param radar: The radar to encode with.
+    :type radar: noaa_radar.radar.Radar
+    :param job: The job.
+    :type job: noaa_radar.watch.WatchJob
+    :param image: The image.
+    :type image: PIL.Image
+    """
+    handle, temp_path = mkstemp(dir=dirname(abspath(job.output_file)), prefix=".radar")
+    try:
+        try:
+            radar.write(image, handle, job.image_format, job.quality)
+        finally:
+            close(handle)
+        replace(temp_path, job.output_file)
+    except Exception:
+        remove(temp_path)
+        raise
+
+
+class Watcher:
+    """
+    Polls the radar frames of a set of jobs and renders a job again only when one of its frames, warnings or legend
+    has changed.  The Radar is kept for the life of the watcher, so its static layers and connections stay warm.
+    """
+
+    def __init__(self, radar, jobs, interval=60):
+        """
+        :param radar: The radar to render with.
+        :type radar: noaa_radar.radar.Radar
+        :param jobs: The jobs to render.
+        :type jobs: list of noaa_radar.watch.WatchJob
+        :param interval: The seconds between polls.
+        :type interval: float
+        """
+        self.radar = radar
+        self.jobs = jobs
+        self.interval = interval
+
+        self._versions = {}
+
+    def _write(self, job, image):
+        write_job(self.radar, job, image)
+
+    def run_once(self):
+        """
+        Poll every job once.
+        :rtype: list
+        :return: The jobs that were rendered.
+        """
+        rendered = []
+
+        for job in self.jobs:
+            try:
+                versions = self.radar.get_versions(job.tower_id, job.product, job.layers)
+                version = (job,) + versions.versions
+
+                if self._versions.get(job.output_file) == version and exists(job.output_file):
+                    logger.debug("Unchanged: %s", job.output_file)
+                    continue
+
+                image = self.radar.get_image(job.tower_id, job.product, layers=job.layers, background=job.background,
+                                             versions=versions)
+                self._write(job, image)
+                self._versions[job.output_file] = version
+                rendered.append(job)
+                logger.info("Updated: %s", job.output_file)
+
+            except Exception:
+                logger.exception("Unable to update %s", job.output_file)
+
+        return rendered
+
+    def run(self, cycles=None):
+        """
+        Poll every job each interval.
+        :param cycles: The number of polls.  None - poll until interrupted.
+        :type cycles: int
+        """
+        run_every(self.run_once, self.interval, cycles)
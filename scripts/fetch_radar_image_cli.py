@@ -2,22 +2,37 @@
 
 """
 This script will fetch and composite Radar weather radar images.
+
+Only the standard library and the light noaa_radar modules are imported before the arguments are checked.  PIL, the
+HTTP transport and the Radar are imported once an image has to be rendered, so --help and bad arguments return
+quickly.  An image found in the --cache_dir is returned after revalidating the layers that change, without drawing
+or encoding it.
 """
 
 from argparse import ArgumentParser
+from hashlib import sha1
 from logging import basicConfig, getLogger, INFO, DEBUG
+from os import fdopen
+from sys import exit, stdout
 
-from noaa_radar import Radar
-
-basicConfig(level=INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+from noaa_radar.encoders import encoders
+from noaa_radar.layers import LayerRegistry
+from noaa_radar.towers import default_index
 
 logger = getLogger(__name__)
 
 
+product_flags = (('base_reflectivity', 'N0R'), ('composite_reflectivity', 'NCR'), ('relative_motion', 'N0S'),
+                 ('base_velocity', 'N0V'), ('one_hour', 'N1P'), ('storm_total', 'NTP'))
+
+layer_flags = (('topo', 'topography'), ('rivers', 'rivers'), ('counties', 'counties'), ('highways', 'highways'),
+               ('cities', 'cities'), ('warnings', 'warnings'), ('legend', 'legend'))
+
+
 def get_args():
     parser = ArgumentParser(description='Image Scraper')
-    parser.add_argument('radar', help='Radar site code')
-    parser.add_argument('output_file', help='Output file')
+    parser.add_argument('radar', nargs='?', help='Radar site code')
+    parser.add_argument('output_file', nargs='?', help='Output file, - for stdout')
     parser.add_argument('--base_reflectivity', default=False, help='Get base reflectivity.', action='store_true')
     parser.add_argument('--relative_motion', default=False, help='Get storm relative motion.', action='store_true')
     parser.add_argument('--base_velocity', default=False, help='Get base velocity.', action='store_true')
@@ -33,96 +48,176 @@ def get_args():
     parser.add_argument('--warnings', default=False, help='Include warnings', action='store_true')
     parser.add_argument('--rivers', default=False, help='Include rivers', action='store_true')
     parser.add_argument('--topo', default=False, help='Include topography', action='store_true')
+    parser.add_argument('--product', help='The product code, such as N0R.  Replaces the product flags.')
+    parser.add_argument('--layers', help='Comma separated layer names, such as counties,warnings.  Replaces the '
+                                         'layer flags.')
+    parser.add_argument('--registry', help='A JSON file of extra layers and products.')
+    parser.add_argument('--base_url', help='The url of the RIDGE site.  Default: the NOAA site')
+    parser.add_argument('--format', choices=sorted(encoders),
+                        help='The output format.  jpeg is a tuned, progressive JPEG and palette_png is lossless for '
+                             'images without topography.  Default: jpeg_baseline, a quality 99 baseline JPEG, or '
+                             'jpeg when --quality is given')
+    parser.add_argument('--quality', type=int,
+                        help='The JPEG or WebP quality.  Default: 99 for jpeg_baseline, 85 for jpeg, 80 for webp')
+    parser.add_argument('--watch', metavar='CONFIG',
+                        help='Keep rendering the jobs in a JSON config file whenever their radar changes.')
+    parser.add_argument('--interval', type=float, help='Seconds between polls when watching.  Default: 60')
+    parser.add_argument('--batch', metavar='MANIFEST',
+                        help='Render the jobs in a JSON manifest, in the watch config format, once each.')
+    parser.add_argument('--workers', type=int, help='Render processes for a batch.  Default: one per cpu')
+    parser.add_argument('--cache_dir', help='A directory to keep rendered images in, reused for --max_age seconds '
+                                            'while the radar frame, warnings and legend are unchanged.')
+    parser.add_argument('--max_age', type=float, default=120,
+                        help='Seconds a rendered image in the cache_dir is reused.  Default: 120')
     parser.add_argument('-v', '--verbose', help='Verbose log output', default=False, action='store_true')
-    return parser.parse_args()
+    args = parser.parse_args()
 
-
-def main():
+    args.registry_layers = LayerRegistry()
     try:
-        args = get_args()
-
-        if args.verbose:
-            getLogger('').setLevel(DEBUG)
-
-        logger.info("Radar site: %s", args.radar)
-        logger.info("Output: %s", args.output_file)
-
-        img = None
-
-        noaa = Radar()
-
-        if args.base_reflectivity:
-            img = noaa.get_base_reflectivity(args.radar,
-                                             background=args.background,
-                                             include_highways=args.highways,
-                                             include_counties=args.counties,
-                                             include_cities=args.cities,
-                                             include_legend=args.legend,
-                                             include_warnings=args.warnings,
-                                             include_rivers=args.rivers,
-                                             include_topography=args.topo)
-
-        elif args.composite_reflectivity:
-            img = noaa.get_composite_reflectivity(args.radar,
-                                                  background=args.background,
-                                                  include_highways=args.highways,
-                                                  include_counties=args.counties,
-                                                  include_cities=args.cities,
-                                                  include_legend=args.legend,
-                                                  include_warnings=args.warnings,
-                                                  include_rivers=args.rivers,
-                                                  include_topography=args.topo)
-
-        elif args.relative_motion:
-            img = noaa.get_storm_relative_motion(args.radar,
-                                                 background=args.background,
-                                                 include_highways=args.highways,
-                                                 include_counties=args.counties,
-                                                 include_cities=args.cities,
-                                                 include_legend=args.legend,
-                                                 include_warnings=args.warnings,
-                                                 include_rivers=args.rivers,
-                                                 include_topography=args.topo)
-
-        elif args.base_velocity:
-            img = noaa.get_base_velocity(args.radar,
-                                         background=args.background,
-                                         include_highways=args.highways,
-                                         include_counties=args.counties,
-                                         include_cities=args.cities,
-                                         include_legend=args.legend,
-                                         include_warnings=args.warnings,
-                                         include_rivers=args.rivers,
-                                         include_topography=args.topo)
-
-        elif args.one_hour:
-            img = noaa.get_one_hour_precipitation(args.radar,
-                                                  background=args.background,
-                                                  include_highways=args.highways,
-                                                  include_counties=args.counties,
-                                                  include_cities=args.cities,
-                                                  include_legend=args.legend,
-                                                  include_warnings=args.warnings,
-                                                  include_rivers=args.rivers,
-                                                  include_topography=args.topo)
-
-        elif args.storm_total:
-            img = noaa.get_storm_total_precipitation(args.radar,
-                                                     background=args.background,
-                                                     include_highways=args.highways,
-                                                     include_counties=args.counties,
-                                                     include_cities=args.cities,
-                                                     include_legend=args.legend,
-                                                     include_warnings=args.warnings,
-                                                     include_rivers=args.rivers,
-                                                     include_topography=args.topo)
+        if args.registry:
+            args.registry_layers.load(args.registry)
+    except (IOError, KeyError, ValueError) as e:
+        parser.error(str(e))
+
+    if args.watch or args.batch:
+        return args
+
+    if args.format is None:
+        # Asking for a quality opts in to the tuned JPEG encoder, otherwise the output is as it always was.
+        args.format = 'jpeg' if args.quality is not None else 'jpeg_baseline'
 
+    if args.radar is None or args.output_file is None:
+        parser.error("a radar site code and output file are required unless watching or in a batch")
+
+    try:
+        args.radar = default_index().validate(args.radar)
+    except ValueError as e:
+        parser.error(str(e))
+
+    args.product = args.product or next((code for flag, code in product_flags if getattr(args, flag)), None)
+    if args.product is None:
+        parser.error("a valid radar type must be specified")
+    args.product = args.product.upper()
+    if args.product not in args.registry_layers.products:
+        parser.error("unknown product: %s" % args.product)
+
+    if args.layers is not None:
+        args.layers = [name for name in args.layers.split(',') if name]
+    else:
+        args.layers = [name for flag, name in layer_flags if getattr(args, flag)]
+    unknown = set(args.layers) - set(args.registry_layers.layer_names)
+    if unknown:
+        parser.error("unknown layers: %s" % ", ".join(sorted(unknown)))
+
+    return args
+
+
+def watch(args):
+    from noaa_radar.cache import LayerCache
+    from noaa_radar.radar import Radar
+    from noaa_radar.watch import load_config, Watcher
+
+    config = load_config(args.watch, args.registry_layers)
+    interval = args.interval or config.get("interval", 60)
+
+    logger.info("Watching %d jobs every %s seconds", len(config["jobs"]), interval)
+
+    with Radar(layer_cache=LayerCache(config.get("cache_dir")), layer_registry=args.registry_layers,
+               base_url=args.base_url) as noaa:
+        Watcher(noaa, config["jobs"], interval=interval).run()
+
+
+def batch(args):
+    from noaa_radar.cache import LayerCache
+    from noaa_radar.farm import RenderFarm
+    from noaa_radar.radar import Radar
+    from noaa_radar.watch import load_config
+
+    config = load_config(args.batch, args.registry_layers)
+
+    logger.info("Rendering %d jobs", len(config["jobs"]))
+
+    with Radar(layer_cache=LayerCache(config.get("cache_dir")), layer_registry=args.registry_layers,
+               base_url=args.base_url) as noaa:
+        report = RenderFarm(noaa, workers=args.workers or config.get("workers")).run(config["jobs"])
+
+    for job, error in report.failures:
+        logger.error("Failed: %s: %s", job.output_file, error)
+    logger.info("Rendered %d of %d frames in %.2f seconds, %.1f frames per second", report.rendered,
+                len(config["jobs"]), report.seconds, report.fps)
+    return not report.failures
+
+
+def registry_digest(path):
+    """
+    Identify a registry file by its contents, so images cached with an edited registry are not reused.
+    """
+    if not path:
+        return None
+    with open(path, "rb") as f:
+        return sha1(f.read()).hexdigest()
+
+
+def write_output(path, data):
+    if path == '-':
+        with fdopen(stdout.fileno(), "wb", closefd=False) as f:
+            f.write(data)
+    else:
+        with open(path, "wb") as f:
+            f.write(data)
+
+
+def render(args):
+    logger.info("Radar site: %s", args.radar)
+    logger.info("Output: %s", args.output_file)
+
+    from noaa_radar.radar import Radar
+
+    with Radar(base_url=args.base_url, layer_registry=args.registry_layers) as noaa:
+        cache = key = versions = None
+        if args.cache_dir:
+            from noaa_radar.cache import RenderCache
+
+            # The image is identified as render_bytes does, by the versions of the layers that change, so a cached
+            # image is not reused once the radar frame, warnings or legend upstream have changed.
+            versions = noaa.get_versions(args.radar, args.product, args.layers)
+            cache = RenderCache(args.cache_dir, ttl=args.max_age)
+            key = (args.radar, args.product, tuple(args.layers), args.background, args.format, args.quality,
+                   registry_digest(args.registry), versions.versions)
+            data = cache.get(key)
+            if data is not None:
+                write_output(args.output_file, data)
+                logger.info("Done, from the cache")
+                return
+
+        img = noaa.get_image(args.radar, args.product, layers=args.layers, background=args.background,
+                             versions=versions)
+
+        if cache is not None:
+            data = noaa.encode(img, args.format, args.quality)
+            cache.put(key, data)
+            write_output(args.output_file, data)
+        elif args.output_file == '-':
+            noaa.write(img, stdout.fileno(), args.format, args.quality)
         else:
-            logger.error("A valid radar type must be specified.")
+            with open(args.output_file, "wb") as f:
+                noaa.write(img, f.fileno(), args.format, args.quality)
+    logger.info("Done")
+
+
+def main():
+    args = get_args()
+
+    basicConfig(level=DEBUG if args.verbose else INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
 
-        if img is not None:
-            img.save(args.output_file, "JPEG", quality=99)
-            logger.info("Done")
+    try:
+        if args.watch:
+            watch(args)
+        elif args.batch:
+            if not batch(args):
+                exit(1)
+        else:
+            render(args)
 
     except KeyboardInterrupt:
         logger.info("Cancelling...")
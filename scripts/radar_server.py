@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+
+"""
+This script serves composited Radar weather radar images over HTTP.
+
+    GET /radar/HTX/N0R.png?layers=counties,warnings&background=%23000000
+    GET /radar/HTX/N0R.webp
+"""
+
+import asyncio
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from email.utils import formatdate
+from functools import partial
+from hashlib import sha1
+from logging import basicConfig, getLogger, INFO, DEBUG
+from multiprocessing import get_context
+from multiprocessing.util import Finalize
+from os.path import join
+from re import compile as compile_pattern
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import ImageColor
+
+from noaa_radar import Radar
+from noaa_radar.cache import LayerCache, RenderCache
+from noaa_radar.encoders import encoders
+from noaa_radar.layers import LayerRegistry
+from noaa_radar.towers import default_index
+from noaa_radar.transport import TransportError
+
+logger = getLogger(__name__)
+
+
+_path_pattern = compile_pattern(r'^/radar/([A-Za-z0-9]{3,4})/([A-Za-z0-9]{3})\.(png|jpg|jpeg|webp)$')
+
+_reasons = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            500: 'Internal Server Error', 502: 'Bad Gateway'}
+
+_radar = None
+
+
+def _load_registry(path=None):
+    registry = LayerRegistry()
+    if path:
+        registry.load(path)
+    return registry
+
+
+def _init_worker(base_url=None, cache_dir=None, registry=None):
+    global _radar
+    layer_cache = LayerCache(join(cache_dir, 'layers') if cache_dir else None)
+    render_cache = RenderCache(join(cache_dir, 'renders') if cache_dir else None)
+    _radar = Radar(base_url=base_url, layer_cache=layer_cache, render_cache=render_cache,
+                   layer_registry=_load_registry(registry))
+    # Worker processes skip atexit, an exit priority has the Radar closed when the pool shuts the worker down.
+    Finalize(_radar, _radar.close, exitpriority=10)
+
+
+def _render(tower_id, product, image_format, background, layers):
+    return _radar.render_bytes(tower_id, product, image_format=image_format, background=background,
+                               layers=list(layers))
+
+
+class RadarServer:
+    """
+    Serves radar images, rendering them in a pool of worker processes so the event loop never blocks.  Concurrent
+    requests for the same image share one render.
+    """
+
+    def __init__(self, executor, max_age=60, registry=None):
+        """
+        :param executor: The pool to render in.  Its workers must be initialized with _init_worker and should be
+        spawned rather than forked, so they do not hold the client connections open at the time they start.
+        :type executor: concurrent.futures.Executor
+        :param max_age: The seconds clients may cache an image for.
+        :type max_age: int
+        :param registry: The layers and products served, the same ones the workers were initialized with.  None - the
+        RIDGE layers and products.
+        :type registry: noaa_radar.layers.LayerRegistry
+        """
+        self.executor = executor
+        self.max_age = max_age
+        self.registry = registry if registry is not None else LayerRegistry()
+        self.renders = 0
+
+        self._in_flight = {}
+
+    async def render(self, key):
+        """
+        Render an image, joining the render already in flight for the same key.
+        :param key: The (tower_id, product, image_format, background, layers) to render.
+        :type key: tuple
+        :rtype: bytes
+        :return: The encoded image.
+        """
+        future = self._in_flight.get(key)
+        if future is None:
+            self.renders += 1
+            future = asyncio.get_running_loop().run_in_executor(self.executor, partial(_render, *key))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        # One client going away must not cancel the render for the others.
+        return await asyncio.shield(future)
+
+    def _parse(self, target):
+        parts = urlsplit(target)
+        match = _path_pattern.match(parts.path)
+        if match is None:
+            return None
+
+        tower_id, product, extension = match.groups()
+        tower_id, product = tower_id.upper(), product.upper()
+        if product not in self.registry.products or tower_id not in default_index():
+            return None
+
+        query = parse_qs(parts.query)
+        if 'layers' in query:
+            layers = tuple(sorted(set(name for value in query['layers'] for name in value.split(',') if name)))
+        else:
+            layers = self.registry.layer_names
+        unknown = set(layers) - set(self.registry.layer_names)
+        if unknown:
+            raise ValueError("Unknown layers: %s" % ", ".join(sorted(unknown)))
+
+        background = query.get('background', ['#000000'])[0]
+        try:
+            ImageColor.getrgb(background)
+        except ValueError:
+            raise ValueError("Unknown background color: %s" % background)
+
+        image_format = {'png': 'png', 'webp': 'webp'}.get(extension, 'jpeg')
+        return tower_id, product, image_format, background, tuple(sorted(layers))
+
+    async def respond(self, method, target, headers):
+        """
+        Answer a request.
+        :rtype: tuple
+        :return: The status, a list of (name, value) headers and the body.
+        """
+        if method not in ('GET', 'HEAD'):
+            return 405, [('Allow', 'GET, HEAD')], b''
+
+        try:
+            key = self._parse(target)
+        except ValueError as e:
+            return 400, [('Content-Type', 'text/plain')], str(e).encode('utf-8')
+        if key is None:
+            return 404, [('Content-Type', 'text/plain')], b'Not found'
+
+        try:
+            data = await self.render(key)
+        except TransportError as e:
+            logger.warning("Unable to render %s: %s", target, e)
+            return 502, [('Content-Type', 'text/plain')], b'Unable to fetch the radar layers'
+        except Exception:
+            logger.exception("Unable to render %s", target)
+            return 500, [('Content-Type', 'text/plain')], b'Unable to render the image'
+
+        etag = '"%s"' % sha1(data).hexdigest()[:16]
+        response_headers = [('ETag', etag), ('Cache-Control', 'public, max-age=%d' % self.max_age)]
+
+        if etag in [tag.strip() for tag in headers.get('if-none-match', '').split(',')]:
+            return 304, response_headers, b''
+
+        response_headers.append(('Content-Type', encoders[key[2]].content_type))
+        return 200, response_headers, data
+
+    async def handle(self, reader, writer):
+        """
+        Serve the requests of one connection.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                parts = request_line.decode('latin-1').split()
+                if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+                    await self._write(writer, 'GET', 400, [('Content-Type', 'text/plain')],
+                                      b'Malformed request line', False)
+                    break
+                method, target, version = parts
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length', 0))
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self._write(writer, method, 400, [('Content-Type', 'text/plain')],
+                                      b'Invalid Content-Length', False)
+                    break
+
+                # The body is read and discarded, so the next request on the connection starts after it.
+                while length > 0:
+                    length -= len(await reader.readexactly(min(length, 65536)))
+
+                status, response_headers, body = await self.respond(method, target, headers)
+                # The end of a chunked body is not looked for, the connection is closed after answering instead.
+                keep_alive = (version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close' and
+                              'transfer-encoding' not in headers)
+                await self._write(writer, method, status, response_headers, body, keep_alive)
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.debug("Closing connection: %s", e)
+        finally:
+            writer.close()
+
+    async def _write(self, writer, method, status, headers, body, keep_alive):
+        lines = ['HTTP/1.1 %d %s' % (status, _reasons[status]), 'Date: %s' % formatdate(usegmt=True),
+                 'Content-Length: %d' % len(body), 'Connection: %s' % ('keep-alive' if keep_alive else 'close')]
+        lines.extend('%s: %s' % header for header in headers)
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if method != 'HEAD':
+            writer.write(body)
+        await writer.drain()
+
+    async def serve(self, host, port):
+        """
+        Serve until cancelled.
+        """
+        server = await asyncio.start_server(self.handle, host, port)
+        logger.info("Serving on %s", ", ".join("%s:%s" % s.getsockname()[:2] for s in server.sockets))
+        async with server:
+            await server.serve_forever()
+
+
+def get_args():
+    parser = ArgumentParser(description='Radar image server')
+    parser.add_argument('--host', default='127.0.0.1', help='The address to listen on.  Default: 127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080, help='The port to listen on.  Default: 8080')
+    parser.add_argument('--workers', type=int, default=None, help='Render processes.  Default: one per cpu')
+    parser.add_argument('--cache_dir', help='A directory to cache layers and rendered images in.')
+    parser.add_argument('--base_url', help='The url of the RIDGE site.')
+    parser.add_argument('--registry', help='A JSON file of extra layers and products.')
+    parser.add_argument('--max_age', type=int, default=60, help='Seconds clients may cache images.  Default: 60')
+    parser.add_argument('-v', '--verbose', help='Verbose log output', default=False, action='store_true')
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+
+    basicConfig(level=DEBUG if args.verbose else INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+
+    # The registry is loaded here first, so a bad file stops the server before any worker starts.
+    registry = _load_registry(args.registry)
+    executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=get_context('spawn'),
+                                   initializer=_init_worker, initargs=(args.base_url, args.cache_dir, args.registry))
+    try:
+        asyncio.run(RadarServer(executor, max_age=args.max_age, registry=registry).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
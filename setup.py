@@ -23,17 +23,25 @@ setup(name='noaa_radar',
       download_url = 'https://github.com/chaddotson/noaa_radar/tarball/0.7.3',
       packages=['noaa_radar', 'scripts'],
       long_description=read("README.rst"),
+      python_requires='>=3.8',
       install_requires=install_reqs,
+      extras_require={
+          'numpy': ['numpy'],
+      },
       include_package_data=True,
+      package_data={'noaa_radar': ['data/*.csv']},
       entry_points={
           'console_scripts': [
               'fetch_radar_image_cli = scripts.fetch_radar_image_cli:main',
+              'radar_server = scripts.radar_server:main',
           ]
       },
       classifiers=[
           "Development Status :: 4 - Beta",
           "Topic :: Utilities",
           "License :: OSI Approved :: GNU General Public License v3 (GPLv3)",
+          "Programming Language :: Python :: 3",
+          "Programming Language :: Python :: 3 :: Only",
       ],
       test_suite='nose.collector',
       tests_require=['nose'],